@@ -0,0 +1,210 @@
+import argparse
+import contextlib
+import csv
+import heapq
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from diary_index import IndexWriter, ParsedDiary
+from fetch_diary import END_MARKER, START_MARKER, fetch_and_clean
+from generate_stats import KEYWORDS, rollup_path, update_rollup, write_rollup
+from pipeline import run_pipeline
+
+MANIFEST_FILE = "volumes.json"
+
+# Downloads in flight at once; the rest of the work is CPU-bound
+FETCH_CONCURRENCY = 4
+
+def load_manifest(path: str) -> Dict:
+    """
+    Read a manifest of volumes to process.
+
+    {"output": "data/corpus", "volumes": [{"name": ..., "source": URL or
+    local path, "start_marker": ..., "end_marker": ..., "output": prefix}]}
+
+    Markers default to the Pepys ones in fetch_diary, and each volume's
+    output prefix to data/volumes/<name>.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest.setdefault("output", "data/corpus")
+    names = set()
+    for volume in manifest["volumes"]:
+        if volume["name"] in names:
+            raise ValueError(f"volume name {volume['name']} appears twice in {path}")
+        names.add(volume["name"])
+        volume.setdefault("start_marker", START_MARKER)
+        volume.setdefault("end_marker", END_MARKER)
+        volume.setdefault("output", os.path.join("data", "volumes", volume["name"]))
+    return manifest
+
+def volume_paths(prefix: str) -> Dict[str, str]:
+    return {
+        "raw": prefix + "-raw.txt",
+        "trimmed": prefix + "-trimmed.txt",
+        "parsed": prefix + "-parsed.ndjson",
+        "stats": prefix + "-stats.csv",
+    }
+
+def source_url(source: str) -> str:
+    """URL for a manifest source, so local files go through the same fetch code."""
+    if "://" in source:
+        return source
+    return Path(source).resolve().as_uri()
+
+def fetch_volume(volume: Dict) -> bool:
+    """Fetch and trim one volume. Returns False if it failed (fetch_and_clean prints why)."""
+    paths = volume_paths(volume["output"])
+    try:
+        fetch_and_clean(source_url(volume["source"]), paths["trimmed"], paths["raw"],
+                        start_marker=volume["start_marker"], end_marker=volume["end_marker"])
+    except SystemExit:
+        print(f"Skipping volume {volume['name']}.")
+        return False
+    return True
+
+def process_volume(volume: Dict, keywords: List[str] = KEYWORDS) -> Dict:
+    """Parse one trimmed volume and generate its stats, in one pass. Runs in a worker process."""
+    paths = volume_paths(volume["output"])
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        run_pipeline(["parse", "stats"], keywords, paths["trimmed"], paths["parsed"], paths["stats"])
+    with ParsedDiary(paths["parsed"]) as diary:
+        entries = len(diary)
+    return {"name": volume["name"], "entries": entries, "seconds": time.perf_counter() - start}
+
+def iter_volume(k: int, diary: ParsedDiary) -> Iterator[tuple[int, int, int, int]]:
+    """(date key, volume number, byte offset, length) of a volume's rows, in date order."""
+    for i in range(len(diary)):
+        yield diary.keys[i], k, diary.offsets[i], diary.lengths[i]
+
+def read_stats_rows(stats_file: str) -> tuple[List[str], List[List[str]]]:
+    with open(stats_file, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        return next(reader), list(reader)
+
+def merge_volumes(volumes: List[Dict], output: str) -> int:
+    """
+    Merge the volumes' parsed entries into one corpus in date order, with its index and stats.
+
+    Each volume's index already lists its rows in date order, so this is a
+    k-way merge of the indexes; rows are copied without being decoded.
+    Entries on the same date stay in manifest order, then file order. The
+    stats rows follow their entries, and the rollups are recomputed from them.
+    Volumes without entries (which have no stats file) are left out.
+    Returns the number of entries.
+    """
+    paths = volume_paths(output)
+    diaries = []
+    kept = []
+    for volume in volumes:
+        diary = ParsedDiary(volume_paths(volume["output"])["parsed"])
+        if len(diary):
+            diaries.append(diary)
+            kept.append(volume)
+        else:
+            diary.close()
+    volumes = kept
+    if not volumes:
+        raise ValueError("no volume has any entries to merge")
+    os.makedirs(os.path.dirname(paths["parsed"]) or ".", exist_ok=True)
+    try:
+        header = None
+        stats = []
+        row_numbers = []
+        for volume, diary in zip(volumes, diaries):
+            volume_header, rows = read_stats_rows(volume_paths(volume["output"])["stats"])
+            if header is None:
+                header = volume_header
+            elif volume_header != header:
+                raise ValueError(f"volume {volume['name']} was counted with different keywords")
+            stats.append(rows)
+            # Stats rows are in file order, the index in date order
+            row_numbers.append({offset: j for j, offset in enumerate(sorted(diary.offsets))})
+
+        index = IndexWriter(paths["parsed"])
+        monthly = {}
+        yearly = {}
+        offset = 0
+        count = 0
+        with open(paths["parsed"], 'wb') as out, open(paths["stats"], 'w', newline='', encoding='utf-8') as stats_out:
+            writer = csv.writer(stats_out)
+            writer.writerow(header)
+            for _, k, row_offset, length in heapq.merge(*(iter_volume(k, diary) for k, diary in enumerate(diaries))):
+                row = diaries[k].data[row_offset:row_offset + length]
+                out.write(row + b'\n')
+                index.add_row(row.decode('utf-8'), offset)
+                offset += length + 1
+                count += 1
+
+                stats_row = stats[k][row_numbers[k][row_offset]]
+                writer.writerow(stats_row)
+                values = {field: value if field == "date" else int(value) for field, value in zip(header, stats_row)}
+                update_rollup(monthly, values["date"][:7], values)
+                update_rollup(yearly, values["date"][:4], values)
+        index.close()
+        write_rollup(rollup_path(paths["stats"], "monthly"), monthly)
+        write_rollup(rollup_path(paths["stats"], "yearly"), yearly)
+    finally:
+        for diary in diaries:
+            diary.close()
+    return count
+
+def run_batch(manifest_path: str = MANIFEST_FILE, workers: int = 0, fetch_concurrency: int = FETCH_CONCURRENCY,
+              fetch: bool = True, keywords: List[str] = KEYWORDS):
+    manifest = load_manifest(manifest_path)
+    volumes = manifest["volumes"]
+    workers = workers or os.cpu_count() or 1
+
+    if fetch:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=fetch_concurrency) as pool:
+            fetched = list(pool.map(fetch_volume, volumes))
+        volumes = [volume for volume, ok in zip(volumes, fetched) if ok]
+        print(f"Fetched {len(volumes)} of {len(fetched)} volumes in {time.perf_counter() - start:.2f}s.")
+    else:
+        for volume in volumes:
+            if not os.path.exists(volume_paths(volume["output"])["trimmed"]):
+                print(f"Skipping volume {volume['name']}, it has not been fetched.")
+        volumes = [volume for volume in volumes if os.path.exists(volume_paths(volume["output"])["trimmed"])]
+    if not volumes:
+        print("No volumes to process.")
+        return
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(process_volume, volumes, [keywords] * len(volumes)))
+    for result in results:
+        print(f"  {result['name']}: {result['entries']:,} entries in {result['seconds']:.2f}s")
+    print(f"Parsed and counted {len(results)} volumes with {workers} workers in "
+          f"{time.perf_counter() - start:.2f}s.")
+    if not any(result["entries"] for result in results):
+        print("No entries in any volume, nothing to merge.")
+        return
+
+    start = time.perf_counter()
+    count = merge_volumes(volumes, manifest["output"])
+    paths = volume_paths(manifest["output"])
+    print(f"Merged {count:,} entries into {paths['parsed']} and {paths['stats']} "
+          f"in {time.perf_counter() - start:.2f}s.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch, parse and count many diary volumes, then merge them.")
+    parser.add_argument("manifest", nargs="?", default=MANIFEST_FILE,
+                        help="JSON manifest of volumes (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="processes to parse volumes with (default: one per CPU)")
+    parser.add_argument("--fetch-concurrency", type=int, default=FETCH_CONCURRENCY,
+                        help="volumes to download at once (default: %(default)s)")
+    parser.add_argument("--no-fetch", action="store_true",
+                        help="use the trimmed volumes from an earlier run instead of fetching")
+    args = parser.parse_args()
+
+    try:
+        run_batch(args.manifest, args.workers, args.fetch_concurrency, fetch=not args.no_fetch)
+    except FileNotFoundError as e:
+        print(f"Error: {e.filename} not found.")
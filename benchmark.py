@@ -0,0 +1,379 @@
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import platform
+import pstats
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from check_dates import check_dates
+from compression import open_file
+from diary_entry import Entry
+from extract_places import PlaceMatcher, load_gazetteer
+from footnote_store import FootnoteStore, footnotes_path_for
+from generate_stats import KEYWORDS, KeywordMatcher, count_occurrences, generate_stats, rollup_path
+from keyword_trends import compute_trends
+from make_corpus import write_corpus
+from parse_diary import classify_line, is_restoration, iter_entries, process_diary, process_inline_footnotes
+
+SAMPLE_FILE = "data/diary-sample.txt"
+
+# Stage benchmarks: corpus sizes as multiples of the sample, and the stages run on each
+STAGE_SCALES = [1, 10, 100]
+STAGES = ["parse", "check", "stats"]
+# Functions listed per stage, by own time
+TOP_FUNCTIONS = 10
+# Slowdown (fraction of the old wall time) reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.10
+# Corpus size for the gzip benchmark
+GZIP_SCALE = 100
+# Entries (one a day) and window widths for the trends benchmark
+TRENDS_SIZES = [10_000, 40_000]
+TRENDS_WINDOWS = [7, 30, 365]
+
+def time_call(func: Callable, repeat: int = 5) -> float:
+    """Return the best wall time in seconds over `repeat` calls of func()."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def make_annotated_entry(size_chars: int) -> str:
+    """Build a long entry with a mix of restorations and inline notes."""
+    chunk = ("So to my office [he] and there did business till noon, "
+             "[The Navy Office was then in Seething Lane, Crutched Friars.] "
+             "and then home to dinner [i.e. a cold chine of beef] with my wife. ")
+    return (chunk * (size_chars // len(chunk) + 1))[:size_chars]
+
+def process_inline_footnotes_loop(text: str, start_index: int, footnotes_list: List[str]) -> str:
+    """The original per-character version of process_inline_footnotes, as a reference."""
+    result = ""
+    i = 0
+    n = len(text)
+    while i < n:
+        if text[i] == '[':
+            j = text.find(']', i)
+            if j != -1:
+                content = text[i+1:j]
+                if is_restoration(content):
+                    result += text[i:j+1]
+                else:
+                    footnotes_list.append(content)
+                    result += f"{{{start_index + len(footnotes_list) - 1}}}"
+                i = j + 1
+                continue
+        result += text[i]
+        i += 1
+    return result
+
+def bench_inline_footnotes():
+    print("process_inline_footnotes, INLINE_NOTE_RE against the per-character loop:")
+    for size in (1_000, 10_000, 100_000):
+        text = make_annotated_entry(size)
+        new_notes, old_notes = [], []
+        assert process_inline_footnotes(text, 0, new_notes) == process_inline_footnotes_loop(text, 0, old_notes)
+        assert new_notes == old_notes
+        new = time_call(lambda: process_inline_footnotes(text, 0, []))
+        old = time_call(lambda: process_inline_footnotes_loop(text, 0, []))
+        print(f"  {size:>7,} chars: regex {new * 1000:8.3f} ms ({size / new / 1e6:5.1f} M chars/s), "
+              f"loop {old * 1000:8.3f} ms ({size / old / 1e6:5.1f} M chars/s), {old / new:5.1f}x faster")
+
+def bench_classifier():
+    with open(SAMPLE_FILE, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    seconds = time_call(lambda: [classify_line(line) for line in lines])
+    print("classify_line:")
+    print(f"  {len(lines):,} lines: {seconds * 1000:8.3f} ms ({len(lines) / seconds:,.0f} lines/s)")
+
+def bench_keywords():
+    with open(SAMPLE_FILE, 'r', encoding='utf-8') as f:
+        texts = [entry['entry'] for entry in iter_entries(f)]
+    vocabulary = sorted({word.lower() for text in texts for word in text.split() if word.isalpha()})
+
+    print(f"keyword counting over {len(texts)} entries:")
+    for n in (14, 100, 1000):
+        keywords = vocabulary[::max(1, len(vocabulary) // n)][:n]
+        matcher = KeywordMatcher(keywords)
+        seconds = time_call(lambda: [matcher.count(text) for text in texts], repeat=3)
+        line = f"  {n:>5} keywords: KeywordMatcher {seconds * 1000:8.1f} ms"
+        if n <= 100:
+            seconds = time_call(lambda: [[count_occurrences(text, k) for k in keywords] for text in texts], repeat=1)
+            line += f", count_occurrences loop {seconds * 1000:8.1f} ms"
+        print(line)
+
+def make_gazetteer(size: int) -> dict:
+    """The shipped gazetteer padded with made-up one to three word place names."""
+    gazetteer = load_gazetteer()
+    syllables = ["ash", "bury", "cot", "den", "ford", "gate", "ham", "ley", "mor", "ton", "wick", "wold"]
+    suffixes = ["", " Street", " Lane", " Yard", " Green", " Upon Thames"]
+    i = 0
+    while len(gazetteer) < size:
+        stem = i // len(suffixes)
+        name = "".join(syllables[(stem // len(syllables) ** k) % len(syllables)] for k in range(4)).title()
+        name += suffixes[i % len(suffixes)]
+        gazetteer[name] = [name]
+        i += 1
+    return gazetteer
+
+def bench_places():
+    with open(SAMPLE_FILE, 'r', encoding='utf-8') as f:
+        entries = list(iter_entries(f))
+    texts = [entry['entry'] for entry in entries] + [fn for entry in entries for fn in entry['footnotes']]
+    chars = sum(len(text) for text in texts)
+
+    print(f"place matching over {chars:,} chars:")
+    for size in (100, 1_000, 10_000, 50_000):
+        gazetteer = make_gazetteer(size)
+        start = time.perf_counter()
+        matcher = PlaceMatcher(gazetteer)
+        build = time.perf_counter() - start
+        seconds = time_call(lambda: [matcher.find(text) for text in texts], repeat=3)
+        print(f"  {len(gazetteer):>6,} places: build {build * 1000:7.1f} ms, scan {seconds * 1000:7.1f} ms "
+              f"({chars / seconds / 1e6:.1f} M chars/s)")
+
+def bench_footnote_sidecar():
+    """NDJSON bytes and decode time for a date-only reader, with footnotes inline and interned."""
+    print("footnote table, date-only read of the parsed sample:")
+    with tempfile.TemporaryDirectory() as workdir:
+        for split in (False, True):
+            path = os.path.join(workdir, f"parsed-{split}.ndjson")
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                process_diary(SAMPLE_FILE, path, split_footnotes=split)
+
+            def read_dates():
+                with open(path, 'r', encoding='utf-8') as f:
+                    return [json.loads(line)['date'] for line in f]
+            seconds = time_call(read_dates)
+            line = f"  {'split' if split else 'inline':>6}: {os.path.getsize(path):>9,} bytes, {seconds * 1000:7.2f} ms"
+            if split:
+                counts = FootnoteStore(path).repeat_counts()
+                line += (f", table {os.path.getsize(footnotes_path_for(path)):,} bytes for "
+                         f"{sum(counts.values()):,} footnotes ({len(counts):,} unique)")
+            print(line)
+
+def traced_size(build: Callable) -> tuple[int, object]:
+    """Bytes still allocated by build() once it returns, and its result."""
+    tracemalloc.start()
+    try:
+        result = build()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+def bench_entry_memory():
+    """Memory held by a parsed corpus as Entry objects and as the NDJSON dicts."""
+    print("memory of parsed entries held in a list:")
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "diary.txt")
+        for scale in (1, 10):
+            write_corpus(path, scale)
+            with open(path, 'r', encoding='utf-8') as f:
+                rows = [entry.to_json() for entry in iter_entries(f)]
+            entries_size, entries = traced_size(lambda: [Entry.from_json(row) for row in rows])
+            dicts_size, _ = traced_size(lambda: [json.loads(row) for row in rows])
+            print(f"  {scale:>3}x, {len(entries):>6,} entries: Entry {entries_size / 2**20:7.2f} MB, "
+                  f"dicts {dicts_size / 2**20:7.2f} MB ({1 - entries_size / dicts_size:.0%} less)")
+
+def io_counters() -> Optional[Dict[str, int]]:
+    """Bytes read and written by this process through system calls so far (Linux only)."""
+    try:
+        with open("/proc/self/io", 'r') as f:
+            return {name: int(value) for name, value in (line.split(":") for line in f)}
+    except OSError:
+        return None
+
+def bench_gzip(scale: float = GZIP_SCALE):
+    print(f"gzip artifacts, parse + check + stats on a {scale:g}x corpus:")
+    with tempfile.TemporaryDirectory() as workdir:
+        plain = stage_paths(workdir)
+        write_corpus(plain["diary.txt"], scale)
+        with open(plain["diary.txt"], 'rb') as src, open_file(stage_paths(workdir, True)["diary.txt"], 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+
+        for label, compressed in (("plain", False), ("gzip", True)):
+            paths = stage_paths(workdir, compressed)
+            before = io_counters()
+            start = time.perf_counter()
+            for stage in STAGES:
+                run_stage(stage, workdir, compressed)
+            wall = time.perf_counter() - start
+            after = io_counters()
+
+            files = [paths["diary.txt"], paths["parsed.ndjson"], paths["stats.csv"],
+                     rollup_path(paths["stats.csv"], "monthly"), rollup_path(paths["stats.csv"], "yearly")]
+            on_disk = sum(os.path.getsize(path) for path in files)
+            line = f"  {label:<5} {wall:7.2f}s, files {on_disk / 2**20:7.1f} MB"
+            if before is not None and after is not None:
+                line += (f", read {(after['rchar'] - before['rchar']) / 2**20:7.1f} MB"
+                         f", written {(after['wchar'] - before['wchar']) / 2**20:7.1f} MB")
+            print(line)
+
+def make_trend_rows(days: int, seed: int = 0) -> List[tuple[int, int, tuple[int, ...]]]:
+    """One stats row a day, each mentioning a few keywords, as keyword_trends.read_stats returns them."""
+    rng = random.Random(seed)
+    start = Entry("1660-01-01", "").ordinal
+    return [(start + day, rng.randrange(50, 800), tuple(rng.choice((0, 0, 0, 0, 1, 2)) for _ in KEYWORDS))
+            for day in range(days)]
+
+def bench_trends(sizes: List[int] = TRENDS_SIZES, windows: List[int] = TRENDS_WINDOWS):
+    """Time per entry of the rolling aggregates, which should not grow with corpus size or window width."""
+    print(f"keyword trends, {len(KEYWORDS)} keywords:")
+    for size in sizes:
+        rows = make_trend_rows(size)
+        for width in windows:
+            t = time_call(lambda: compute_trends(KEYWORDS, rows, [width]), repeat=3)
+            print(f"  {size:>7,} entries, {width:>3}-day window: {t:6.2f}s, {t / size * 1e6:5.1f} us/entry")
+
+BENCHMARKS = {
+    "inline_footnotes": bench_inline_footnotes,
+    "classifier": bench_classifier,
+    "keywords": bench_keywords,
+    "places": bench_places,
+    "footnote_sidecar": bench_footnote_sidecar,
+    "entry_memory": bench_entry_memory,
+    "gzip": bench_gzip,
+    "trends": bench_trends,
+}
+
+def stage_paths(workdir: str, compressed: bool = False) -> Dict[str, str]:
+    suffix = ".gz" if compressed else ""
+    return {name: os.path.join(workdir, name + suffix) for name in ("diary.txt", "parsed.ndjson", "stats.csv")}
+
+def run_stage(stage: str, workdir: str, compressed: bool = False):
+    """Run one stage on the files in workdir (their .gz variants if compressed), with its output silenced."""
+    paths = stage_paths(workdir, compressed)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if stage == "parse":
+            process_diary(paths["diary.txt"], paths["parsed.ndjson"])
+        elif stage == "check":
+            check_dates(paths["parsed.ndjson"])
+        elif stage == "stats":
+            generate_stats(paths["parsed.ndjson"], paths["stats.csv"])
+
+def measure_stage(stage: str, workdir: str) -> Dict:
+    """
+    Time one stage, then run it again under cProfile for per-function times.
+
+    Called in a fresh process per stage, so the peak RSS is the stage's own.
+    """
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    run_stage(stage, workdir)
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss *= 1 if sys.platform == "darwin" else 1024
+
+    profiler = cProfile.Profile()
+    profiler.runcall(run_stage, stage, workdir)
+    stats = pstats.Stats(profiler).stats
+    functions = []
+    for (file, line, name), (_, calls, own, cumulative, _) in sorted(
+            stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_FUNCTIONS]:
+        functions.append({
+            "function": f"{os.path.basename(file)}:{line}({name})" if line else name,
+            "calls": calls,
+            "own_s": round(own, 6),
+            "cumulative_s": round(cumulative, 6),
+        })
+    return {"wall_s": wall, "cpu_s": cpu, "peak_rss_mb": peak_rss / 2**20, "functions": functions}
+
+def bench_stages(scales: List[float] = STAGE_SCALES, save: Optional[str] = None, compare: Optional[str] = None):
+    """Run parse, check and stats on synthetic corpora of each scale, each stage in its own process."""
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as workdir:
+            paths = stage_paths(workdir)
+            corpus = write_corpus(paths["diary.txt"], scale)
+            print(f"{scale:g}x corpus: {corpus['bytes'] / 2**20:.1f} MB, {corpus['lines']:,} lines, "
+                  f"{corpus['entries']:,} entries")
+            for stage in STAGES:
+                input_file = paths["diary.txt"] if stage == "parse" else paths["parsed.ndjson"]
+                input_bytes = os.path.getsize(input_file)
+                child = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", stage, workdir],
+                                       capture_output=True, text=True, check=True)
+                result = json.loads(child.stdout)
+                result.update({
+                    "scale": scale,
+                    "stage": stage,
+                    "input_bytes": input_bytes,
+                    "mb_per_s": input_bytes / 2**20 / result["wall_s"],
+                    "lines_per_s": corpus["lines"] / result["wall_s"] if stage == "parse" else None,
+                    "entries_per_s": corpus["entries"] / result["wall_s"],
+                })
+                results.append(result)
+                print(f"  {stage:<6} {result['wall_s']:8.3f}s wall {result['cpu_s']:8.3f}s cpu "
+                      f"{result['mb_per_s']:7.2f} MB/s {result['entries_per_s']:10,.0f} entries/s "
+                      f"peak RSS {result['peak_rss_mb']:6.1f} MB")
+                top = result["functions"][0]
+                print(f"         slowest function: {top['function']} {top['own_s']:.3f}s own")
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if save:
+        with open(save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {save}")
+    if compare:
+        compare_stages(compare, report)
+
+def compare_stages(baseline_file: str, report: Dict):
+    """Print the change in wall time and peak RSS against an earlier saved run."""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {(r["scale"], r["stage"]): r for r in json.load(f)["results"]}
+
+    print(f"\nCompared with {baseline_file}:")
+    regressions = 0
+    for result in report["results"]:
+        old = baseline.get((result["scale"], result["stage"]))
+        if old is None:
+            continue
+        change = result["wall_s"] / old["wall_s"] - 1
+        flag = ""
+        if change > REGRESSION_THRESHOLD:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"  {result['scale']:g}x {result['stage']:<6} {old['wall_s']:8.3f}s -> {result['wall_s']:8.3f}s "
+              f"({change:+.1%}), peak RSS {old['peak_rss_mb']:.1f} -> {result['peak_rss_mb']:.1f} MB{flag}")
+    if regressions:
+        print(f"{regressions} stage(s) more than {REGRESSION_THRESHOLD:.0%} slower.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks and per-stage scaling benchmarks.")
+    parser.add_argument("names", nargs="*", metavar="NAME",
+                        help=f"micro-benchmarks to run: {', '.join(BENCHMARKS)} (default: all, unless --stages is given)")
+    parser.add_argument("--stages", action="store_true",
+                        help="benchmark parse, check and stats on synthetic corpora")
+    parser.add_argument("--scales", nargs="+", type=float, default=STAGE_SCALES,
+                        help="corpus sizes for --stages, as multiples of the sample (default: 1 10 100)")
+    parser.add_argument("--save", metavar="FILE", help="save --stages results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare --stages results with a saved JSON run")
+    parser.add_argument("--measure", nargs=2, metavar=("STAGE", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure_stage(*args.measure)))
+        sys.exit()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    for name in args.names or ([] if args.stages else list(BENCHMARKS)):
+        BENCHMARKS[name]()
+    if args.stages:
+        bench_stages(args.scales, args.save, args.compare)
@@ -1,60 +1,238 @@
+import argparse
 import json
-import sys
-from datetime import datetime
-
-def check_dates(file_path: str):
-    previous_date = None
-    previous_line_num = 0
-    previous_entry_text = ""
-    
-    issues = []
-    
-    print(f"Checking {file_path}...")
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for i, line in enumerate(f, 1):
-            try:
-                entry = json.loads(line)
-                date_str = entry.get('date')
-                current_entry_text = entry.get('entry', '')[:100] + "..." if len(entry.get('entry', '')) > 100 else entry.get('entry', '')
-
-                if not date_str:
-                    print(f"Line {i}: Missing date")
+import os
+import shutil
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Mapping, Optional, TextIO, Union
+
+from compression import open_file
+from diary_entry import Entry
+from profiling import Profiler, profile_stage
+
+# Entries more than this many days apart are reported as a gap
+MAX_GAP_DAYS = 31
+
+# Issues of each type kept in memory and printed by DateChecker.report
+REPORTED_ISSUES = 100
+
+def snippet(text: str) -> str:
+    return text[:100] + "..." if len(text) > 100 else text
+
+def entry_from_row(row: Mapping) -> Union[Entry, Dict]:
+    """Entry for the date checker from a decoded row, or the issue that makes its date unusable."""
+    date_str = row.get('date')
+    if not date_str:
+        return {"type": "missing_date"}
+    try:
+        # Footnotes are not needed to check dates
+        return Entry(date_str, row.get('entry', ''))
+    except ValueError:
+        return {"type": "invalid_date", "date": date_str}
+
+def describe(issue: Dict) -> str:
+    kind = issue["type"]
+    if kind == "invalid_json":
+        return f"Line {issue['line']}: Invalid JSON"
+    if kind == "missing_date":
+        return f"Line {issue['line']}: Missing date"
+    if kind == "invalid_date":
+        return f"Line {issue['line']}: Invalid date format: {issue['date']}"
+    if kind == "impossible_date":
+        return f"Line {issue['line']}: No such day: {issue['date']}"
+    if kind == "out_of_order":
+        return (f"Line {issue['line']} ({issue['current_date']}) is BEFORE Line {issue['previous_line']} ({issue['previous_date']}) by {issue['diff_days']} days.\n"
+                f"  Curr: {issue['current_text']}\n"
+                f"  Prev: {issue['previous_text']}\n" + "-" * 40)
+    if kind == "duplicate":
+        return f"Line {issue['line']} has the same date as Line {issue['previous_line']} ({issue['date']})."
+    return (f"Line {issue['line']} ({issue['date']}) is {issue['gap_days']} days after "
+            f"Line {issue['previous_line']} ({issue['previous_date']}).")
+
+# Issue types in the order of the report's summary, with the count line for each
+ISSUE_HEADINGS = {
+    "invalid_json": "{count} lines with invalid JSON",
+    "missing_date": "{count} entries without a date",
+    "invalid_date": "{count} entries with an invalid date",
+    "impossible_date": "{count} entries dated a day that does not exist",
+    "out_of_order": "{count} out-of-order entries",
+    "duplicate": "{count} entries with the same date as the one before",
+    "gap": "{count} gaps of more than {max_gap} days",
+}
+
+class DateChecker:
+    """
+    Check entries added one at a time for date problems.
+
+    Finds rows without a usable date, days that do not exist, entries dated
+    before the previous one or on the same day, and gaps of more than
+    max_gap days (0 to not check). Dates are compared as Entry keys and
+    ordinals. Each issue is written to out as an NDJSON line when found;
+    only counts and the first REPORTED_ISSUES of each type are kept for
+    report(), so memory does not grow with the number of entries. The kept
+    issues are in line order, as they are found.
+    """
+
+    def __init__(self, max_gap: int = MAX_GAP_DAYS, out: Optional[TextIO] = None, file: Optional[str] = None):
+        self.max_gap = max_gap
+        self.out = out
+        self.file = file
+        self.previous = None
+        self.previous_line_num = 0
+        self.counts = Counter()
+        self.kept = Counter()
+        self.issues = []
+
+    def add_issue(self, issue: Dict):
+        if self.file is not None:
+            issue["file"] = self.file
+        kind = issue["type"]
+        self.counts[kind] += 1
+        if self.kept[kind] < REPORTED_ISSUES:
+            self.kept[kind] += 1
+            self.issues.append(issue)
+        if self.out is not None:
+            self.out.write(json.dumps(issue) + '\n')
+
+    def add(self, i: int, entry: Union[Entry, Mapping]):
+        """Check entry number i (1-based line number) against the previous one."""
+        if not isinstance(entry, Entry):
+            entry = entry_from_row(entry)
+            if not isinstance(entry, Entry):
+                entry["line"] = i
+                self.add_issue(entry)
+                return
+        if not entry.is_valid():
+            self.add_issue({"type": "impossible_date", "line": i, "date": entry.date})
+            return
+
+        previous = self.previous
+        if previous is not None:
+            if entry.key < previous.key:
+                self.add_issue({
+                    "type": "out_of_order",
+                    "line": i,
+                    "current_date": entry.date,
+                    "current_text": snippet(entry.text),
+                    "previous_date": previous.date,
+                    "previous_line": self.previous_line_num,
+                    "previous_text": snippet(previous.text),
+                    "diff_days": previous.ordinal - entry.ordinal
+                })
+            elif entry.key == previous.key:
+                self.add_issue({"type": "duplicate", "line": i, "date": entry.date,
+                                "previous_line": self.previous_line_num})
+            elif self.max_gap and entry.ordinal - previous.ordinal > self.max_gap:
+                self.add_issue({"type": "gap", "line": i, "date": entry.date, "previous_date": previous.date,
+                                "previous_line": self.previous_line_num,
+                                "gap_days": entry.ordinal - previous.ordinal})
+
+        self.previous = entry
+        self.previous_line_num = i
+
+    def report(self):
+        """Print the kept issues in line order, then the number of each type."""
+        for issue in self.issues:
+            print(describe(issue))
+        for kind, heading in ISSUE_HEADINGS.items():
+            count = self.counts[kind]
+            if not count:
+                continue
+            line = f"Found {heading.format(count=count, max_gap=self.max_gap)}"
+            if count > self.kept[kind]:
+                line += f", {count - self.kept[kind]} not shown"
+            print(line + ".")
+        if not self.counts:
+            print("All entries are in chronological order.")
+
+def check_file(file_path: str, max_gap: int = MAX_GAP_DAYS, issues_path: Optional[str] = None,
+               profile: Optional[Profiler] = None) -> DateChecker:
+    """Check one NDJSON file in a single pass, writing its issues to issues_path if given."""
+    out = open_file(issues_path, 'w', encoding='utf-8', newline='\n') if issues_path else None
+    checker = DateChecker(max_gap, out, file_path)
+
+    lines = 0
+    try:
+        with open_file(file_path, 'r', encoding='utf-8') as f, profile_stage(profile, "check") as check_stage:
+            for i, line in enumerate(f, 1):
+                lines = i
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    checker.add_issue({"type": "invalid_json", "line": i})
                     continue
-                
-                current_date = datetime.strptime(date_str, "%Y-%m-%d")
-                
-                if previous_date:
-                    if current_date < previous_date:
-                        issues.append({
-                            "line": i,
-                            "current_date": date_str,
-                            "current_text": current_entry_text,
-                            "previous_date": previous_date.strftime("%Y-%m-%d"),
-                            "previous_line": previous_line_num,
-                            "previous_text": previous_entry_text,
-                            "diff_days": (previous_date - current_date).days
-                        })
-                        
-                previous_date = current_date
-                previous_line_num = i
-                previous_entry_text = current_entry_text
-                
-            except json.JSONDecodeError:
-                print(f"Line {i}: Invalid JSON")
-            except ValueError as e:
-                print(f"Line {i}: Invalid date format: {e}")
-
-    if issues:
-        print(f"Found {len(issues)} out-of-order entries:")
-        for issue in issues:
-            print(f"Line {issue['line']} ({issue['current_date']}) is BEFORE Line {issue['previous_line']} ({issue['previous_date']}) by {issue['diff_days']} days.")
-            print(f"  Curr: {issue['current_text']}")
-            print(f"  Prev: {issue['previous_text']}")
-            print("-" * 40)
-    else:
-        print("All entries are in chronological order.")
+                if profile is None:
+                    checker.add(i, entry)
+                else:
+                    start = time.perf_counter()
+                    checker.add(i, entry)
+                    profile.add_time("check_entry", time.perf_counter() - start, entry.get('date'))
+            check_stage["lines"] = lines
+    finally:
+        if out is not None:
+            out.close()
+            # Leaves the checker picklable, to return it from a worker process
+            checker.out = None
+    return checker
+
+def check_dates(file_path: str, profile: Optional[Profiler] = None, max_gap: int = MAX_GAP_DAYS,
+                issues_path: Optional[str] = None):
+    print(f"Checking {file_path}...")
+    checker = check_file(file_path, max_gap, issues_path, profile)
+
+    with profile_stage(profile, "report"):
+        checker.report()
+
+def check_many(file_paths: List[str], workers: int = 1, max_gap: int = MAX_GAP_DAYS,
+               issues_path: Optional[str] = None):
+    """
+    Check several NDJSON files, each in its own process.
+
+    Files are checked in a process pool when workers > 1. Reports are
+    printed and issues written to issues_path in the order of file_paths;
+    each file's issues go to a part file that is appended in turn.
+    """
+    parts = [f"{issues_path}.{k}.part" if issues_path else None for k in range(len(file_paths))]
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    out = open_file(issues_path, 'w', encoding='utf-8', newline='\n') if issues_path else None
+    try:
+        futures = [pool.submit(check_file, path, max_gap, part) for path, part in zip(file_paths, parts)] if pool else []
+        for k, (path, part) in enumerate(zip(file_paths, parts)):
+            print(f"Checking {path}...")
+            checker = futures[k].result() if pool is not None else check_file(path, max_gap, part)
+            checker.report()
+            if out is not None:
+                with open(part, 'r', encoding='utf-8') as f:
+                    shutil.copyfileobj(f, out)
+                os.remove(part)
+    finally:
+        if out is not None:
+            out.close()
+        if pool is not None:
+            pool.shutdown()
 
 if __name__ == "__main__":
-    check_dates("data/diary-parsed.ndjson")
+    parser = argparse.ArgumentParser(description="Check the dates of parsed entries: order, gaps, duplicates and impossible days.")
+    parser.add_argument("files", nargs="*", default=["data/diary-parsed.ndjson"],
+                        help="parsed NDJSON files to check, .gz ones decompressed as they are read "
+                             "(default: data/diary-parsed.ndjson)")
+    parser.add_argument("--max-gap", type=int, default=MAX_GAP_DAYS,
+                        help="report entries more than this many days after the previous one, 0 to not check (default: %(default)s)")
+    parser.add_argument("--issues", metavar="FILE",
+                        help="also write every issue to FILE as NDJSON, gzip-compressed if it ends in .gz")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes to check several files with (default: 1)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="write a JSON report of stage times and the slowest entries")
+    args = parser.parse_args()
 
+    if len(args.files) > 1:
+        if args.profile:
+            parser.error("--profile needs a single file")
+        check_many(args.files, args.workers, args.max_gap, args.issues)
+    else:
+        profile = Profiler("check_dates") if args.profile else None
+        check_dates(args.files[0], profile, args.max_gap, args.issues)
+        if profile is not None:
+            profile.write(args.profile)
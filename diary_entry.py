@@ -0,0 +1,147 @@
+import calendar
+import json
+from array import array
+from datetime import MAXYEAR, MINYEAR, date as Date
+from typing import Dict, Iterable, List, Mapping, Union
+
+from diary_index import date_key
+
+class Entry:
+    """
+    One parsed diary entry, compact enough to hold a whole corpus in memory.
+
+    The date is kept as its integer key (YYYYMMDD, see diary_index.date_key)
+    and the footnotes as one string with the end offset of each note, so an
+    entry is one small object, two strings and at most one array instead of
+    a dict, a list and a string per footnote.
+
+    Reads like the entry dicts written to NDJSON: entry['date'],
+    entry.get('footnotes', []) and to_json() give the same values.
+
+    An entry read from the split layout keeps its row in pending until its
+    footnotes are first used, so they are only looked up in the footnote
+    table by readers that need them.
+    """
+
+    __slots__ = ("key", "text", "notes", "note_ends", "pending")
+
+    def __init__(self, date: str, text: str, footnotes: Iterable[str] = ()):
+        self.key = date_key(date)
+        self.text = text
+        self.pending = None
+        self.set_footnotes(footnotes)
+
+    def set_footnotes(self, footnotes: Iterable[str]):
+        self.notes = ""
+        self.note_ends = ()
+        footnotes = list(footnotes)
+        if footnotes:
+            self.notes = "".join(footnotes)
+            self.note_ends = array('I')
+            end = 0
+            for footnote in footnotes:
+                end += len(footnote)
+                self.note_ends.append(end)
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "Entry":
+        """
+        Entry from a parsed row, raising KeyError or ValueError if its date is missing or malformed.
+
+        A split-layout row (a footnote_store.LazyEntry) is kept as pending
+        rather than asked for its footnotes.
+        """
+        if 'footnote_ids' in data:
+            entry = cls(data['date'], data.get('entry', ''))
+            entry.pending = data
+            return entry
+        return cls(data['date'], data.get('entry', ''), data.get('footnotes', []))
+
+    @classmethod
+    def from_json(cls, row: Union[str, bytes]) -> "Entry":
+        return cls.from_dict(json.loads(row))
+
+    @property
+    def date(self) -> str:
+        return f"{self.key // 10000:04d}-{self.key // 100 % 100:02d}-{self.key % 100:02d}"
+
+    @property
+    def year(self) -> int:
+        return self.key // 10000
+
+    @property
+    def month(self) -> int:
+        return self.key // 100 % 100
+
+    @property
+    def day(self) -> int:
+        return self.key % 100
+
+    def is_valid(self) -> bool:
+        """Whether the date exists, e.g. not 30 February or in year 0."""
+        return (MINYEAR <= self.year <= MAXYEAR and 1 <= self.month <= 12
+                and 1 <= self.day <= calendar.monthrange(self.year, self.month)[1])
+
+    @property
+    def ordinal(self) -> int:
+        """
+        Day number as date.toordinal(), for day differences without parsing.
+
+        An impossible day runs on into the next month (30 February counts as
+        2 March), so check is_valid() where that matters.
+        """
+        return Date(self.year, self.month, 1).toordinal() + self.day - 1
+
+    def load_footnotes(self):
+        """Fetch the footnotes of a pending row, once."""
+        if self.pending is not None:
+            pending, self.pending = self.pending, None
+            self.set_footnotes(pending['footnotes'])
+
+    def footnote(self, i: int) -> str:
+        self.load_footnotes()
+        start = self.note_ends[i - 1] if i else 0
+        return self.notes[start:self.note_ends[i]]
+
+    @property
+    def footnote_count(self) -> int:
+        self.load_footnotes()
+        return len(self.note_ends)
+
+    @property
+    def footnotes(self) -> List[str]:
+        self.load_footnotes()
+        return [self.footnote(i) for i in range(len(self.note_ends))]
+
+    def __getitem__(self, key: str):
+        if key == 'date':
+            return self.date
+        if key == 'entry':
+            return self.text
+        if key == 'footnotes':
+            return self.footnotes
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict:
+        return {"date": self.date, "entry": self.text, "footnotes": self.footnotes}
+
+    def to_json(self) -> str:
+        """The NDJSON row, identical to json.dumps of the entry dict."""
+        return json.dumps(self.to_dict())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Entry):
+            return NotImplemented
+        self.load_footnotes()
+        other.load_footnotes()
+        return (self.key, self.text, self.notes, list(self.note_ends)) == \
+               (other.key, other.text, other.notes, list(other.note_ends))
+
+    def __repr__(self) -> str:
+        return f"Entry({self.date!r}, {len(self.text)} chars, {self.footnote_count} footnotes)"
@@ -0,0 +1,172 @@
+import bisect
+import json
+import mmap
+import os
+import struct
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+from compression import is_compressed
+from footnote_store import load_row, open_store
+
+# File layout: header, then the keys, offsets and lengths arrays, all sorted by key
+INDEX_MAGIC = b"PEPYSIDX"
+INDEX_VERSION = 1
+# magic, version, entry count, NDJSON size, NDJSON mtime (ns)
+HEADER = struct.Struct("<8sIIqq")
+
+def index_path_for(ndjson_path: str) -> str:
+    return ndjson_path + ".idx"
+
+def date_key(date: str) -> int:
+    """Sortable integer key for a 'YYYY-MM-DD' date, e.g. 16600101. Does not validate the day."""
+    year, month, day = date.split('-')
+    return int(year) * 10000 + int(month) * 100 + int(day)
+
+def row_date(row: str) -> str:
+    """Read the date from an NDJSON row written by parse_diary, without decoding the rest."""
+    prefix = '{"date": "'
+    if row.startswith(prefix):
+        return row[len(prefix):row.index('"', len(prefix))]
+    return json.loads(row)["date"]
+
+class IndexWriter:
+    """Collect (date, byte offset, length) for each NDJSON row and write the sorted index."""
+
+    def __init__(self, ndjson_path: str):
+        self.ndjson_path = ndjson_path
+        self.entries = []
+
+    @classmethod
+    def resume(cls, ndjson_path: str, end: int) -> Optional["IndexWriter"]:
+        """
+        Continue the current index of ndjson_path, keeping the rows before byte offset end.
+
+        For appending to the NDJSON after truncating it at end. Returns None
+        if the index is missing or stale.
+        """
+        index = read_index(ndjson_path)
+        if index is None:
+            return None
+        writer = cls(ndjson_path)
+        writer.entries = [entry for entry in zip(*index) if entry[1] < end]
+        return writer
+
+    def add_row(self, row: str, offset: int):
+        """Record a row (without its newline) that was written at byte offset."""
+        self.entries.append((date_key(row_date(row)), offset, len(row.encode('utf-8'))))
+
+    def close(self):
+        self.entries.sort()
+        keys = array('i', (key for key, _, _ in self.entries))
+        offsets = array('q', (offset for _, offset, _ in self.entries))
+        lengths = array('I', (length for _, _, length in self.entries))
+
+        stat = os.stat(self.ndjson_path)
+        with open(index_path_for(self.ndjson_path), 'wb') as f:
+            f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, len(keys), stat.st_size, stat.st_mtime_ns))
+            keys.tofile(f)
+            offsets.tofile(f)
+            lengths.tofile(f)
+
+def read_index(ndjson_path: str) -> Optional[tuple[array, array, array]]:
+    """The keys, offsets and lengths arrays of ndjson_path's index, or None if it is missing or stale."""
+    try:
+        with open(index_path_for(ndjson_path), 'rb') as f:
+            magic, version, count, size, mtime_ns = HEADER.unpack(f.read(HEADER.size))
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                return None
+            stat = os.stat(ndjson_path)
+            if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                return None
+            keys = array('i')
+            offsets = array('q')
+            lengths = array('I')
+            keys.fromfile(f, count)
+            offsets.fromfile(f, count)
+            lengths.fromfile(f, count)
+    except (FileNotFoundError, struct.error, EOFError):
+        return None
+    return keys, offsets, lengths
+
+def build_index(ndjson_path: str):
+    """Write the index for an existing NDJSON file."""
+    writer = IndexWriter(ndjson_path)
+    offset = 0
+    with open(ndjson_path, 'rb') as f:
+        for raw in f:
+            row = raw.rstrip(b'\n').decode('utf-8')
+            if row.strip():
+                writer.add_row(row, offset)
+            offset += len(raw)
+    writer.close()
+
+class ParsedDiary:
+    """
+    Random access to diary-parsed.ndjson by date, through its sidecar index.
+
+    The NDJSON is memory-mapped and only the requested lines are decoded.
+    With in_memory it is read into memory instead, for long-running readers
+    while the file may be rewritten. A missing or stale index (the NDJSON
+    changed since it was written) is rebuilt first. Footnotes split into a
+    sidecar are loaded lazily.
+    """
+
+    def __init__(self, ndjson_path: str, in_memory: bool = False):
+        if is_compressed(ndjson_path):
+            raise ValueError(f"{ndjson_path} is compressed; random access needs the plain NDJSON")
+        self.ndjson_path = ndjson_path
+        if not self._load_index():
+            build_index(ndjson_path)
+            if not self._load_index():
+                raise ValueError(f"Could not build index for {ndjson_path}")
+
+        self.file = open(ndjson_path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if in_memory:
+            self.data = self.file.read()
+            self.file.close()
+        else:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.store = open_store(ndjson_path)
+
+    def _load_index(self) -> bool:
+        index = read_index(self.ndjson_path)
+        if index is None:
+            return False
+        self.keys, self.offsets, self.lengths = index
+        return True
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _load(self, i: int) -> Dict:
+        offset = self.offsets[i]
+        return load_row(self.data[offset:offset + self.lengths[i]], self.store)
+
+    def get(self, date: str) -> List[Dict]:
+        """All entries dated date ('YYYY-MM-DD'), in file order."""
+        key = date_key(date)
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_right(self.keys, key, lo)
+        return [self._load(i) for i in range(lo, hi)]
+
+    def range(self, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[Dict]:
+        """Entries dated from start to end inclusive, in date order. Either bound may be None."""
+        lo = bisect.bisect_left(self.keys, date_key(start)) if start else 0
+        hi = bisect.bisect_right(self.keys, date_key(end)) if end else len(self.keys)
+        for i in range(lo, hi):
+            yield self._load(i)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+        if self.store is not None:
+            self.store.close()
+
+    def __enter__(self) -> "ParsedDiary":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from generate_stats import read_entries
+
+GAZETTEER_FILE = "data/gazetteer.tsv"
+
+# Words, keeping apostrophes inside them (Paul's, Lincoln’s)
+TOKEN_RE = re.compile(r"\w+(?:['’]\w+)*")
+
+def normalize_token(token: str) -> str:
+    """Fold case, curly apostrophes and a trailing possessive: "Paul’s" -> "paul"."""
+    token = token.lower().replace('’', "'")
+    if token.endswith("'s"):
+        token = token[:-2]
+    return token
+
+def load_gazetteer(path: str = GAZETTEER_FILE) -> Dict[str, List[str]]:
+    """
+    Read a gazetteer file into {canonical name: [names to match]}.
+
+    Each line is a canonical name, optionally followed by a tab and variant
+    spellings separated by ';'. Blank lines and # comments are ignored.
+    """
+    gazetteer = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            name, _, variants = line.partition('\t')
+            names = gazetteer.setdefault(name.strip(), [name.strip()])
+            names.extend(v.strip() for v in variants.split(';') if v.strip())
+    return gazetteer
+
+class PlaceMatcher:
+    """
+    Find gazetteer places in text with a word-level trie built once.
+
+    The text is scanned once, and at each word the longest place name
+    starting there is taken, so "Westminster Hall" wins over "Westminster".
+    Words are compared after normalize_token, so case, curly apostrophes
+    and possessives do not matter, except that a word capitalised in the
+    gazetteer must also be capitalised in the text ("the Exchange" matches,
+    "the exchange of letters" does not).
+    """
+
+    def __init__(self, gazetteer: Dict[str, List[str]]):
+        self.root = {}
+        self.size = 0
+        for place, names in gazetteer.items():
+            for name in names:
+                self.add(name, place)
+
+    def add(self, name: str, place: str):
+        tokens = TOKEN_RE.findall(name)
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(normalize_token(token), {})
+        mask = tuple(token[0].isupper() for token in tokens)
+        existing = node.get(None)
+        if existing is not None:
+            # Same words under another spelling: only require the capitals both share
+            mask = tuple(a and b for a, b in zip(existing[1], mask))
+        else:
+            self.size += 1
+        node[None] = (place, mask)
+
+    def find(self, text: str) -> List[tuple[str, int, int]]:
+        """Return (place, start, end) character spans of place names in text."""
+        words = [(normalize_token(m.group()), m.group()[0].isupper(), m.start(), m.end())
+                 for m in TOKEN_RE.finditer(text)]
+        matches = []
+        i = 0
+        n = len(words)
+        while i < n:
+            node = self.root
+            best = None
+            j = i
+            while j < n:
+                node = node.get(words[j][0])
+                if node is None:
+                    break
+                j += 1
+                terminal = node.get(None)
+                if terminal is not None:
+                    place, mask = terminal
+                    if all(words[i + k][1] for k, required in enumerate(mask) if required):
+                        best = (place, j)
+            if best is None:
+                i += 1
+                continue
+            place, j = best
+            matches.append((place, words[i][2], words[j - 1][3]))
+            i = j
+        return matches
+
+def entry_places(entry: Dict, matcher: PlaceMatcher) -> List[Dict]:
+    """Place mentions in an entry and its footnotes, with character offsets into each text."""
+    mentions = []
+    texts = [("entry", None, entry.get('entry', ''))]
+    texts += [("footnote", i, footnote) for i, footnote in enumerate(entry.get('footnotes', []))]
+    for field, index, text in texts:
+        for place, start, end in matcher.find(text):
+            mention = {"place": place, "text": text[start:end], "field": field, "start": start, "end": end}
+            if index is not None:
+                mention["footnote"] = index
+            mentions.append(mention)
+    return mentions
+
+def extract_places(input_file: str, output_file: str, gazetteer_file: str = GAZETTEER_FILE,
+                   entries: Optional[Iterable[Dict]] = None):
+    """Write one {"date", "places"} line per parsed entry, in input order."""
+    matcher = PlaceMatcher(load_gazetteer(gazetteer_file))
+    print(f"Loaded {matcher.size} place names from {gazetteer_file}.")
+
+    if entries is None:
+        print(f"Extracting places from {input_file}...")
+        entries = read_entries(input_file)
+
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    totals = Counter()
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as out:
+        for entry in entries:
+            mentions = entry_places(entry, matcher)
+            totals.update(mention["place"] for mention in mentions)
+            out.write(json.dumps({"date": entry.get('date', ''), "places": mentions}) + '\n')
+            count += 1
+
+    print(f"Found {sum(totals.values()):,} place mentions in {count} entries.")
+    print(f"Output saved to {output_file}")
+    print("\nMost mentioned places:")
+    for place, mentions in totals.most_common(10):
+        print(f"  {place}: {mentions:,}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract gazetteer place mentions from the parsed diary.")
+    parser.add_argument("--gazetteer", default=GAZETTEER_FILE,
+                        help="gazetteer file of places and variant spellings (default: %(default)s)")
+    args = parser.parse_args()
+
+    extract_places("data/diary-parsed.ndjson", "data/diary-places.ndjson", args.gazetteer)
@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import random
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+from extract_places import PlaceMatcher, load_gazetteer
+from generate_stats import read_entries
+
+# Bump when PROMPT changes, so cached results are not reused
+PROMPT_VERSION = 1
+
+PROMPT = """You are given entries from the diary of Samuel Pepys.
+For each entry, list the journeys Pepys himself made that day, in order.
+Return one JSON list per entry, each journey as
+{"from": place or null, "to": place, "mode": "foot" | "coach" | "water" | "horse" | null}."""
+
+CACHE_FILE = "data/diary-trips-cache.ndjson"
+
+class StubBackend:
+    """
+    Deterministic local backend for tests and dry runs.
+
+    Treats the gazetteer places mentioned in an entry, in order, as a chain
+    of journeys. No model is called.
+    """
+
+    name = "stub"
+
+    def __init__(self):
+        self.matcher = PlaceMatcher(load_gazetteer())
+
+    async def extract(self, entries: List[Dict]) -> List[List[Dict]]:
+        results = []
+        for entry in entries:
+            trips = []
+            previous = None
+            for place, _, _ in self.matcher.find(entry.get('entry', '')):
+                if place != previous:
+                    trips.append({"from": previous, "to": place, "mode": None})
+                    previous = place
+            results.append(trips)
+        return results
+
+class HttpBackend:
+    """
+    Send batches to a model service over HTTP.
+
+    POSTs {"prompt", "prompt_version", "entries": [{"date", "entry"}]} as
+    JSON and expects {"results": [[trip, ...], ...]} with one list per entry.
+    """
+
+    name = "http"
+
+    def __init__(self, url: str, api_key: Optional[str] = None, timeout: float = 120.0):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def _post(self, entries: List[Dict]) -> List[List[Dict]]:
+        body = json.dumps({
+            "prompt": PROMPT,
+            "prompt_version": PROMPT_VERSION,
+            "entries": [{"date": entry.get('date', ''), "entry": entry.get('entry', '')} for entry in entries],
+        }).encode('utf-8')
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(self.url, data=body, headers=headers, method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            results = json.load(response)["results"]
+        if len(results) != len(entries):
+            raise ValueError(f"expected {len(entries)} results, got {len(results)}")
+        return results
+
+    async def extract(self, entries: List[Dict]) -> List[List[Dict]]:
+        return await asyncio.to_thread(self._post, entries)
+
+def load_backend(spec: str, url: Optional[str] = None):
+    """Backend from 'stub', 'http' or a 'module:factory' import path."""
+    if spec == "stub":
+        return StubBackend()
+    if spec == "http":
+        if not url:
+            raise ValueError("the http backend needs --backend-url")
+        return HttpBackend(url, os.environ.get("TRIPS_API_KEY"))
+    module_name, _, attribute = spec.partition(':')
+    return getattr(importlib.import_module(module_name), attribute)()
+
+class RateLimiter:
+    """Allow at most rate calls per second, shared by all workers."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_time = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class TripCache:
+    """
+    Trip results keyed by cache_key, in one NDJSON file of {"key", "trips"} lines.
+
+    The file is read once when opened. Each result is appended as soon as
+    it arrives, so an interrupted run keeps the batches it finished, and
+    close() rewrites the file with only the keys used in this run, so
+    results for edited or removed entries do not pile up.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.results = {}
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by an interrupted run
+                        continue
+                    self.results[record["key"]] = record["trips"]
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.out = open(path, 'a', encoding='utf-8', newline='\n')
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """The cached trips for key, or None on a miss."""
+        trips = self.results.get(key)
+        if trips is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.used.add(key)
+        return trips
+
+    def put(self, key: str, trips: List[Dict]):
+        self.results[key] = trips
+        self.used.add(key)
+        self.out.write(json.dumps({"key": key, "trips": trips}) + '\n')
+        self.out.flush()
+
+    def close(self):
+        """Rewrite the file with the results used in this run."""
+        self.out.close()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+            for key, trips in self.results.items():
+                if key in self.used:
+                    f.write(json.dumps({"key": key, "trips": trips}) + '\n')
+        os.replace(tmp_path, self.path)
+
+def cache_key(backend_name: str, entry: Dict) -> str:
+    """Key for an entry's result: its text, the prompt version and the backend."""
+    digest = hashlib.sha256(f"{backend_name}|{PROMPT_VERSION}|".encode())
+    digest.update(entry.get('entry', '').encode('utf-8'))
+    return digest.hexdigest()
+
+async def extract_all(entries: List[Dict], backend, cache: TripCache, concurrency: int = 4,
+                      batch_size: int = 8, rate: float = 2.0, max_attempts: int = 5) -> tuple[List, Dict]:
+    """
+    Extract trips for every entry, sending only entries missing from the cache.
+
+    Uncached entries are grouped into batches and processed by a bounded pool
+    of workers. Each call waits on the shared rate limiter, and failed calls
+    are retried with exponential backoff and jitter.
+    """
+    results = [None] * len(entries)
+    keys = [cache_key(backend.name, entry) for entry in entries]
+    pending = []
+    for i, key in enumerate(keys):
+        results[i] = cache.get(key)
+        if results[i] is None:
+            pending.append(i)
+
+    counts = {"cached": len(entries) - len(pending), "sent": len(pending), "batches": 0, "retries": 0}
+    queue = asyncio.Queue()
+    for start in range(0, len(pending), batch_size):
+        queue.put_nowait(pending[start:start + batch_size])
+    limiter = RateLimiter(rate)
+
+    async def worker():
+        while True:
+            try:
+                batch = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            for attempt in range(1, max_attempts + 1):
+                await limiter.wait()
+                try:
+                    trips = await backend.extract([entries[i] for i in batch])
+                    break
+                except Exception as e:
+                    if attempt == max_attempts:
+                        raise
+                    counts["retries"] += 1
+                    delay = min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+                    print(f"Batch failed ({e}), retrying in {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+            counts["batches"] += 1
+            for i, entry_trips in zip(batch, trips):
+                results[i] = entry_trips
+                cache.put(keys[i], entry_trips)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return results, counts
+
+def extract_trips(input_file: str, output_file: str, backend, concurrency: int = 4,
+                  batch_size: int = 8, rate: float = 2.0, cache_file: str = CACHE_FILE):
+    print(f"Extracting trips from {input_file} with the {backend.name} backend...")
+    entries = list(read_entries(input_file))
+    cache = TripCache(cache_file)
+
+    start = time.perf_counter()
+    try:
+        results, counts = asyncio.run(extract_all(entries, backend, cache, concurrency, batch_size, rate))
+    finally:
+        cache.close()
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as out:
+        for entry, trips in zip(entries, results):
+            out.write(json.dumps({"date": entry.get('date', ''), "trips": trips}) + '\n')
+
+    print(f"{counts['cached']} entries cached, {counts['sent']} sent in {counts['batches']} batches "
+          f"({counts['retries']} retries) in {elapsed:.1f}s.")
+    print(f"Output saved to {output_file}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract Pepys's journeys from each parsed entry.")
+    parser.add_argument("--backend", default="stub",
+                        help="'stub', 'http' or a module:factory path (default: %(default)s)")
+    parser.add_argument("--backend-url", help="endpoint for the http backend")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=8, help="entries per request (default: %(default)s)")
+    parser.add_argument("--rate", type=float, default=2.0,
+                        help="maximum requests per second, 0 for no limit (default: %(default)s)")
+    args = parser.parse_args()
+
+    backend = load_backend(args.backend, args.backend_url)
+    extract_trips("data/diary-parsed.ndjson", "data/diary-trips.ndjson", backend,
+                  args.concurrency, args.batch_size, args.rate)
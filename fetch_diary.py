@@ -1,7 +1,16 @@
 import urllib.request
+import urllib.error
+import argparse
+import codecs
+import json
 import sys
 import os
 import ssl
+import time
+from typing import BinaryIO, Dict, Optional, TextIO
+
+from compression import is_compressed, open_file
+from profiling import Profiler, profile_stage
 
 # Bypass SSL verification
 ssl._create_default_https_context = ssl._create_unverified_context
@@ -9,46 +18,233 @@ ssl._create_default_https_context = ssl._create_unverified_context
 URL = "https://www.gutenberg.org/cache/epub/4200/pg4200.txt"
 OUTPUT_FILE = "data/diary-trimmed.txt"
 
+# Local copy of the full download, revalidated with ETag / Last-Modified
+RAW_FILE = "data/pg4200.txt"
+
 START_MARKER = "JANUARY 1659-1660"
 END_MARKER = "END OF THE DIARY."
 
-def fetch_and_clean():
-    print(f"Downloading from {URL}...")
+CHUNK_SIZE = 64 * 1024
+
+class MarkerTrimmer:
+    """
+    Write the text between START_MARKER and END_MARKER (inclusive) as it arrives.
+
+    Text is fed in chunks, and just enough of the previous chunk is held
+    back to find a marker that straddles a chunk boundary.
+    """
+
+    def __init__(self, out: TextIO, start_marker: str = START_MARKER, end_marker: str = END_MARKER):
+        self.out = out
+        self.start_marker = start_marker
+        self.end_marker = end_marker
+        self.pending = ""
+        self.started = False
+        self.finished = False
+        self.total_chars = 0
+        self.trimmed_chars = 0
+        self.trimmed_lines = 0
+
+    def _write(self, text: str):
+        self.out.write(text)
+        self.trimmed_chars += len(text)
+        self.trimmed_lines += text.count('\n')
+
+    def feed(self, text: str):
+        self.total_chars += len(text)
+        if self.finished:
+            return
+        text = self.pending + text
+
+        if not self.started:
+            start_index = text.find(self.start_marker)
+            if start_index == -1:
+                self.pending = text[max(len(text) - len(self.start_marker) + 1, 0):]
+                return
+            self.started = True
+            text = text[start_index:]
+
+        end_index = text.find(self.end_marker)
+        if end_index != -1:
+            # Adjust end index to include the marker length
+            self._write(text[:end_index + len(self.end_marker)])
+            self.pending = ""
+            self.finished = True
+            return
+
+        split = max(len(text) - len(self.end_marker) + 1, 0)
+        self._write(text[:split])
+        self.pending = text[split:]
+
+def load_meta(raw_file: str) -> Dict:
     try:
-        with urllib.request.urlopen(URL) as response:
-            content = response.read().decode('utf-8')
+        with open(raw_file + ".json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_meta(raw_file: str, meta: Dict):
+    with open(raw_file + ".json", 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+def open_download(url: str, meta: Dict, cached: bool, resume_from: int):
+    """
+    Request url, revalidating the cached copy or resuming a partial one.
+
+    Returns None if the server says the cached copy is still current.
+    """
+    headers = {}
+    validator = meta.get("etag") or meta.get("last_modified")
+    if cached:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    elif resume_from and validator:
+        headers["Range"] = f"bytes={resume_from}-"
+        # Only resume if the file has not changed since the partial download
+        headers["If-Range"] = validator
+
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        return urllib.request.urlopen(request)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None
+        raise
+
+def copy_chunks(source: BinaryIO, trimmer: MarkerTrimmer, decoder, sink: Optional[BinaryIO] = None,
+                profile: Optional[Profiler] = None) -> int:
+    """Feed a binary stream to the trimmer in chunks, also copying it to sink. Returns bytes read."""
+    size = 0
+    while True:
+        if profile is None:
+            chunk = source.read(CHUNK_SIZE)
+        else:
+            start = time.perf_counter()
+            chunk = source.read(CHUNK_SIZE)
+            profile.add_time("read_chunk", time.perf_counter() - start)
+        if not chunk:
+            break
+        size += len(chunk)
+        if sink is not None:
+            sink.write(chunk)
+        if profile is None:
+            trimmer.feed(decoder.decode(chunk))
+        else:
+            start = time.perf_counter()
+            trimmer.feed(decoder.decode(chunk))
+            profile.add_time("trim_chunk", time.perf_counter() - start)
+    return size
+
+def fetch_and_clean(url: str = URL, output_file: str = OUTPUT_FILE, raw_file: str = RAW_FILE,
+                    profile: Optional[Profiler] = None, start_marker: str = START_MARKER,
+                    end_marker: str = END_MARKER):
+    meta = load_meta(raw_file)
+    if meta.get("url") != url:
+        meta = {}
+    part_file = raw_file + ".part"
+    cached = meta.get("complete", False) and os.path.exists(raw_file)
+    resume_from = os.path.getsize(part_file) if not cached and meta and os.path.exists(part_file) else 0
+
+    print(f"Downloading from {url}...")
+    try:
+        with profile_stage(profile, "request"):
+            try:
+                response = open_download(url, meta, cached, resume_from)
+            except urllib.error.HTTPError as e:
+                if e.code != 416:
+                    raise
+                # The partial download is not a prefix of the current file, start again
+                resume_from = 0
+                response = open_download(url, {}, False, 0)
     except Exception as e:
         print(f"Error downloading file: {e}")
         sys.exit(1)
 
-    print(f"Download complete. Total size: {len(content)} characters.")
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    os.makedirs(os.path.dirname(raw_file), exist_ok=True)
+    tmp_output = output_file + ".tmp"
+    decoder = codecs.getincrementaldecoder('utf-8')()
 
-    # Find start
-    start_index = content.find(START_MARKER)
-    if start_index == -1:
-        print(f"Error: Start marker '{START_MARKER}' not found.")
-        sys.exit(1)
+    try:
+        with open_file(tmp_output, "w", encoding="utf-8", compressed=is_compressed(output_file)) as out, \
+             profile_stage(profile, "download") as download_stage:
+            trimmer = MarkerTrimmer(out, start_marker, end_marker)
 
-    # Find end
-    # We look for the end marker starting from the start index
-    end_index = content.find(END_MARKER, start_index)
-    if end_index == -1:
-        print(f"Error: End marker '{END_MARKER}' not found.")
+            if response is None:
+                print(f"Not modified, using cached download {raw_file}.")
+                download_stage["source"] = "cache"
+                with open(raw_file, 'rb') as f:
+                    download_stage["bytes"] = copy_chunks(f, trimmer, decoder, profile=profile)
+            else:
+                with response:
+                    resuming = resume_from and response.status == 206
+                    download_stage["source"] = "resumed" if resuming else "network"
+                    download_stage["bytes"] = 0
+                    if resuming:
+                        print(f"Resuming download at byte {resume_from:,}.")
+                        with open(part_file, 'rb') as f:
+                            download_stage["bytes"] += copy_chunks(f, trimmer, decoder, profile=profile)
+
+                    meta = {
+                        "url": url,
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                        "complete": False,
+                    }
+                    save_meta(raw_file, meta)
+
+                    try:
+                        with open(part_file, 'ab' if resuming else 'wb') as sink:
+                            size = copy_chunks(response, trimmer, decoder, sink, profile)
+                        download_stage["bytes"] += size
+                        expected = response.headers.get("Content-Length")
+                        if expected is not None and size < int(expected):
+                            raise ConnectionError(f"connection closed after {size:,} of {int(expected):,} bytes")
+                    except Exception as e:
+                        print(f"Error downloading file: {e}")
+                        print("The partial download is kept and will be resumed on the next run.")
+                        sys.exit(1)
+
+                os.replace(part_file, raw_file)
+                meta["complete"] = True
+                save_meta(raw_file, meta)
+
+            trimmer.feed(decoder.decode(b"", final=True))
+            download_stage["lines"] = trimmer.trimmed_lines
+    except BaseException:
+        # An error exit or an interrupt mid-download: don't leave the half-written file behind
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+        raise
+
+    print(f"Download complete. Total size: {trimmer.total_chars} characters.")
+
+    if not trimmer.started:
+        os.remove(tmp_output)
+        print(f"Error: Start marker '{start_marker}' not found.")
         sys.exit(1)
 
-    # Adjust end index to include the marker length
-    end_index += len(END_MARKER)
+    if not trimmer.finished:
+        os.remove(tmp_output)
+        print(f"Error: End marker '{end_marker}' not found.")
+        sys.exit(1)
 
-    # Slice the content
-    trimmed_content = content[start_index:end_index]
-    
-    # Write to file
-    print(f"Writing trimmed content to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        f.write(trimmed_content)
+    print(f"Writing trimmed content to {output_file}...")
+    os.replace(tmp_output, output_file)
 
-    print(f"Success! Trimmed file size: {len(trimmed_content)} characters.")
+    print(f"Success! Trimmed file size: {trimmer.trimmed_chars} characters.")
 
 if __name__ == "__main__":
-    fetch_and_clean()
+    parser = argparse.ArgumentParser(description="Download the diary from Project Gutenberg and trim it.")
+    parser.add_argument("--output", default=OUTPUT_FILE,
+                        help="trimmed text to write, gzip-compressed if it ends in .gz (default: %(default)s)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="write a JSON report of request, download and trim times")
+    args = parser.parse_args()
 
+    profile = Profiler("fetch_diary") if args.profile else None
+    fetch_and_clean(output_file=args.output, profile=profile)
+    if profile is not None:
+        profile.write(args.profile)
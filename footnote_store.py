@@ -0,0 +1,194 @@
+import argparse
+import hashlib
+import json
+import os
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Union
+
+def footnotes_path_for(ndjson_path: str) -> str:
+    return ndjson_path + ".footnotes"
+
+def footnote_id(text: str) -> str:
+    """Content-hash ID of a footnote, the same in every run and file."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+class FootnoteWriter:
+    """
+    Move entries' footnotes to an interned table next to the NDJSON.
+
+    Identical footnote texts (the same note on a person in many entries) are
+    stored once, keyed by footnote_id, with the number of times they occur.
+    Entries keep the list of IDs in order, so {N} markers still index the
+    list rebuilt by FootnoteStore.get. The table is written on close, one
+    {"id", "count", "text"} line per footnote in order of first use.
+    """
+
+    def __init__(self, ndjson_path: str):
+        self.path = footnotes_path_for(ndjson_path)
+        self.table = {}
+        self.total = 0
+
+    @classmethod
+    def resume(cls, ndjson_path: str, released: List[str]) -> Optional["FootnoteWriter"]:
+        """
+        Continue the existing table of ndjson_path, minus one use of each ID in released.
+
+        For appending to the NDJSON after removing rows that cited released.
+        Returns None if there is no table or it lacks one of released.
+        """
+        writer = cls(ndjson_path)
+        try:
+            with open(writer.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    writer.table[record["id"]] = [record["text"], record["count"]]
+        except FileNotFoundError:
+            return None
+        writer.total = sum(count for _, count in writer.table.values())
+        for key in released:
+            record = writer.table.get(key)
+            if record is None:
+                # Not the table the NDJSON was written with
+                return None
+            # Kept at 0 so a re-interned footnote keeps its place in the table
+            record[1] -= 1
+            writer.total -= 1
+        return writer
+
+    def intern(self, text: str) -> str:
+        key = footnote_id(text)
+        record = self.table.get(key)
+        if record is None:
+            self.table[key] = [text, 1]
+        else:
+            record[1] += 1
+        self.total += 1
+        return key
+
+    def split(self, entry: Dict) -> Dict:
+        """Intern entry's footnotes and return the row to store in the NDJSON instead."""
+        return {"date": entry['date'], "entry": entry['entry'],
+                "footnote_ids": [self.intern(footnote) for footnote in entry.get('footnotes', [])]}
+
+    def close(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+            for key, (text, count) in self.table.items():
+                if count == 0:
+                    continue
+                f.write(json.dumps({"id": key, "count": count, "text": text}) + '\n')
+        os.replace(tmp_path, self.path)
+
+class FootnoteStore:
+    """
+    Read footnotes back from an interned table.
+
+    The table is only read on the first lookup, so date-only readers never
+    load it, and every entry citing a footnote shares one string for it.
+    """
+
+    def __init__(self, ndjson_path: str):
+        self.path = footnotes_path_for(ndjson_path)
+        self.texts = None
+        self.counts = None
+
+    def _load(self):
+        self.texts = {}
+        self.counts = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                self.texts[record["id"]] = record["text"]
+                self.counts[record["id"]] = record["count"]
+
+    def get(self, ids: List[str]) -> List[str]:
+        if self.texts is None:
+            self._load()
+        return [self.texts[key] for key in ids]
+
+    def repeat_counts(self) -> Dict[str, int]:
+        """How many times each footnote ID occurs across all entries."""
+        if self.counts is None:
+            self._load()
+        return self.counts
+
+    def close(self):
+        self.texts = None
+        self.counts = None
+
+    def __enter__(self) -> "FootnoteStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_store(ndjson_path: str) -> Optional[FootnoteStore]:
+    """The footnote table of ndjson_path, or None if it was written without one."""
+    if not os.path.exists(footnotes_path_for(ndjson_path)):
+        return None
+    return FootnoteStore(ndjson_path)
+
+class LazyEntry(Mapping):
+    """
+    A parsed entry whose footnotes stay in the table until first accessed.
+
+    Reads like the entry dicts of the inline layout: entry['footnotes'] and
+    entry.get('footnotes', []) look up and keep the list, while consumers
+    that only use 'date' and 'entry' never touch the table. The IDs are
+    available as entry['footnote_ids'].
+    """
+
+    __slots__ = ("row", "store", "footnotes")
+
+    def __init__(self, row: Dict, store: FootnoteStore):
+        self.row = row
+        self.store = store
+        self.footnotes = None
+
+    def __getitem__(self, key: str):
+        if key == 'footnotes':
+            if self.footnotes is None:
+                self.footnotes = self.store.get(self.row['footnote_ids'])
+            return self.footnotes
+        return self.row[key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield 'date'
+        yield 'entry'
+        yield 'footnotes'
+
+    def __len__(self) -> int:
+        return 3
+
+    def to_dict(self) -> Dict:
+        """The entry in the inline layout, e.g. for json.dumps."""
+        return {"date": self['date'], "entry": self['entry'], "footnotes": list(self['footnotes'])}
+
+def load_row(row: Union[str, bytes], store: Optional[FootnoteStore]) -> Union[Dict, LazyEntry]:
+    """Decode an NDJSON row in either layout."""
+    entry = json.loads(row)
+    if 'footnote_ids' not in entry:
+        return entry
+    if store is None:
+        raise ValueError("entry refers to a footnote table that does not exist")
+    return LazyEntry(entry, store)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the most repeated footnotes of a parsed diary.")
+    parser.add_argument("ndjson", nargs="?", default="data/diary-parsed.ndjson",
+                        help="parsed diary written with --split-footnotes (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=10, help="footnotes to list (default: %(default)s)")
+    args = parser.parse_args()
+
+    store = open_store(args.ndjson)
+    if store is None:
+        print(f"Error: {args.ndjson} has no footnote table; parse it with --split-footnotes.")
+    else:
+        counts = store.repeat_counts()
+        total = sum(counts.values())
+        print(f"{total:,} footnotes, {len(counts):,} unique ({total - len(counts):,} repeats interned).")
+        for key, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+            if count < 2:
+                break
+            text = store.get([key])[0]
+            print(f"  {count:>4}x {key}  {text[:70]}{'...' if len(text) > 70 else ''}")
@@ -1,9 +1,17 @@
+import argparse
 import json
 import csv
 import sys
 import os
 import re
-from typing import Dict, List
+import time
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Union
+
+from compression import is_compressed, open_file
+from diary_entry import Entry
+from footnote_store import load_row, open_store
+from profiling import Profiler, profile_stage
 
 # Keywords to track in entries (case-insensitive)
 KEYWORDS = [
@@ -30,68 +38,247 @@ def count_occurrences(text: str, word: str) -> int:
     # Simple regex to match whole words
     return len(re.findall(r'\b' + re.escape(word) + r'\b', text, re.IGNORECASE))
 
-def generate_stats(input_file: str, output_file: str):
-    print(f"Analyzing {input_file}...")
+WORD_RE = re.compile(r'\w+')
+
+class KeywordMatcher:
+    """
+    Count many keywords in one scan of the text.
+
+    Counts match count_occurrences (case-insensitive, whole words). Keywords
+    made only of ASCII word characters are counted from a single tokenisation
+    of the text; any others (e.g. "my lord") keep their own compiled pattern.
+    """
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = list(keywords)
+        self.word_keywords = {}
+        self.other_patterns = {}
+        for keyword in self.keywords:
+            if keyword.isascii() and WORD_RE.fullmatch(keyword):
+                self.word_keywords.setdefault(keyword.lower(), []).append(keyword)
+            else:
+                self.other_patterns[keyword] = re.compile(r'\b' + re.escape(keyword) + r'\b', re.IGNORECASE)
+        self.word_patterns = {
+            keyword: re.compile(re.escape(keyword), re.IGNORECASE)
+            for keyword in self.keywords if keyword not in self.other_patterns
+        }
+
+    def count(self, text: str) -> Dict[str, int]:
+        counts = dict.fromkeys(self.keywords, 0)
+        if self.word_keywords:
+            tokens = WORD_RE.findall(text)
+            ascii_tokens = Counter(token.lower() for token in tokens if token.isascii())
+            for lowered, keywords in self.word_keywords.items():
+                found = ascii_tokens.get(lowered, 0)
+                if found:
+                    for keyword in keywords:
+                        counts[keyword] = found
+
+            # Case-insensitive matching of non-ASCII letters does not always
+            # agree with str.lower(), so let the regex engine decide those
+            for token in tokens:
+                if not token.isascii():
+                    for keyword, pattern in self.word_patterns.items():
+                        if pattern.fullmatch(token):
+                            counts[keyword] += 1
+
+        for keyword, pattern in self.other_patterns.items():
+            counts[keyword] = len(pattern.findall(text))
+        return counts
+
+def load_keywords(path: str) -> List[str]:
+    """Read keywords from a file, one per line. Blank lines and # comments are ignored."""
+    keywords = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            keyword = line.strip()
+            if keyword and not keyword.startswith('#'):
+                keywords.append(keyword)
+    return keywords
+
+def entry_stats(entry_data: Dict, matcher: KeywordMatcher, profile: Optional[Profiler] = None) -> Dict:
+    """Build the stats row for one parsed entry."""
+    entry_text = entry_data.get('entry', '')
+    footnotes = entry_data.get('footnotes', [])
+    date = entry_data.get('date', '')
+    
+    row = {
+        "date": date,
+        "entry_length_chars": len(entry_text),
+        "entry_word_count": count_words(entry_text),
+        "footnote_count": len(footnotes),
+        "footnote_word_count": sum(count_words(fn) for fn in footnotes)
+    }
     
-    stats_list = []
+    # Calculate keyword counts
+    if profile is None:
+        counts = matcher.count(entry_text)
+    else:
+        start = time.perf_counter()
+        counts = matcher.count(entry_text)
+        profile.add_time("keywords", time.perf_counter() - start, date)
+    for keyword, count in counts.items():
+        row[f"mentions_{keyword}"] = count
     
+    return row
+
+def update_rollup(rollups: Dict[str, Dict], period: str, row: Dict):
+    """Add a stats row to the running totals for its period (e.g. '1660-01' or '1660')."""
+    rollup = rollups.get(period)
+    if rollup is None:
+        rollup = rollups[period] = {"period": period, "entry_count": 0}
+        for field in row:
+            if field != "date":
+                rollup[field] = 0
+        rollup["longest_entry_date"] = ""
+        rollup["longest_entry_word_count"] = 0
+
+    rollup["entry_count"] += 1
+    for field, value in row.items():
+        if field != "date":
+            rollup[field] += value
+    if rollup["entry_count"] == 1 or row["entry_word_count"] > rollup["longest_entry_word_count"]:
+        rollup["longest_entry_date"] = row["date"]
+        rollup["longest_entry_word_count"] = row["entry_word_count"]
+
+def rollup_path(output_file: str, period_name: str) -> str:
+    """Companion file for a rollup, e.g. data/diary-stats-monthly.csv (or .csv.gz)."""
+    gz = ".gz" if is_compressed(output_file) else ""
+    root, ext = os.path.splitext(output_file[:len(output_file) - len(gz)])
+    return f"{root}-{period_name}{ext}{gz}"
+
+def write_rollup(path: str, rollups: Dict[str, Dict]):
+    with open_file(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = None
+        for period in sorted(rollups):
+            if writer is None:
+                writer = csv.DictWriter(csvfile, fieldnames=list(rollups[period].keys()))
+                writer.writeheader()
+            writer.writerow(rollups[period])
+
+def as_entry(row: Mapping) -> Union[Entry, Mapping]:
+    """Entry for a decoded row, or the row itself if its date is missing or malformed."""
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
+        return Entry.from_dict(row)
+    except (KeyError, ValueError):
+        return row
+
+def read_entries(input_file: str) -> Iterator[Union[Entry, Mapping]]:
+    """
+    Yield parsed entries from an NDJSON file, warning about invalid lines.
+
+    Entries come as Entry objects, whichever footnote layout was written.
+    """
+    with open_file(input_file, 'r', encoding='utf-8') as f:
+        store = open_store(input_file)
+        try:
             for i, line in enumerate(f, 1):
                 try:
-                    entry_data = json.loads(line)
-                    entry_text = entry_data.get('entry', '')
-                    footnotes = entry_data.get('footnotes', [])
-                    date = entry_data.get('date', '')
-                    
-                    row = {
-                        "date": date,
-                        "entry_length_chars": len(entry_text),
-                        "entry_word_count": count_words(entry_text),
-                        "footnote_count": len(footnotes),
-                        "footnote_word_count": sum(count_words(fn) for fn in footnotes)
-                    }
-                    
-                    # Calculate keyword counts
-                    for keyword in KEYWORDS:
-                        row[f"mentions_{keyword}"] = count_occurrences(entry_text, keyword)
-                    
-                    stats_list.append(row)
-                    
+                    yield as_entry(load_row(line, store))
                 except json.JSONDecodeError:
                     print(f"Warning: Invalid JSON on line {i}")
+        finally:
+            if store is not None:
+                store.close()
+
+class StatsWriter:
+    """
+    Stream a stats row per entry to CSV, with monthly and yearly rollups.
+
+    Rows are written as entries are added, so memory stays constant in the
+    number of entries; only one running total per month and year is kept.
+    """
+
+    def __init__(self, output_file: str, keywords: List[str] = KEYWORDS, profile: Optional[Profiler] = None):
+        self.output_file = output_file
+        self.profile = profile
+        self.matcher = KeywordMatcher(keywords)
+        self.monthly = {}
+        self.yearly = {}
+        self.totals = {}
+        self.csvfile = None
+        self.writer = None
+
+    def add(self, entry_data: Dict):
+        row = entry_stats(entry_data, self.matcher, self.profile)
+
+        if self.writer is None:
+            # Ensure output directory exists
+            os.makedirs(os.path.dirname(self.output_file), exist_ok=True)
+            self.csvfile = open_file(self.output_file, 'w', newline='', encoding='utf-8')
+            self.writer = csv.DictWriter(self.csvfile, fieldnames=list(row.keys()))
+            self.writer.writeheader()
+        self.writer.writerow(row)
+
+        update_rollup(self.monthly, row["date"][:7], row)
+        update_rollup(self.yearly, row["date"][:4], row)
+        update_rollup(self.totals, "all", row)
+
+    def close(self):
+        """Finish the CSV, write the rollups and print a summary."""
+        if self.csvfile is not None:
+            self.csvfile.close()
+            self.csvfile = None
 
-        if not stats_list:
+        if not self.totals:
             print("No valid entries found.")
             return
 
-        # Write to CSV
-        fieldnames = list(stats_list[0].keys())
-        
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        
-        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(stats_list)
-            
-        print(f"Stats generated for {len(stats_list)} entries.")
-        print(f"Output saved to {output_file}")
+        monthly_file = rollup_path(self.output_file, "monthly")
+        yearly_file = rollup_path(self.output_file, "yearly")
+        write_rollup(monthly_file, self.monthly)
+        write_rollup(yearly_file, self.yearly)
+
+        summary = self.totals["all"]
+        print(f"Stats generated for {summary['entry_count']} entries.")
+        print(f"Output saved to {self.output_file}")
+        print(f"Rollups saved to {monthly_file} and {yearly_file}")
         
         # Print some summary stats
-        total_words = sum(s['entry_word_count'] for s in stats_list)
-        avg_words = total_words / len(stats_list)
-        max_words = max(stats_list, key=lambda x: x['entry_word_count'])
+        avg_words = summary['entry_word_count'] / summary['entry_count']
         
         print("\nSummary:")
-        print(f"Total Words: {total_words:,}")
+        print(f"Total Words: {summary['entry_word_count']:,}")
         print(f"Average Words per Entry: {avg_words:.0f}")
-        print(f"Longest Entry: {max_words['date']} ({max_words['entry_word_count']:,} words)")
+        print(f"Longest Entry: {summary['longest_entry_date']} ({summary['longest_entry_word_count']:,} words)")
+
+def write_stats(entries: Iterable[Dict], output_file: str, keywords: List[str] = KEYWORDS,
+                profile: Optional[Profiler] = None):
+    """Write stats and rollups for a stream of parsed entries."""
+    stats = StatsWriter(output_file, keywords, profile)
+    count = 0
+    with profile_stage(profile, "stats") as stats_stage:
+        for entry_data in entries:
+            stats.add(entry_data)
+            count += 1
+        stats_stage["lines"] = count
+    with profile_stage(profile, "rollups"):
+        stats.close()
 
+def generate_stats(input_file: str, output_file: str, keywords: List[str] = KEYWORDS,
+                   profile: Optional[Profiler] = None):
+    print(f"Analyzing {input_file}...")
+    
+    try:
+        write_stats(read_entries(input_file), output_file, keywords, profile)
     except FileNotFoundError:
         print(f"Error: File {input_file} not found.")
 
 if __name__ == "__main__":
-    generate_stats("data/diary-parsed.ndjson", "data/diary-stats.csv")
+    parser = argparse.ArgumentParser(description="Generate per-entry statistics from the parsed diary.")
+    parser.add_argument("--input", default="data/diary-parsed.ndjson",
+                        help="parsed NDJSON to read, gzip-compressed if it ends in .gz (default: %(default)s)")
+    parser.add_argument("--output", default="data/diary-stats.csv",
+                        help="stats CSV to write, gzip-compressed if it ends in .gz (default: %(default)s)")
+    parser.add_argument("--keywords", metavar="FILE",
+                        help="file of keywords to count, one per line (default: built-in KEYWORDS)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="write a JSON report of stage times and the slowest entries")
+    args = parser.parse_args()
+
+    keywords = load_keywords(args.keywords) if args.keywords else KEYWORDS
+    profile = Profiler("generate_stats") if args.profile else None
+    generate_stats(args.input, args.output, keywords, profile)
+    if profile is not None:
+        profile.write(args.profile)
 
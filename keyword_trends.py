@@ -0,0 +1,209 @@
+import argparse
+import csv
+import json
+import os
+from array import array
+from collections import deque
+from datetime import date as Date
+from typing import Dict, List
+
+from compression import open_file
+from diary_entry import Entry
+from generate_stats import rollup_path
+
+STATS_FILE = "data/diary-stats.csv"
+OUTPUT_FILE = "data/diary-trends.csv"
+
+# Window widths in days computed by default
+WINDOWS = [7, 30]
+
+def pair_name(first: str, second: str) -> str:
+    return f"{first}+{second}"
+
+class TrendColumns:
+    """
+    Per-day aggregates for one window width, as array-backed columns.
+
+    Row i covers the `width` days ending on dates[i] (an ordinal): the
+    entries and words in them, each keyword's mentions, and for each pair
+    of keywords the number of entries mentioning both.
+    """
+
+    def __init__(self, width: int, keywords: List[str]):
+        self.width = width
+        self.keywords = keywords
+        self.pairs = [(i, j) for i in range(len(keywords)) for j in range(i + 1, len(keywords))]
+        self.dates = array('i')
+        self.entries = array('I')
+        self.words = array('Q')
+        self.mentions = [array('I') for _ in keywords]
+        self.cooccurrence = [array('I') for _ in self.pairs]
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def date(self, i: int) -> str:
+        return Date.fromordinal(self.dates[i]).isoformat()
+
+    def header(self) -> List[str]:
+        return (["date", "entries", "words"] + [f"mentions_{keyword}" for keyword in self.keywords]
+                + [pair_name(self.keywords[i], self.keywords[j]) for i, j in self.pairs])
+
+    def write_csv(self, path: str):
+        with open_file(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.header())
+            columns = [self.entries, self.words] + self.mentions + self.cooccurrence
+            for i in range(len(self.dates)):
+                writer.writerow([self.date(i)] + [column[i] for column in columns])
+
+    def to_dict(self) -> Dict:
+        """Columns for JSON, one list per series."""
+        return {
+            "dates": [self.date(i) for i in range(len(self.dates))],
+            "entries": self.entries.tolist(),
+            "words": self.words.tolist(),
+            "mentions": {keyword: column.tolist() for keyword, column in zip(self.keywords, self.mentions)},
+            "cooccurrence": {pair_name(self.keywords[i], self.keywords[j]): column.tolist()
+                             for (i, j), column in zip(self.pairs, self.cooccurrence)},
+        }
+
+class SlidingWindow:
+    """
+    Running totals over the entries of the last `width` days.
+
+    Entries are added in date order and subtracted again when they fall out
+    of the window, so each entry is touched twice whatever the width. Pair
+    counts only visit the keywords an entry mentions.
+    """
+
+    def __init__(self, width: int, columns: TrendColumns):
+        self.width = width
+        self.columns = columns
+        self.pair_index = {pair: p for p, pair in enumerate(columns.pairs)}
+        self.window = deque()
+        self.words = 0
+        self.mentions = [0] * len(columns.keywords)
+        self.cooccurrence = [0] * len(columns.pairs)
+
+    def _apply(self, words: int, counts: tuple[int, ...], present: tuple[int, ...], sign: int):
+        self.words += sign * words
+        mentions = self.mentions
+        for k in present:
+            mentions[k] += sign * counts[k]
+        cooccurrence = self.cooccurrence
+        pair_index = self.pair_index
+        for a, i in enumerate(present):
+            for j in present[a + 1:]:
+                cooccurrence[pair_index[i, j]] += sign
+
+    def add(self, ordinal: int, words: int, counts: tuple[int, ...], present: tuple[int, ...]):
+        self.window.append((ordinal, words, counts, present))
+        self._apply(words, counts, present, 1)
+
+    def advance(self, day: int):
+        """Drop the entries before the window ending on day, then record the window as that day's row."""
+        window = self.window
+        while window and window[0][0] <= day - self.width:
+            _, words, counts, present = window.popleft()
+            self._apply(words, counts, present, -1)
+
+        columns = self.columns
+        columns.dates.append(day)
+        columns.entries.append(len(window))
+        columns.words.append(self.words)
+        for column, value in zip(columns.mentions, self.mentions):
+            column.append(value)
+        for column, value in zip(columns.cooccurrence, self.cooccurrence):
+            column.append(value)
+
+def read_stats(stats_file: str) -> tuple[List[str], List[tuple[int, int, tuple[int, ...]]]]:
+    """
+    Keywords and (ordinal, words, keyword counts) rows of a stats CSV, in date order.
+
+    The CSV follows the diary's own order, which has a few entries out of
+    place, so the rows are sorted (in close to linear time, as they are
+    nearly sorted already). Rows without a usable date are skipped.
+    """
+    rows = []
+    with open_file(stats_file, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        columns = [i for i, field in enumerate(header) if field.startswith("mentions_")]
+        keywords = [header[i][len("mentions_"):] for i in columns]
+        words_column = header.index("entry_word_count")
+        for row in reader:
+            try:
+                ordinal = Entry(row[0], "").ordinal
+                rows.append((ordinal, int(row[words_column]), tuple(int(row[i]) for i in columns)))
+            except (ValueError, IndexError):
+                continue
+    rows.sort(key=lambda row: row[0])
+    return keywords, rows
+
+def compute_trends(keywords: List[str], rows: List[tuple[int, int, tuple[int, ...]]],
+                   windows: List[int] = WINDOWS) -> Dict[int, TrendColumns]:
+    """
+    Every window width's aggregates for each day from the first entry to the last, in one pass.
+
+    rows are (ordinal, words, keyword counts) in date order, as read_stats returns.
+    """
+    trends = {width: TrendColumns(width, keywords) for width in windows}
+    sliding = [SlidingWindow(width, columns) for width, columns in trends.items()]
+    if not rows:
+        return trends
+
+    i = 0
+    for day in range(rows[0][0], rows[-1][0] + 1):
+        while i < len(rows) and rows[i][0] == day:
+            ordinal, words, counts = rows[i]
+            present = tuple(k for k, count in enumerate(counts) if count)
+            for window in sliding:
+                window.add(ordinal, words, counts, present)
+            i += 1
+        for window in sliding:
+            window.advance(day)
+    return trends
+
+def write_trends(trends: Dict[int, TrendColumns], output_file: str, json_file: str = None) -> List[str]:
+    """Write one CSV per window width (e.g. data/diary-trends-7d.csv) and optionally all of them as JSON."""
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    written = []
+    for width, columns in trends.items():
+        path = rollup_path(output_file, f"{width}d")
+        columns.write_csv(path)
+        written.append(path)
+    if json_file:
+        with open_file(json_file, 'w', encoding='utf-8') as f:
+            json.dump({"windows": {str(width): columns.to_dict() for width, columns in trends.items()}}, f)
+        written.append(json_file)
+    return written
+
+def keyword_trends(stats_file: str = STATS_FILE, output_file: str = OUTPUT_FILE, windows: List[int] = WINDOWS,
+                   json_file: str = None):
+    print(f"Reading {stats_file}...")
+    keywords, rows = read_stats(stats_file)
+    trends = compute_trends(keywords, rows, windows)
+    days = len(next(iter(trends.values()))) if trends else 0
+    written = write_trends(trends, output_file, json_file)
+    print(f"Trends for {len(keywords)} keywords over {days:,} days from {len(rows):,} entries, "
+          f"windows of {', '.join(str(width) for width in windows)} days.")
+    print(f"Output saved to {', '.join(written)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling keyword counts and co-occurrence from the stats CSV.")
+    parser.add_argument("--input", default=STATS_FILE,
+                        help="per-entry stats written by generate_stats.py (default: %(default)s)")
+    parser.add_argument("--output", default=OUTPUT_FILE,
+                        help="CSV name; one file per window is written, e.g. diary-trends-7d.csv (default: %(default)s)")
+    parser.add_argument("--windows", nargs="+", type=int, default=WINDOWS,
+                        help="window widths in days (default: 7 30)")
+    parser.add_argument("--json", metavar="FILE", help="also write every window's columns to FILE as JSON")
+    args = parser.parse_args()
+
+    if any(width < 1 for width in args.windows):
+        parser.error("window widths must be at least 1 day")
+    try:
+        keyword_trends(args.input, args.output, args.windows, args.json)
+    except FileNotFoundError:
+        print(f"Error: File {args.input} not found.")
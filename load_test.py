@@ -0,0 +1,117 @@
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+def get_json(host: str, port: int, path: str) -> Dict:
+    conn = http.client.HTTPConnection(host, port)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        body = response.read()
+        return json.loads(body) if response.status == 200 else {}
+    finally:
+        conn.close()
+
+def make_queries(host: str, port: int, distinct: int, seed: int = 0) -> List[str]:
+    """A pool of entry, range, keyword and monthly stats queries over the dates the server has."""
+    rng = random.Random(seed)
+    dates = sorted({entry["date"] for entry in get_json(host, port, "/entries?limit=1000").get("entries", [])})
+    months = [row["period"] for row in get_json(host, port, "/stats/monthly").get("periods", [])]
+    if not dates:
+        raise SystemExit("Error: the server has no entries.")
+
+    queries = []
+    for _ in range(distinct):
+        roll = rng.random()
+        i = rng.randrange(len(dates))
+        j = min(i + rng.randint(1, 30), len(dates) - 1)
+        if roll < 0.5:
+            queries.append(f"/entries?date={dates[i]}")
+        elif roll < 0.7:
+            queries.append(f"/entries?start={dates[i]}&end={dates[j]}")
+        elif roll < 0.85 or not months:
+            queries.append(f"/keywords?start={dates[i]}&end={dates[j]}")
+        else:
+            k = rng.randrange(len(months))
+            queries.append(f"/stats/monthly?start={months[k]}&end={months[min(k + 12, len(months) - 1)]}")
+    return queries
+
+def run_client(host: str, port: int, paths: List[str], revalidate: bool, latencies: List[float],
+               statuses: Counter, lock: threading.Lock):
+    """Send paths over one keep-alive connection, recording each latency and status."""
+    conn = http.client.HTTPConnection(host, port)
+    etags = {}
+    mine = []
+    counts = Counter()
+    for path in paths:
+        headers = {"If-None-Match": etags[path]} if revalidate and path in etags else {}
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, port)
+            counts["error"] += 1
+            continue
+        mine.append(time.perf_counter() - start)
+        counts[response.status] += 1
+        if response.getheader("ETag"):
+            etags[path] = response.getheader("ETag")
+    conn.close()
+    with lock:
+        latencies.extend(mine)
+        statuses.update(counts)
+
+def percentile(values: List[float], fraction: float) -> float:
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def load_test(url: str, clients: int = 8, requests: int = 5000, distinct: int = 500,
+              revalidate: bool = False, seed: int = 0):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    queries = make_queries(host, port, distinct, seed)
+    rng = random.Random(seed + 1)
+    per_client = [[rng.choice(queries) for _ in range(requests // clients)] for _ in range(clients)]
+
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    threads = [threading.Thread(target=run_client, args=(host, port, paths, revalidate, latencies, statuses, lock))
+               for paths in per_client]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(latencies):,} requests from {clients} clients over {distinct} distinct queries in {elapsed:.2f}s")
+    print(f"  {len(latencies) / elapsed:,.0f} req/s")
+    if latencies:
+        print(f"  latency p50 {percentile(latencies, 0.50) * 1000:.2f} ms, "
+              f"p90 {percentile(latencies, 0.90) * 1000:.2f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms")
+    print("  status: " + ", ".join(f"{status} x{count:,}" for status, count in sorted(statuses.items(), key=str)))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test a running serve_diary.py with concurrent clients.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="server to test (default: %(default)s)")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent connections (default: %(default)s)")
+    parser.add_argument("--requests", type=int, default=5000, help="total requests (default: %(default)s)")
+    parser.add_argument("--distinct", type=int, default=500,
+                        help="distinct queries to draw requests from (default: %(default)s)")
+    parser.add_argument("--revalidate", action="store_true",
+                        help="send If-None-Match with each query's last ETag, as a browser cache would")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the queries (default: %(default)s)")
+    args = parser.parse_args()
+
+    load_test(args.url, args.clients, args.requests, args.distinct, args.revalidate, args.seed)
@@ -0,0 +1,184 @@
+import argparse
+import calendar
+import os
+import random
+from typing import Dict, List, TextIO
+
+SAMPLE_FILE = "data/diary-sample.txt"
+
+MONTH_NAMES = [None, "January", "February", "March", "April", "May", "June",
+               "July", "August", "September", "October", "November", "December"]
+
+WORDS = """
+and the to of my in with so did there was that it him me at by his for home
+whence thence after where this day being we they all very good but which
+went came took found met walked rode talked dined supped lay rose stayed
+staid saw heard spoke read sang played writ paid gave bought sent told
+morning afternoon evening night noon dinner supper bed office wife lord
+king duke money plague fire music play church business letters news
+coach water boat barge horse house chamber closet garden street coffee
+Mr. Mrs. Sir Lady Captain Creed Hewer Moore Sheply Penn Batten Coventry
+Sandwich Montagu Will Jane Deb Pembleton Hill Povy Evelyn
+merry troubled glad vexed weary pretty handsome brave mighty great
+""".split()
+
+PLACES = [
+    "Westminster Hall", "White Hall", "the Exchange", "the Temple", "Fleet Street",
+    "Axe Yard", "Deptford", "Greenwich", "Woolwich", "the Tower", "Covent Garden",
+    "Lincoln’s Inn Fields", "Paul’s", "Charing Cross", "the Wardrobe", "Islington",
+]
+
+NOTES = [
+    "The Navy Office was then in Seething Lane, Crutched Friars",
+    "Theophila Turner, daughter of Sergeant John and Jane Turner",
+    "Shepley was a servant of Admiral Sir Edward Montagu",
+    "The house stood on the south side of King Street, Westminster",
+    "A popular tavern of the time, much frequented by the clerks of the Exchequer",
+    "The title was not his by right, but was frequently given to him",
+]
+
+RESTORATIONS = ["he", "the", "and", "neither", "to", "I"]
+
+BOOKMARK_PHRASES = [
+    "A great deal of good discourse", "Abroad with my wife by water",
+    "Begun to be severe in the Navy business", "Could not get my wife to go",
+    "Drank a glass of wine and so parted", "Good, but not so good as I expected",
+    "So home and to bed", "Whereof I was glad",
+]
+
+LINE_WIDTH = 72
+
+def wrap(words: List[str], width: int = LINE_WIDTH, indent: str = "") -> List[str]:
+    """Greedily fill lines of at most width characters."""
+    lines = []
+    line = indent
+    for word in words:
+        if len(line) + len(word) + 1 > width and line.strip():
+            lines.append(line)
+            line = indent
+        line = line + " " + word if line.strip() else line + word
+    if line.strip():
+        lines.append(line)
+    return lines
+
+class CorpusWriter:
+    """Write diary-shaped text month by month, keeping counts of what was written."""
+
+    def __init__(self, out: TextIO, seed: int = 0):
+        self.out = out
+        self.rng = random.Random(seed)
+        self.counts = dict.fromkeys(["bytes", "lines", "months", "entries", "block_footnotes",
+                                     "line_footnotes", "inline_notes", "bookmark_blocks"], 0)
+
+    def write_lines(self, lines: List[str]):
+        text = "\n".join(lines) + "\n"
+        self.out.write(text)
+        self.counts["bytes"] += len(text.encode('utf-8'))
+        self.counts["lines"] += len(lines)
+
+    def sentence(self) -> List[str]:
+        rng = self.rng
+        words = [rng.choice(WORDS) for _ in range(rng.randint(6, 22))]
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), rng.choice(PLACES))
+        if rng.random() < 0.08:
+            words.insert(rng.randrange(1, len(words)), f"[{rng.choice(RESTORATIONS)}]")
+        if rng.random() < 0.06:
+            words[-1] += f"--[{rng.choice(NOTES)}.]--"
+            self.counts["inline_notes"] += 1
+        words[0] = words[0][0].upper() + words[0][1:]
+        words[-1] += "."
+        return words
+
+    def block_footnote(self) -> List[str]:
+        words = " ".join(self.rng.choice(NOTES) + "." for _ in range(self.rng.randint(1, 4))).split()
+        lines = wrap(words, LINE_WIDTH, "     ")
+        lines[0] = "     [" + lines[0].lstrip()
+        lines[-1] += "]"
+        self.counts["block_footnotes"] += 1
+        return lines
+
+    def entry(self, year: int, month: int, day: int, first: bool):
+        rng = self.rng
+        suffix = "th" if 10 < day % 100 < 14 else {1: "st", 2: "nd", 3: "rd"}.get(day % 10, "th")
+        if first or rng.random() < 0.03:
+            if rng.random() < 0.5:
+                start = f"{MONTH_NAMES[month][:3]}. {day}{suffix}"
+            else:
+                start = f"{MONTH_NAMES[month]} {day}{suffix}."
+        else:
+            start = f"{day}{suffix}."
+        if calendar.weekday(year, month, day) == calendar.SUNDAY:
+            start = start.rstrip('.') + " (Lord’s day)."
+
+        paragraph = [start]
+        for _ in range(rng.randint(2, 12)):
+            paragraph += self.sentence()
+            if rng.random() < 0.08:
+                # Break the paragraph around an indented block footnote
+                self.write_lines(wrap(paragraph) + [""] + self.block_footnote() + [""])
+                paragraph = []
+        if paragraph:
+            self.write_lines(wrap(paragraph))
+        if rng.random() < 0.02:
+            self.write_lines(["", f"[Ed. note: {rng.choice(NOTES)}]"])
+            self.counts["line_footnotes"] += 1
+        self.write_lines([""])
+        self.counts["entries"] += 1
+
+    def month(self, year: int, month: int, target_bytes: int):
+        # Before 1752 the legal year began on 25th March, hence "JANUARY 1659-1660"
+        year_text = f"{year - 1}-{year}" if month <= 3 else str(year)
+        self.write_lines([f"{MONTH_NAMES[month].upper()} {year_text}", ""])
+        self.counts["months"] += 1
+
+        first = True
+        for day in range(1, calendar.monthrange(year, month)[1] + 1):
+            if self.rng.random() < 0.05:
+                continue
+            self.entry(year, month, day, first)
+            first = False
+            if self.counts["bytes"] >= target_bytes:
+                return
+
+        if month == 12:
+            phrases = self.rng.sample(BOOKMARK_PHRASES, 5)
+            self.write_lines(["ETEXT EDITOR’S BOOKMARKS:", ""] + phrases + [""])
+            self.counts["bookmark_blocks"] += 1
+
+def generate_corpus(out: TextIO, target_bytes: int, seed: int = 0, start_year: int = 1660) -> Dict[str, int]:
+    """
+    Write at least target_bytes of synthetic diary text to out.
+
+    The text has month headers, entry starts in the "1st.", "Jan. 1st" and
+    "January 1st." forms, indented block footnotes, inline [...] notes and
+    restorations, and an editor's bookmarks block after each December, so it
+    exercises the same parser paths as the real diary. The same seed always
+    gives the same text. Returns counts of what was written.
+    """
+    writer = CorpusWriter(out, seed)
+    year, month = start_year, 1
+    while writer.counts["bytes"] < target_bytes:
+        writer.month(year, month, target_bytes)
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return writer.counts
+
+def write_corpus(path: str, scale: float = 1.0, seed: int = 0) -> Dict[str, int]:
+    """Write a corpus of scale times the size of the shipped sample to path."""
+    target_bytes = int(os.path.getsize(SAMPLE_FILE) * scale)
+    with open(path, 'w', encoding='utf-8', newline='\n') as out:
+        return generate_corpus(out, target_bytes, seed)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic diary text for benchmarks.")
+    parser.add_argument("output", help="file to write")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help=f"size as a multiple of {SAMPLE_FILE} (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    args = parser.parse_args()
+
+    counts = write_corpus(args.output, args.scale, args.seed)
+    print(f"Wrote {counts['bytes']:,} bytes, {counts['entries']:,} entries over {counts['months']} months "
+          f"to {args.output}")
@@ -0,0 +1,66 @@
+import json
+import os
+from typing import Dict, Optional
+
+# Default cap on the total size of cached files
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+class SectionCache:
+    """
+    On-disk cache of parsed sections, one JSON file per content-hash key.
+
+    Files are touched on every hit, so evict() can drop the least recently
+    used ones first until the cache fits in max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached value for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        os.utime(path)
+        return value
+
+    def put(self, key: str, value: Dict):
+        """Store value under key, replacing the file atomically."""
+        path = self._path(key)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+    def evict(self) -> int:
+        """Remove least recently used files until the cache fits. Returns the number removed."""
+        files = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            files.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+
+        removed = 0
+        for _, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+            removed += 1
+        return removed
+
+    def report(self) -> str:
+        return f"Cache: {self.hits} hits, {self.misses} misses."
@@ -1,9 +1,28 @@
+import argparse
+import hashlib
 import json
 import sys
 import os
-from typing import List, Dict, Optional
+import re
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+from check_dates import DateChecker, entry_from_row
+from compression import is_compressed, open_file
+from diary_entry import Entry
+from diary_index import IndexWriter
+from footnote_store import FootnoteWriter, footnotes_path_for
+from parse_cache import DEFAULT_MAX_BYTES, SectionCache
+from profiling import Profiler, profile_stage
 
 # Constants
+# Bump when parsing rules change, so cached sections are reparsed
+PARSER_VERSION = 1
+
+# Bytes read at a time when hashing the input before a resume point
+HASH_CHUNK = 1024 * 1024
+
 MONTHS = {
     "JANUARY": 1, "FEBRUARY": 2, "MARCH": 3, "APRIL": 4, "MAY": 5, "JUNE": 6,
     "JULY": 7, "AUGUST": 8, "SEPTEMBER": 9, "OCTOBER": 10, "NOVEMBER": 11, "DECEMBER": 12
@@ -14,29 +33,104 @@ SHORT_MONTHS = {
     "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12
 }
 
+# Line kinds returned by classify_line
+BLANK = "blank"
+HEADER = "header"
+ENTRY_START = "entry_start"
+FOOTNOTE_START = "footnote_start"
+BODY = "body"
+
+# Ordinal suffixes accepted after a day number, in match order
+DAY_SUFFIXES = ('st', 'nd', 'rd', 'th', 'd')
+
+LEADING_DIGITS_RE = re.compile(r'\d+')
+HAS_DIGIT_RE = re.compile(r'\d')
+
+def is_month_word(word: str) -> bool:
+    """Check if word names a month, either abbreviated (Jan) or in full (JANUARY, June)."""
+    return word in SHORT_MONTHS or word.upper() in MONTHS
+
+def classify_line(line: str) -> tuple[str, Optional[int], Optional[int], Optional[int]]:
+    """
+    Classify a raw line in a single pass. Returns (kind, month, year, day).
+
+    For HEADER lines month and year are parsed from the header. For
+    ENTRY_START lines day is set, and month is set only when the entry
+    names its own month (e.g. 'Jan. 1st'). All other fields are None.
+    """
+    stripped = line.strip()
+    if not stripped:
+        return BLANK, None, None, None
+
+    # Indented block footnote, e.g. "     [Pepys's house was ..."
+    if stripped[0] == '[':
+        if line[0] == ' ' or line[0] == '\t':
+            return FOOTNOTE_START, None, None, None
+        return BODY, None, None, None
+
+    # Only the first two words decide the kind of line
+    parts = stripped.split(None, 2)
+    first = parts[0]
+    second = parts[1] if len(parts) > 1 else None
+
+    # Case 1: Starts with number (e.g. "1st.", "2nd.", "5th,(Lord's")
+    if first[0].isdigit():
+        digits = LEADING_DIGITS_RE.match(first)
+        if not digits:
+            return BODY, None, None, None
+        day = int(digits.group())
+        # Day of month constraint (1-31)
+        if not 1 <= day <= 31:
+            return BODY, None, None, None
+
+        # A bare number or ordinal needs context, e.g. "1 January", "29th (Sunday)"
+        has_context = second is not None and (second.startswith('(') or is_month_word(second))
+
+        remaining = first[digits.end():] # e.g. "th,(Lord's" or "." or ""
+        if not remaining:
+            is_start = has_context
+        else:
+            # 'd' is only used for 2d, 3d, 22d, 23d
+            suffix = next((s for s in DAY_SUFFIXES
+                           if remaining.startswith(s) and (s != 'd' or day in (2, 3, 22, 23))), None)
+            if suffix:
+                after_suffix = remaining[len(suffix):]
+                # "29th" followed by "of" is not a start, "1st." is
+                is_start = has_context if not after_suffix else not after_suffix[0].isalnum()
+            else:
+                # Simple dot after number, e.g. "1."
+                is_start = remaining[0] == '.'
+
+        if is_start:
+            return ENTRY_START, None, None, day
+        return BODY, None, None, None
+
+    # Case 2: Month header (e.g. "JANUARY 1659-1660"), which must be
+    # uppercase (ignoring numbers and separators) and contain a year
+    if (first.replace(',', '').replace('.', '') in MONTHS
+            and HAS_DIGIT_RE.search(stripped) and stripped.isupper()):
+        month, year = parse_header(stripped)
+        return HEADER, month, year, None
+
+    # Case 3: Starts with Month (e.g. "Jan. 1st")
+    month_day = parse_month_day(first, second)
+    if month_day:
+        return ENTRY_START, month_day[0], None, month_day[1]
+
+    return BODY, None, None, None
+
+def parse_month_day(first: str, second: Optional[str]) -> Optional[tuple[int, int]]:
+    """Parse (month, day) from the first two words of a 'Jan. 1st' style entry start."""
+    month_word = first.rstrip('.,').replace('.', '')
+    if not (month_word and is_month_word(month_word) and second and second[0].isdigit()):
+        return None
+    month = SHORT_MONTHS.get(month_word) or MONTHS[month_word.upper()]
+    digits = LEADING_DIGITS_RE.match(second)
+    return month, int(digits.group()) if digits else 1
+
 def is_header(line: str) -> bool:
     """Check if line is a Month Year header (e.g. JANUARY 1659-1660)."""
-    clean_line = line.strip()
-    if not clean_line:
-        return False
-    
-    # Header must be uppercase (ignoring numbers and separators)
-    # and contain a year-like structure
-    parts = clean_line.split()
-    if not parts:
-        return False
-        
-    first_word = parts[0].replace(',', '').replace('.', '')
-    if first_word not in MONTHS:
-        return False
-        
-    # Check if the line contains digits (for the year)
-    has_digits = any(c.isdigit() for c in clean_line)
-    
-    # Check if mostly uppercase
-    is_upper = clean_line.replace('-', ' ').replace('0', '').replace('1', '').replace('2', '').replace('3', '').replace('4', '').replace('5', '').replace('6', '').replace('7', '').replace('8', '').replace('9', '').strip().isupper()
-    
-    return has_digits and is_upper
+    return classify_line(line.strip())[0] is HEADER
 
 def parse_header(line: str) -> tuple[Optional[int], Optional[int]]:
     """Extract month and year from header."""
@@ -66,260 +160,148 @@ def parse_header(line: str) -> tuple[Optional[int], Optional[int]]:
             
     return month, year
 
+def entry_start_date(line: str) -> Optional[tuple[Optional[int], int]]:
+    """Return (month, day) if line starts a new entry, where month is None if not given."""
+    kind, month, _, day = classify_line(line.strip())
+    if kind is HEADER:
+        # Headers such as "MAY 1660" also read as a month and day
+        parts = line.split(None, 2)
+        return parse_month_day(parts[0], parts[1] if len(parts) > 1 else None)
+    if kind is ENTRY_START:
+        return month, day
+    return None
+
 def is_entry_start(line: str) -> bool:
     """Check if line starts a new entry (e.g. '1st.', 'Jan. 1st')."""
-    clean_line = line.strip()
-    if not clean_line:
-        return False
-        
-    # Must start with a number or a month name
-    parts = clean_line.split()
-    if not parts:
-        return False
-        
-    first_part = parts[0].rstrip('.,')
-    
-    if not first_part:
-        return False
-    
-    # Case 1: Starts with number (e.g. "1st.", "2nd.")
-    if first_part[0].isdigit():
-        # Extract the numeric part
-        num_str = ""
-        for char in first_part:
-            if char.isdigit():
-                num_str += char
-            else:
-                break
-        
-        if num_str:
-            val = int(num_str)
-            # Day of month constraint (1-31)
-            if 1 <= val <= 31:
-                # Check for valid suffix or dot
-                # We check the original part (without rstrip, but split by space)
-                # parts[0] is like "5th,(Lord's"
-                
-                raw_first = parts[0]
-                remaining = raw_first[len(num_str):] # e.g. "th,(Lord's" or "." or ""
-                
-                valid_suffixes = ['st', 'nd', 'rd', 'th', 'd']
-                
-                # 1. Exact match suffix + dot/comma/end
-                # e.g. "1st." "1st," "1."
-                
-                if not remaining: 
-                    # Just a number "1" or "29".
-                    # Pepys usually has dot.
-                    # Require punctuation OR specific context (like parens or month)
-                    if len(parts) > 1:
-                        # Case: "1 January"
-                        if parts[1] in SHORT_MONTHS or parts[1].upper() in MONTHS:
-                            return True
-                        # Case: "1 (Sunday)"
-                        if parts[1].startswith('('):
-                            return True
-                            
-                    return False # "29th of May" -> remaining is "th", handled below. "1" -> False.
-                
-                # Check for suffix
-                suffix_found = False
-                suffix_len = 0
-                for s in valid_suffixes:
-                    if remaining.startswith(s):
-                        # Special check for 'd' suffix: only allow 2d, 3d, 22d, 23d
-                        if s == 'd' and val not in [2, 3, 22, 23]:
-                            continue # Try other suffixes or fail
-                            
-                        suffix_found = True
-                        suffix_len = len(s)
-                        break
-                
-                after_suffix = remaining[suffix_len:] # e.g. ".(..." or "," or ""
-                
-                if suffix_found:
-                    # Must be followed by punctuation or end of string (if split by space)
-                    # e.g. "th." or "th," or "th" (if space followed)
-                    # But "thstring" is invalid.
-                    if not after_suffix:
-                        # Suffix ended the word (e.g. "29th" in "29th of May")
-                        # Require punctuation or special context
-                        if len(parts) > 1:
-                            if parts[1].startswith('('): return True
-                            if parts[1] in SHORT_MONTHS or parts[1].upper() in MONTHS: return True
-                        return False # "29th" followed by "of" -> False
-                        
-                    if not after_suffix[0].isalnum():
-                        # Has punctuation, e.g. "th."
-                        return True
-                        
-                # Check for simple dot after number
-                if remaining.startswith('.'):
-                    return True
-                    
-        return False
-        
-    # Case 2: Starts with Month (e.g. "Jan. 1st")
-    first_part_clean = first_part.replace('.', '')
-    if first_part_clean in SHORT_MONTHS or first_part_clean.upper() in MONTHS:
-        # Check if second part exists and is a number/ordinal
-        if len(parts) > 1 and parts[1][0].isdigit():
-            return True
-            
-    return False
+    return entry_start_date(line) is not None
 
 def parse_entry_date(line: str, current_year: int, current_month: int) -> tuple[int, int, int, str]:
     """Parse the date from an entry line. Returns (year, month, day, cleaned_line)."""
-    clean_line = line.strip()
-    parts = clean_line.split()
-    
-    day = 1
-    month = current_month
-    year = current_year
-    
-    first_part = parts[0].rstrip('.,')
-    
-    # Detect if it starts with month
-    first_part_clean = first_part.replace('.', '')
-    start_idx = 0
-    
-    if first_part_clean in SHORT_MONTHS:
-        month = SHORT_MONTHS[first_part_clean]
-        start_idx = 1
-    elif first_part_clean.upper() in MONTHS:
-        month = MONTHS[first_part_clean.upper()]
-        start_idx = 1
-        
-    # Parse day part (e.g. "1st", "2nd", "1")
-    day_part = parts[start_idx].rstrip('.,:()')
-    # Remove suffix like st, nd, rd, th
-    day_str = ""
-    for char in day_part:
-        if char.isdigit():
-            day_str += char
-        else:
-            break
-            
-    if day_str:
-        day = int(day_str)
-        
-    return year, month, day, line
+    month, day = entry_start_date(line) or (None, 1)
+    return current_year, month or current_month, day, line
 
 def is_footnote_start(line: str) -> bool:
     """Check if line is start of an indented footnote block."""
-    # Check for indentation (start with space) and opening bracket
-    if line.startswith(' ') or line.startswith('\t'):
-        stripped = line.strip()
-        if stripped.startswith('['):
-            return True
-    return False
+    return classify_line(line)[0] is FOOTNOTE_START
+
+# An inline bracket runs from a '[' to the first ']' after it
+INLINE_NOTE_RE = re.compile(r'\[([^\]]*)\]')
+
+def is_restoration(content: str) -> bool:
+    """Check if bracketed text is an editorial restoration (e.g. [he]) rather than a note."""
+    # Heuristic: Keep if short (< 25 chars) or seems to be part of sentence flow
+    # Most explanatory notes are long sentences or start with "Ed. note" or names/definitions
+    if len(content) >= 25:
+        return False
+
+    # "i.e." is a definition/footnote usually
+    if content.strip().lower().startswith("i.e."):
+        return False
+    if "note" in content.lower():
+        return False
+
+    # Also check for "Ed. note" or similar explicit markers
+    if "Ed." in content or "note:" in content:
+        return False
+
+    # Assume short things are restorations like [he], [she], [dirted]
+    return True
 
 def process_inline_footnotes(text: str, start_index: int, footnotes_list: List[str]) -> str:
     """
     Extract inline footnotes [text] to {N}, keep restorations [he].
     """
-    result = ""
-    i = 0
-    n = len(text)
-    while i < n:
-        if text[i] == '[':
-            # Find closing bracket
-            j = text.find(']', i)
-            if j != -1:
-                content = text[i+1:j]
-                
-                # Heuristic: Keep if short (< 25 chars) or seems to be part of sentence flow
-                # Most explanatory notes are long sentences or start with "Ed. note" or names/definitions
-                
-                is_restoration = False
-                
-                # Check for specific restoration patterns
-                if len(content) < 25:
-                    # Check if it looks like a definition?
-                    # "i.e." is a definition/footnote usually
-                    if content.strip().lower().startswith("i.e."):
-                        is_restoration = False # Treat as footnote
-                    elif "note" in content.lower():
-                         is_restoration = False
-                    else:
-                        # Assume short things are restorations like [he], [she], [dirted]
-                        is_restoration = True
-                
-                # Also check for "Ed. note" or similar explicit markers
-                if "Ed." in content or "note:" in content:
-                    is_restoration = False
+    if '[' not in text:
+        return text
 
-                if is_restoration:
-                    result += text[i:j+1] # Keep it including brackets
-                else:
-                    # Extract as footnote
-                    footnotes_list.append(content)
-                    marker = f"{{{start_index + len(footnotes_list) - 1}}}"
-                    result += marker
-                
-                i = j + 1
-                continue
-        result += text[i]
-        i += 1
-    return result
+    def replace(match: re.Match) -> str:
+        content = match.group(1)
+        if is_restoration(content):
+            return match.group(0) # Keep it including brackets
+
+        # Extract as footnote
+        footnotes_list.append(content)
+        return f"{{{start_index + len(footnotes_list) - 1}}}"
+
+    return INLINE_NOTE_RE.sub(replace, text)
+
+def build_entry(date: Optional[str], lines: List[str], footnotes: List[str],
+                profile: Optional[Profiler] = None) -> Optional[Entry]:
+    """Join the collected lines of an entry and extract its inline footnotes."""
+    if not (date and lines):
+        return None
+
+    # Join first
+    full_text = " ".join(line.strip() for line in lines)
+
+    # Now process inline
+    if profile is None:
+        processed_text = process_inline_footnotes(full_text, len(footnotes), footnotes)
+    else:
+        start = time.perf_counter()
+        processed_text = process_inline_footnotes(full_text, len(footnotes), footnotes)
+        profile.add_time("inline_footnotes", time.perf_counter() - start, date)
+
+    return Entry(date, processed_text, footnotes)
+
+def scan_entries(lines: Iterable[tuple[int, str]], current_year: int = 1660, current_month: int = 1,
+                 previous_line_blank: bool = False, discard_lead: bool = False,
+                 profile: Optional[Profiler] = None
+                 ) -> Iterator[tuple[Optional[int], int, int, Optional[Entry]]]:
+    """
+    Run the parser over (position, line) pairs and report every entry start.
+
+    Yields (position, year, month, entry) at each line that starts a new
+    entry, where entry is the one completed by it (or None), and finally
+    (None, year, month, last_entry) at the end of input. A real entry start
+    depends only on the year and month in effect, so parsing can begin at
+    any of these positions given that context.
 
-def process_diary(file_path: str, output_path: str):
-    current_year = 1660
-    current_month = 1
+    discard_lead drops the lines and footnotes before the first entry start;
+    use it when starting mid-file, where those belong to an earlier entry.
+
+    With a profiler, classify_line outcomes and parser decisions are
+    counted and inline footnote extraction is timed per entry.
+    """
     current_entry_date = None
     current_entry_lines = []
     current_footnotes = []
-    
-    entries = []
-    
-    def flush_entry():
-        nonlocal current_entry_lines, current_entry_date, current_footnotes
-        if current_entry_date and current_entry_lines:
-            # Join first
-            full_text = " ".join(line.strip() for line in current_entry_lines)
-            
-            # Now process inline
-            processed_text = process_inline_footnotes(full_text, len(current_footnotes), current_footnotes)
-            
-            entries.append({
-                "date": current_entry_date,
-                "entry": processed_text,
-                "footnotes": list(current_footnotes) # Copy
-            })
-            
-            current_entry_lines = []
-            current_footnotes = []
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-        
+
     in_footnote_block = False
     in_bookmarks_block = False
     current_block_footnote_text = []
-    previous_line_blank = False
     
-    for line in lines:
-        stripped = line.strip()
-        if not stripped:
+    for position, line in lines:
+        kind, month, year, day = classify_line(line)
+        if profile is not None:
+            profile.counts["line_" + kind] += 1
+        if kind is BLANK:
             previous_line_blank = True
             continue
+        stripped = line.strip()
             
         # Check for bookmarks block start
         if "ETEXT EDITOR’S BOOKMARKS" in stripped:
+            if profile is not None:
+                profile.counts["bookmark_blocks"] += 1
             in_bookmarks_block = True
             previous_line_blank = False
             continue
             
         # If in bookmarks block, check if we should exit (Header or Entry Start)
         if in_bookmarks_block:
-            if is_header(stripped) or is_entry_start(stripped):
+            if kind is HEADER or kind is ENTRY_START:
                 in_bookmarks_block = False
             else:
+                if profile is not None:
+                    profile.counts["bookmark_lines_skipped"] += 1
                 previous_line_blank = False
                 continue
 
         # Check for block footnotes start
-        if is_footnote_start(line):
+        if kind is FOOTNOTE_START:
+            if profile is not None:
+                profile.counts["footnote_blocks"] += 1
             # Check if it's a single-line footnote
             if stripped.endswith(']'):
                 # Single line footnote
@@ -361,18 +343,25 @@ def process_diary(file_path: str, output_path: str):
             previous_line_blank = False
             continue
 
-        if is_header(stripped):
-            m, y = parse_header(stripped)
-            if m and y:
-                current_month = m
-                current_year = y
+        if kind is HEADER:
+            if profile is not None:
+                profile.counts["headers"] += 1
+            if month and year:
+                current_month = month
+                current_year = year
             previous_line_blank = False
             continue
             
-        if is_entry_start(stripped) and previous_line_blank and not line[0].isspace():
-            flush_entry()
-            year, month, day, _ = parse_entry_date(stripped, current_year, current_month)
-            current_entry_date = f"{year:04d}-{month:02d}-{day:02d}"
+        if kind is ENTRY_START and previous_line_blank and not line[0].isspace():
+            if profile is not None:
+                profile.counts["entry_starts"] += 1
+            entry = build_entry(current_entry_date, current_entry_lines, current_footnotes, profile)
+            yield position, current_year, current_month, entry
+            if entry is not None or discard_lead:
+                current_entry_lines = []
+                current_footnotes = []
+                discard_lead = False
+            current_entry_date = f"{current_year:04d}-{month or current_month:02d}-{day:02d}"
             current_entry_lines.append(stripped)
         else:
             if current_entry_date:
@@ -380,16 +369,514 @@ def process_diary(file_path: str, output_path: str):
         
         previous_line_blank = False
                 
-    flush_entry()
-    
+    entry = build_entry(current_entry_date, current_entry_lines, current_footnotes, profile)
+    yield None, current_year, current_month, entry
+
+def iter_entries(fileobj: Iterable[str], profile: Optional[Profiler] = None) -> Iterator[Entry]:
+    """
+    Yield parsed entries from a trimmed diary text stream, one at a time.
+
+    Lines are consumed lazily, so memory use is bounded by the size of the
+    largest single entry rather than the size of the input.
+    """
+    for _, _, _, entry in scan_entries(enumerate(fileobj), profile=profile):
+        if entry is not None:
+            yield entry
+
+# Candidate month headers at the start of a line, confirmed with classify_line
+HEADER_CANDIDATE_RE = re.compile(rb'^[ \t]*(?:' + b'|'.join(m.encode() for m in MONTHS) + rb')\b', re.MULTILINE)
+
+def read_lines(f: BinaryIO, start: int = 0) -> Iterator[tuple[int, str]]:
+    """Yield (byte_offset, line) pairs from a binary file, starting at offset start."""
+    f.seek(start)
+    position = start
+    for raw in f:
+        yield position, raw.decode('utf-8')
+        position += len(raw)
+
+def iter_serial_entries(file_path: str, start: int = 0, year: int = 1660, month: int = 1,
+                        previous_line_blank: bool = False, profile: Optional[Profiler] = None,
+                        resume_point: Optional[Dict] = None) -> Iterator[Entry]:
+    """
+    Parse file_path from byte offset start and yield its entries in order.
+
+    start must be the beginning of the file or an entry start reported by
+    scan_entries, with the year and month in effect there. If resume_point
+    is given it is kept updated with the offset, year and month of the last
+    entry start seen and the number of entries yielded before that entry.
+    Until an entry has been yielded it stays at start, as the footnotes
+    before the first entry start belong to the first entry.
+    """
+    rows = 0
+    if resume_point is not None:
+        resume_point.update(offset=start, year=year, month=month, row=0)
+    with open_file(file_path, 'rb') as f:
+        for position, y, m, entry in scan_entries(read_lines(f, start), year, month,
+                                                  previous_line_blank, profile=profile):
+            if entry is not None:
+                yield entry
+                rows += 1
+            if position is not None and resume_point is not None and rows:
+                resume_point.update(offset=position, year=y, month=m, row=rows)
+
+def find_sections(data: bytes) -> List[tuple[int, int, int]]:
+    """
+    Split the raw diary text at its month headers.
+
+    Returns (byte_offset, year, month) for each section, where year and month
+    are the context in effect just before the section's header.
+    """
+    current_year, current_month = 1660, 1
+    sections = [(0, current_year, current_month)]
+    for match in HEADER_CANDIDATE_RE.finditer(data):
+        line_end = data.find(b'\n', match.start())
+        line = data[match.start():line_end if line_end != -1 else len(data)].decode('utf-8')
+        kind, month, year, _ = classify_line(line)
+        if kind is not HEADER:
+            continue
+        if match.start() > 0:
+            sections.append((match.start(), current_year, current_month))
+        if month and year:
+            current_month = month
+            current_year = year
+    return sections
+
+def parse_section(file_path: str, start: int, end: int, year: int, month: int,
+                  previous_line_blank: bool = False, discard_lead: bool = False
+                  ) -> tuple[tuple, tuple, List[str]]:
+    """
+    Parse the entries that start between byte offsets start and end.
+
+    The last entry is followed past end up to the next entry start. Returns
+    (first, stop, rows) where first and stop are the (offset, year, month) of
+    the first and next entry starts (offset None at end of file) and rows are
+    the entries as NDJSON lines.
+    """
+    first = None if discard_lead else (start, year, month)
+    rows = []
+    with open(file_path, 'rb') as f:
+        for position, y, m, entry in scan_entries(read_lines(f, start), year, month,
+                                                  previous_line_blank, discard_lead):
+            if first is None:
+                first = (position, y, m)
+            elif entry is not None:
+                rows.append(entry.to_json())
+            if position is None or position >= end:
+                return first, (position, y, m), rows
+    return first, (None, year, month), rows
+
+def section_key(data: bytes, start: int, end: int, year: int, month: int, discard_lead: bool) -> str:
+    """Cache key for a section: its raw text, starting context and the parser version."""
+    digest = hashlib.sha256(f"{PARSER_VERSION}|{year}|{month}|{int(discard_lead)}|".encode())
+    digest.update(data[start:end])
+    return digest.hexdigest()
+
+def tail_end(data: bytes, stop: Optional[int]) -> int:
+    """Offset of the end of the line at stop, or of the data if stop is None."""
+    if stop is None:
+        return len(data)
+    line_end = data.find(b'\n', stop)
+    return len(data) if line_end == -1 else line_end + 1
+
+def to_cache_value(data: bytes, start: int, end: int, result: tuple) -> Dict:
+    """
+    Store a parse_section result relative to its start offset.
+
+    A section's entries also depend on the text after end, up to and
+    including the line where parsing stopped, so its hash is kept too.
+    """
+    first, stop, rows = result
+    tail = data[end:tail_end(data, stop[0])]
+    return {
+        "first": [None if first[0] is None else first[0] - start, first[1], first[2]],
+        "stop": [None if stop[0] is None else stop[0] - start, stop[1], stop[2]],
+        "tail_sha256": hashlib.sha256(tail).hexdigest(),
+        "tail_length": len(tail),
+        "rows": rows,
+    }
+
+def from_cache_value(data: bytes, start: int, end: int, value: Dict) -> Optional[tuple]:
+    """Rebuild a parse_section result from a cached value, or None if the tail changed."""
+    first_offset, first_year, first_month = value["first"]
+    stop_offset, stop_year, stop_month = value["stop"]
+    if first_offset is not None:
+        first_offset += start
+    if stop_offset is not None:
+        stop_offset += start
+
+    tail_stop = tail_end(data, stop_offset)
+    if tail_stop - end != value["tail_length"]:
+        return None
+    if hashlib.sha256(data[end:tail_stop]).hexdigest() != value["tail_sha256"]:
+        return None
+    return (first_offset, first_year, first_month), (stop_offset, stop_year, stop_month), value["rows"]
+
+def iter_section_rows(file_path: str, workers: int = 1, cache: Optional[SectionCache] = None,
+                      resume_point: Optional[Dict] = None) -> Iterator[str]:
+    """
+    Parse the diary section by section and yield NDJSON lines in order.
+
+    Each section after the first starts at its header with a fresh parser,
+    skipping the lines that still belong to the previous month's last entry.
+    If a section's first entry start does not match where the previous
+    section stopped (e.g. a header inside a footnote block), it is parsed
+    again from that point, so the output always matches the serial run.
+    Sections up to the first one with an entry are parsed again from the
+    start of the file, as what comes before the first entry is its lead.
+
+    Sections are parsed in a process pool when workers > 1, and sections
+    whose text is unchanged are read from the cache when one is given.
+    resume_point is kept updated as in iter_serial_entries, with the first
+    entry start of each section.
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    sections = find_sections(data)
+    ends = [offset for offset, _, _ in sections[1:]] + [len(data)]
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        results = []
+        keys = []
+        for k, ((start, year, month), end) in enumerate(zip(sections, ends)):
+            key = None
+            result = None
+            if cache is not None:
+                key = section_key(data, start, end, year, month, k > 0)
+                value = cache.get(key)
+                if value is not None:
+                    result = from_cache_value(data, start, end, value)
+                if result is not None:
+                    cache.hits += 1
+                else:
+                    cache.misses += 1
+            if result is None and pool is not None:
+                result = pool.submit(parse_section, file_path, start, end, year, month, discard_lead=(k > 0))
+            results.append(result)
+            keys.append(key)
+
+        expected = (0, 1660, 1)
+        emitted = 0
+        for k, ((start, year, month), end) in enumerate(zip(sections, ends)):
+            result = results[k]
+            if isinstance(result, Future):
+                result = result.result()
+            elif result is None:
+                result = parse_section(file_path, start, end, year, month, discard_lead=(k > 0))
+            if cache is not None and results[k] is not result:
+                cache.put(keys[k], to_cache_value(data, start, end, result))
+
+            first, stop, rows = result
+            if k > 0 and not emitted:
+                # No entry before this section, so the footnotes before its first
+                # entry start belong to that entry, along with any in earlier sections
+                first, stop, rows = parse_section(file_path, 0, end, 1660, 1)
+            elif first != expected:
+                if expected[0] is None:
+                    first, stop, rows = expected, expected, []
+                else:
+                    first, stop, rows = parse_section(file_path, expected[0], end, expected[1], expected[2],
+                                                      previous_line_blank=True)
+            if resume_point is not None and first[0] is not None and rows:
+                resume_point.update(offset=first[0], year=first[1], month=first[2], row=emitted)
+            yield from rows
+            emitted += len(rows)
+            expected = stop
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def classified_lines(profile: Profiler) -> int:
+    """Lines the serial parser has classified so far with this profiler."""
+    return sum(count for name, count in profile.counts.items() if name.startswith("line_"))
+
+def checkpoint_path_for(ndjson_path: str) -> str:
+    return ndjson_path + ".checkpoint"
+
+def input_hash(file_path: str, end: int, start: int = 0) -> str:
+    """Hash of the input text from byte offset start to end, to tell an append from an edit."""
+    digest = hashlib.sha256()
+    remaining = end - start
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        while remaining > 0:
+            chunk = f.read(min(HASH_CHUNK, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+def load_checkpoint(file_path: str, output_path: str, split_footnotes: bool) -> Optional[Dict]:
+    """
+    The checkpoint of the last run, or None if it cannot be resumed from.
+
+    Resuming needs the same parser and layout, an untouched NDJSON and an
+    input whose text before the resume point is unchanged. That text is
+    hashed in full, so an edit anywhere before it is caught; text after it
+    is parsed again anyway. The text after it is hashed too, to tell an
+    input that has not changed from one edited without changing size.
+    """
+    try:
+        with open(checkpoint_path_for(output_path), 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if (checkpoint.get("parser_version") != PARSER_VERSION
+            or checkpoint.get("input") != os.path.abspath(file_path)
+            or checkpoint.get("split_footnotes") != split_footnotes):
+        return None
+    try:
+        if os.path.getsize(output_path) != checkpoint["output_size"]:
+            return None
+        if os.path.getsize(file_path) < checkpoint["input_size"]:
+            return None
+    except FileNotFoundError:
+        return None
+    if input_hash(file_path, checkpoint["offset"]) != checkpoint["input_sha256"]:
+        return None
+    return checkpoint
+
+def read_rows(output_path: str, offset: int) -> Iterator[Dict]:
+    """The NDJSON rows from byte offset on."""
+    with open(output_path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            yield json.loads(line)
+
+def process_diary(file_path: str, output_path: str, workers: int = 1, use_cache: bool = False,
+                  cache_max_bytes: int = DEFAULT_MAX_BYTES, profile: Optional[Profiler] = None,
+                  split_footnotes: bool = False, resume: bool = False, check: bool = False,
+                  issues_path: Optional[str] = None):
+    """
+    Parse file_path into NDJSON at output_path, with its date index.
+
+    With split_footnotes, footnotes are interned into a table next to the
+    output and each row only holds their IDs (see footnote_store).
+
+    Each run saves a checkpoint: the input offset of an entry start near the
+    end (the last one when parsing serially), with the year and month in
+    effect there, and where that entry's row starts in the NDJSON. The
+    parser holds no other state at an entry start, so with resume, text
+    appended to the input since is parsed from there (the last entry may
+    have grown) and appended to the NDJSON, its index and footnote table. Without a usable checkpoint the whole file is parsed.
+    The appended text is parsed serially, without workers or the cache.
+
+    With check, each row is also passed to a check_dates.DateChecker as it
+    is written and its report printed at the end, with the issues written
+    to issues_path if given (appended to when resuming).
+
+    Files ending in .gz are read or written as gzip streams. Compressed
+    input is parsed serially, and a compressed output has no date index
+    or checkpoint, as those need byte offsets into the plain text.
+
+    Classifier counts, per-entry timings and the parse stage's line count
+    are only collected by the serial parser, not with workers or the
+    section cache.
+    """
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
+
+    if is_compressed(file_path) and (workers > 1 or use_cache):
+        print("Compressed input is parsed serially, without workers or the section cache.")
+        workers, use_cache = 1, False
+
+    input_size = os.path.getsize(file_path)
+    checkpoint = load_checkpoint(file_path, output_path, split_footnotes) if resume else None
+    index = None
+    footnotes = None
+    if checkpoint is not None:
+        if (input_size == checkpoint["input_size"]
+                and input_hash(file_path, input_size, checkpoint["offset"]) == checkpoint.get("tail_sha256")):
+            print(f"No new text in {file_path} since the last run.")
+            return
+        index = IndexWriter.resume(output_path, checkpoint["output_offset"])
+        if index is not None and split_footnotes:
+            released = [key for row in read_rows(output_path, checkpoint["output_offset"])
+                        for key in row["footnote_ids"]]
+            footnotes = FootnoteWriter.resume(output_path, released)
+        if index is None or (split_footnotes and footnotes is None):
+            checkpoint = None
+    if resume and checkpoint is None:
+        print(f"No usable checkpoint for {output_path}, parsing from the start.")
+
+    # The section cache lives next to the output
+    cache = SectionCache(output_path + ".cache", cache_max_bytes) if use_cache and checkpoint is None else None
+
+    # Last entry start seen, for the next checkpoint
+    resume_point = {}
+    start = 0 if checkpoint is None else checkpoint["offset"]
+    first_row = 0 if checkpoint is None else checkpoint["row"]
+
+    def iter_rows() -> Iterator[tuple[str, Optional[Entry]]]:
+        """NDJSON rows in order, each with its Entry if the serial parser made one."""
+        if checkpoint is not None:
+            entries = iter_serial_entries(file_path, start, checkpoint["year"], checkpoint["month"],
+                                          previous_line_blank=start > 0, profile=profile,
+                                          resume_point=resume_point)
+        elif workers > 1 or cache is not None:
+            for row in iter_section_rows(file_path, workers, cache, resume_point):
+                yield row, None
+            return
+        else:
+            entries = iter_serial_entries(file_path, profile=profile, resume_point=resume_point)
         for entry in entries:
-            f.write(json.dumps(entry) + '\n')
+            yield entry.to_json(), entry
+
+    # Invalid until this run has finished writing
+    if os.path.exists(checkpoint_path_for(output_path)):
+        os.remove(checkpoint_path_for(output_path))
+
+    if checkpoint is None:
+        # Sidecar index of each row's date, byte offset and length
+        index = IndexWriter(output_path) if not is_compressed(output_path) else None
+        footnotes = FootnoteWriter(output_path) if split_footnotes else None
+        if footnotes is None and os.path.exists(footnotes_path_for(output_path)):
+            # Left over from an earlier split run
+            os.remove(footnotes_path_for(output_path))
+        offset = 0
+        mode = 'w'
+    else:
+        # Drop the rows from the resume point on, they are parsed again with the new text
+        offset = checkpoint["output_offset"]
+        os.truncate(output_path, offset)
+        mode = 'a'
     
-    print(f"Processed {len(entries)} entries.")
+    checker = None
+    if check:
+        issues = open_file(issues_path, 'a' if checkpoint is not None else 'w', encoding='utf-8') if issues_path else None
+        checker = DateChecker(out=issues, file=output_path)
+        if first_row:
+            # Check the new rows against the last one kept
+            _, last_offset, _ = max(index.entries, key=lambda entry: entry[1])
+            previous = entry_from_row(next(read_rows(output_path, last_offset)))
+            if isinstance(previous, Entry) and previous.is_valid():
+                checker.previous, checker.previous_line_num = previous, first_row
+
+    serial = checkpoint is not None or not (workers > 1 or cache is not None)
+    lines_before = classified_lines(profile) if profile is not None else 0
+    count = 0
+    row_offset = None
+    with open_file(output_path, mode, encoding='utf-8', newline='\n') as out, \
+         profile_stage(profile, "parse") as parse_stage:
+        for row, entry in iter_rows():
+            if entry is None and (footnotes is not None or checker is not None):
+                # Rows parsed in sections only come as JSON
+                entry = json.loads(row)
+            if footnotes is not None:
+                row = json.dumps(footnotes.split(entry))
+            if count == resume_point.get("row"):
+                row_offset = offset
+            out.write(row + '\n')
+            if index is not None:
+                index.add_row(row, offset)
+            if checker is not None:
+                checker.add(first_row + count + 1, entry)
+            offset += len(row.encode('utf-8')) + 1
+            count += 1
+        if profile is not None:
+            if serial:
+                # The classifier counted every line it saw
+                parse_stage["lines"] = classified_lines(profile) - lines_before
+            parse_stage["bytes"] = os.path.getsize(file_path) - start
+            parse_stage["entries"] = count
+    if footnotes is not None:
+        footnotes.close()
+        print(f"Interned {footnotes.total} footnotes as {sum(1 for _, n in footnotes.table.values() if n)} "
+              f"unique texts in {footnotes.path}.")
+    if index is not None:
+        with profile_stage(profile, "index"):
+            index.close()
+
+    total = first_row + count
+    if row_offset is not None and index is not None and not is_compressed(file_path):
+        with open(checkpoint_path_for(output_path), 'w', encoding='utf-8') as f:
+            json.dump({
+                "parser_version": PARSER_VERSION,
+                "input": os.path.abspath(file_path),
+                "input_size": input_size,
+                "input_sha256": input_hash(file_path, resume_point["offset"]),
+                "tail_sha256": input_hash(file_path, input_size, resume_point["offset"]),
+                "offset": resume_point["offset"],
+                "year": resume_point["year"],
+                "month": resume_point["month"],
+                "row": first_row + resume_point["row"],
+                "output_offset": row_offset,
+                "output_size": offset,
+                "split_footnotes": split_footnotes,
+            }, f)
+
+    if checkpoint is None:
+        print(f"Processed {total} entries.")
+    else:
+        print(f"Resumed at byte {start:,}: parsed {count} entries from the new text, {total} in total.")
+    if cache is not None:
+        cache.evict()
+        print(cache.report())
+    if checker is not None:
+        if checker.out is not None:
+            checker.out.close()
+        checker.report()
+
+def watch_diary(file_path: str, output_path: str, interval: float = 2.0, **options):
+    """
+    Keep output_path up to date as text is appended to file_path.
+
+    Polls the input's size and modification time every interval seconds
+    and resumes from the checkpoint when either changes, so each update
+    costs time in proportion to the new text. Runs until interrupted.
+    """
+    last = None
+    while True:
+        stat = os.stat(file_path)
+        if (stat.st_size, stat.st_mtime_ns) != last:
+            last = (stat.st_size, stat.st_mtime_ns)
+            try:
+                process_diary(file_path, output_path, resume=True, **options)
+            except UnicodeDecodeError:
+                # Caught mid-write, the checkpoint is gone so the next poll parses from the start
+                print("Input ends in a partial character, retrying.")
+                last = None
+        time.sleep(interval)
 
 if __name__ == "__main__":
-    process_diary("data/diary-trimmed.txt", "data/diary-parsed.ndjson")
+    parser = argparse.ArgumentParser(description="Parse the trimmed diary into NDJSON entries.")
+    parser.add_argument("--input", default="data/diary-trimmed.txt",
+                        help="trimmed diary text, decompressed as it is read if it ends in .gz (default: %(default)s)")
+    parser.add_argument("--output", default="data/diary-parsed.ndjson",
+                        help="NDJSON to write, gzip-compressed if it ends in .gz (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes to parse month sections with (default: 1)")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse parsed month sections whose text has not changed since the last run")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="maximum size of the section cache in MB (default: %(default)s)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="write a JSON report of stage times, line counts and the slowest entries")
+    parser.add_argument("--split-footnotes", action="store_true",
+                        help="intern footnotes into a diary-parsed.ndjson.footnotes table, loaded only when needed")
+    parser.add_argument("--resume", action="store_true",
+                        help="only parse text appended since the last run, from its checkpoint")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep parsing text as it is appended to the input, until interrupted")
+    parser.add_argument("--check", action="store_true",
+                        help="check entry dates as they are parsed, as check_dates.py does")
+    parser.add_argument("--issues", metavar="FILE",
+                        help="with --check, also write every issue to FILE as NDJSON")
+    parser.add_argument("--interval", type=float, default=2.0,
+                        help="seconds between checks for new text with --watch (default: %(default)s)")
+    args = parser.parse_args()
+
+    profile = Profiler("parse_diary") if args.profile else None
+    options = dict(workers=args.workers, use_cache=args.cache, cache_max_bytes=args.cache_size * 1024 * 1024,
+                   profile=profile, split_footnotes=args.split_footnotes, check=args.check,
+                   issues_path=args.issues)
+    if args.watch:
+        try:
+            watch_diary(args.input, args.output, args.interval, **options)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+    else:
+        process_diary(args.input, args.output, resume=args.resume, **options)
+    if profile is not None:
+        profile.write(args.profile)
@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import time
+from typing import Dict, Iterator, List
+
+from check_dates import DateChecker
+from compression import is_compressed, open_file
+from diary_entry import Entry
+from diary_index import IndexWriter
+from footnote_store import footnotes_path_for, load_row, open_store
+from fetch_diary import OUTPUT_FILE as TRIMMED_FILE, fetch_and_clean
+from generate_stats import KEYWORDS, StatsWriter, as_entry, load_keywords
+from parse_diary import checkpoint_path_for, iter_entries
+
+PARSED_FILE = "data/diary-parsed.ndjson"
+STATS_FILE = "data/diary-stats.csv"
+
+STAGES = ["fetch", "parse", "check", "stats"]
+
+def parse_and_write(trimmed_file: str, parsed_file: str) -> Iterator[tuple[int, Entry]]:
+    """Parse the trimmed diary, writing each entry to NDJSON (and its index) as it is yielded."""
+    os.makedirs(os.path.dirname(parsed_file), exist_ok=True)
+    if os.path.exists(footnotes_path_for(parsed_file)):
+        # Left over from an earlier parse_diary.py --split-footnotes run
+        os.remove(footnotes_path_for(parsed_file))
+    if os.path.exists(checkpoint_path_for(parsed_file)):
+        # Only parse_diary.py writes checkpoints, so --resume parses from the start after this
+        os.remove(checkpoint_path_for(parsed_file))
+    # Offsets into a compressed file are no use for random access
+    index = IndexWriter(parsed_file) if not is_compressed(parsed_file) else None
+    offset = 0
+    with open_file(trimmed_file, 'r', encoding='utf-8') as f, \
+         open_file(parsed_file, 'w', encoding='utf-8', newline='\n') as out:
+        for i, entry in enumerate(iter_entries(f), 1):
+            row = entry.to_json()
+            out.write(row + '\n')
+            if index is not None:
+                index.add_row(row, offset)
+            offset += len(row.encode('utf-8')) + 1
+            yield i, entry
+    if index is not None:
+        index.close()
+
+def read_parsed(parsed_file: str) -> Iterator[tuple[int, Entry]]:
+    """Read entries from an existing NDJSON file, with their line numbers."""
+    with open_file(parsed_file, 'r', encoding='utf-8') as f:
+        store = open_store(parsed_file)
+        try:
+            for i, line in enumerate(f, 1):
+                try:
+                    yield i, as_entry(load_row(line, store))
+                except json.JSONDecodeError:
+                    print(f"Line {i}: Invalid JSON")
+        finally:
+            if store is not None:
+                store.close()
+
+def run_pipeline(stages: List[str], keywords: List[str] = KEYWORDS,
+                 trimmed_file: str = TRIMMED_FILE, parsed_file: str = PARSED_FILE,
+                 stats_file: str = STATS_FILE) -> Dict[str, float]:
+    """
+    Run the selected stages in one process and return wall time per stage.
+
+    Parsed entries are handed straight from the parser to the date checker
+    and the stats generator, so the NDJSON is written once and never read
+    back. Without the parse stage, entries are read from parsed_file.
+    """
+    timings = dict.fromkeys(stages, 0.0)
+
+    if "fetch" in stages:
+        start = time.perf_counter()
+        fetch_and_clean()
+        timings["fetch"] = time.perf_counter() - start
+
+    if not {"parse", "check", "stats"} & set(stages):
+        return timings
+
+    if "parse" in stages:
+        print(f"Parsing {trimmed_file}...")
+        source_stage = "parse"
+        source = parse_and_write(trimmed_file, parsed_file)
+    else:
+        print(f"Reading {parsed_file}...")
+        source_stage = "read"
+        timings["read"] = 0.0
+        source = read_parsed(parsed_file)
+
+    checker = DateChecker() if "check" in stages else None
+    stats = StatsWriter(stats_file, keywords) if "stats" in stages else None
+
+    count = 0
+    while True:
+        start = time.perf_counter()
+        item = next(source, None)
+        timings[source_stage] += time.perf_counter() - start
+        if item is None:
+            break
+        i, entry = item
+        count += 1
+
+        if checker is not None:
+            start = time.perf_counter()
+            checker.add(i, entry)
+            timings["check"] += time.perf_counter() - start
+
+        if stats is not None:
+            start = time.perf_counter()
+            stats.add(entry)
+            timings["stats"] += time.perf_counter() - start
+
+    if source_stage == "parse":
+        print(f"Processed {count} entries.")
+
+    if checker is not None:
+        start = time.perf_counter()
+        checker.report()
+        timings["check"] += time.perf_counter() - start
+
+    if stats is not None:
+        start = time.perf_counter()
+        stats.close()
+        timings["stats"] += time.perf_counter() - start
+
+    return timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the diary preprocessing stages in a single process.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES,
+                        help="stages to run, in pipeline order (default: all)")
+    parser.add_argument("--keywords", metavar="FILE",
+                        help="file of keywords to count, one per line (default: built-in KEYWORDS)")
+    args = parser.parse_args()
+
+    keywords = load_keywords(args.keywords) if args.keywords else KEYWORDS
+    timings = run_pipeline(args.stages, keywords)
+
+    print("\nStage times:")
+    for stage, seconds in timings.items():
+        print(f"  {stage:<6} {seconds:8.3f}s")
@@ -0,0 +1,87 @@
+import heapq
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, Optional
+
+# Entries listed per timer in the report
+SLOWEST_ENTRIES = 10
+
+class Profiler:
+    """
+    Collect stage times, counters and per-entry timings for a --profile report.
+
+    Scripts take an optional profiler and only touch it behind an
+    `if profile is not None` check, so a run without --profile pays for
+    nothing but that check.
+    """
+
+    def __init__(self, script: str, slowest: int = SLOWEST_ENTRIES):
+        self.script = script
+        self.slowest_count = slowest
+        self.stages = {}
+        self.counts = Counter()
+        self.timers = {}
+        self.slowest = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict]:
+        """
+        Time a stage's wall and CPU time.
+
+        Yields the stage's record; set "lines" (or "bytes") on it to get a rate.
+        """
+        record = {}
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = time.perf_counter() - wall
+            record["cpu_s"] = time.process_time() - cpu
+            self.stages[name] = record
+
+    def add_time(self, name: str, seconds: float, label: Optional[str] = None):
+        """Add one timing to timer name, keeping the slowest labelled ones."""
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = [0.0, 0]
+        timer[0] += seconds
+        timer[1] += 1
+        if label is not None:
+            heap = self.slowest.setdefault(name, [])
+            if len(heap) < self.slowest_count:
+                heapq.heappush(heap, (seconds, label))
+            elif seconds > heap[0][0]:
+                heapq.heapreplace(heap, (seconds, label))
+
+    def report(self) -> Dict:
+        stages = {}
+        for name, record in self.stages.items():
+            stages[name] = dict(record)
+            for unit in ("lines", "bytes"):
+                if unit in record and record["wall_s"] > 0:
+                    stages[name][f"{unit}_per_s"] = record[unit] / record["wall_s"]
+        return {
+            "script": self.script,
+            "stages": stages,
+            "counts": dict(self.counts),
+            "timers": {name: {"total_s": total, "count": count, "mean_s": total / count}
+                       for name, (total, count) in self.timers.items()},
+            "slowest": {name: [{"label": label, "seconds": seconds}
+                               for seconds, label in sorted(heap, reverse=True)]
+                        for name, heap in self.slowest.items()},
+        }
+
+    def write(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        print(f"Profile saved to {path}")
+
+def profile_stage(profile: Optional[Profiler], name: str) -> ContextManager[Dict]:
+    """profile.stage(name), or a no-op yielding a throwaway record when not profiling."""
+    return profile.stage(name) if profile is not None else nullcontext({})
@@ -0,0 +1,333 @@
+import argparse
+import bisect
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from diary_index import ParsedDiary, date_key
+from footnote_store import LazyEntry
+from generate_stats import rollup_path
+
+PARSED_FILE = "data/diary-parsed.ndjson"
+STATS_FILE = "data/diary-stats.csv"
+
+# Default cap on the total size of cached responses
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+
+# Seconds between checks for regenerated output files
+RELOAD_CHECK_SECONDS = 1.0
+
+# Most entries returned by one range query
+MAX_RANGE_ENTRIES = 1000
+
+class ResponseCache:
+    """
+    In-memory LRU cache of response bodies, bounded by their total size.
+
+    Shared by the server's threads, so every access holds the lock.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            body = self.entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def report(self) -> str:
+        return f"Cache: {self.hits} hits, {self.misses} misses, {len(self.entries)} responses in {self.size:,} bytes."
+
+def to_number(value: str):
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+def load_rollup(path: str) -> List[Dict]:
+    """Rows of a rollup CSV (see generate_stats.write_rollup), sorted by period."""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        rows = [{field: to_number(value) for field, value in row.items()} for row in csv.DictReader(f)]
+    rows.sort(key=lambda row: str(row["period"]))
+    return rows
+
+class KeywordTotals:
+    """
+    Keyword counts of the per-entry stats CSV, summed over any date range.
+
+    Rows are sorted by date, and each mentions_ column is kept as running
+    totals, so a range is two bisections and one subtraction per keyword.
+    """
+
+    def __init__(self, stats_file: str):
+        rows = []
+        with open(stats_file, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            columns = [i for i, field in enumerate(header) if field.startswith("mentions_")]
+            self.keywords = [header[i][len("mentions_"):] for i in columns]
+            for row in reader:
+                try:
+                    rows.append((date_key(row[0]), [int(row[i]) for i in columns]))
+                except (ValueError, IndexError):
+                    continue
+        rows.sort(key=lambda row: row[0])
+
+        self.keys = array('i', (key for key, _ in rows))
+        self.totals = []
+        for k in range(len(self.keywords)):
+            running = array('q', [0])
+            total = 0
+            for _, counts in rows:
+                total += counts[k]
+                running.append(total)
+            self.totals.append(running)
+
+    def count(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+        lo = bisect.bisect_left(self.keys, date_key(start)) if start else 0
+        hi = bisect.bisect_right(self.keys, date_key(end)) if end else len(self.keys)
+        hi = max(hi, lo)
+        return {
+            "entry_count": hi - lo,
+            "keywords": {keyword: running[hi] - running[lo] for keyword, running in zip(self.keywords, self.totals)},
+        }
+
+class Snapshot:
+    """Everything the server answers from, loaded from one version of the output files."""
+
+    def __init__(self, parsed_file: str, stats_file: str, version: str):
+        self.version = version
+        self.diary = ParsedDiary(parsed_file, in_memory=True)
+        self.keywords = None
+        self.rollups = {}
+        if os.path.exists(stats_file):
+            self.keywords = KeywordTotals(stats_file)
+            for period in ("monthly", "yearly"):
+                path = rollup_path(stats_file, period)
+                if os.path.exists(path):
+                    self.rollups[period] = load_rollup(path)
+
+def files_version(paths: List[str]) -> str:
+    """Short hash of the size and modification time of each file that exists."""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+        except FileNotFoundError:
+            signature.append(f"{path}:-")
+    return hashlib.sha1("|".join(signature).encode()).hexdigest()[:16]
+
+class DiaryData:
+    """
+    The current Snapshot, reloaded when the output files are regenerated.
+
+    Files are checked at most every RELOAD_CHECK_SECONDS. A new snapshot
+    is only swapped in if the files did not change while it was loading,
+    so a half-written file is picked up on a later check instead.
+    """
+
+    def __init__(self, parsed_file: str = PARSED_FILE, stats_file: str = STATS_FILE,
+                 cache: Optional[ResponseCache] = None):
+        self.parsed_file = parsed_file
+        self.stats_file = stats_file
+        self.cache = cache
+        self.paths = [parsed_file, stats_file, rollup_path(stats_file, "monthly"), rollup_path(stats_file, "yearly")]
+        self.lock = threading.Lock()
+        self.checked = time.monotonic()
+        self.snapshot = Snapshot(parsed_file, stats_file, files_version(self.paths))
+
+    def current(self) -> Snapshot:
+        if time.monotonic() - self.checked >= RELOAD_CHECK_SECONDS and self.lock.acquire(blocking=False):
+            try:
+                self.checked = time.monotonic()
+                self._reload()
+            finally:
+                self.lock.release()
+        return self.snapshot
+
+    def _reload(self):
+        version = files_version(self.paths)
+        if version == self.snapshot.version:
+            return
+        try:
+            snapshot = Snapshot(self.parsed_file, self.stats_file, version)
+        except (OSError, ValueError, json.JSONDecodeError) as e:
+            print(f"Could not reload: {e}")
+            return
+        if files_version(self.paths) != version:
+            return
+        # Readers still holding the old snapshot finish with it
+        self.snapshot = snapshot
+        if self.cache is not None:
+            self.cache.clear()
+        print(f"Reloaded {self.parsed_file}: {len(snapshot.diary):,} entries.")
+
+class QueryError(Exception):
+    """A request the server cannot answer, with its HTTP status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def as_dict(entry) -> Dict:
+    return entry.to_dict() if isinstance(entry, LazyEntry) else entry
+
+def check_date(value: Optional[str]) -> Optional[str]:
+    if value is not None:
+        try:
+            date_key(value)
+        except ValueError:
+            raise QueryError(400, f"not a YYYY-MM-DD date: {value}")
+    return value
+
+def answer(snapshot: Snapshot, path: str, params: Dict[str, str]) -> Dict:
+    """The JSON response for a request path and its query parameters."""
+    if path == "/entries":
+        if "date" in params:
+            date = check_date(params["date"])
+            return {"date": date, "entries": [as_dict(entry) for entry in snapshot.diary.get(date)]}
+        start, end = check_date(params.get("start")), check_date(params.get("end"))
+        try:
+            limit = min(int(params.get("limit", MAX_RANGE_ENTRIES)), MAX_RANGE_ENTRIES)
+        except ValueError:
+            raise QueryError(400, "limit must be a number")
+        if limit < 0:
+            raise QueryError(400, "limit must not be negative")
+        entries = [as_dict(entry) for entry in islice(snapshot.diary.range(start, end), limit + 1)]
+        return {"start": start, "end": end, "truncated": len(entries) > limit, "entries": entries[:limit]}
+
+    if path in ("/stats/monthly", "/stats/yearly"):
+        period = path.rsplit("/", 1)[1]
+        if period not in snapshot.rollups:
+            raise QueryError(404, f"no {period} stats yet, run generate_stats.py")
+        rows = snapshot.rollups[period]
+        periods = [str(row["period"]) for row in rows]
+        lo = bisect.bisect_left(periods, params["start"]) if "start" in params else 0
+        hi = bisect.bisect_right(periods, params["end"]) if "end" in params else len(rows)
+        return {"periods": rows[lo:hi]}
+
+    if path == "/keywords":
+        if snapshot.keywords is None:
+            raise QueryError(404, "no stats yet, run generate_stats.py")
+        start, end = check_date(params.get("start")), check_date(params.get("end"))
+        return dict(start=start, end=end, **snapshot.keywords.count(start, end))
+
+    raise QueryError(404, f"unknown path {path}")
+
+class DiaryHandler(BaseHTTPRequestHandler):
+    """
+    GET /entries?date=D, /entries?start=D&end=D[&limit=N], /stats/monthly,
+    /stats/yearly (both with optional start and end periods) and
+    /keywords[?start=D&end=D], all as JSON.
+
+    The ETag is the version of the output files, so a client's cached copy
+    is answered with 304 without looking at the request any further.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; don't let the body wait for an ACK
+    disable_nagle_algorithm = True
+    quiet = True
+
+    def do_GET(self):
+        data = self.server.data
+        cache = self.server.cache
+        snapshot = data.current()
+        etag = f'"{snapshot.version}"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        key = f"{snapshot.version} {self.path}"
+        body = cache.get(key)
+        status = 200
+        if body is None:
+            url = urlsplit(self.path)
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                body = json.dumps(answer(snapshot, url.path, params)).encode('utf-8')
+                cache.put(key, body)
+            except QueryError as e:
+                status = e.status
+                body = json.dumps({"error": str(e)}).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 200:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+def make_server(host: str, port: int, parsed_file: str = PARSED_FILE, stats_file: str = STATS_FILE,
+                cache_bytes: int = DEFAULT_CACHE_BYTES) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), DiaryHandler)
+    server.daemon_threads = True
+    server.cache = ResponseCache(cache_bytes)
+    server.data = DiaryData(parsed_file, stats_file, server.cache)
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve parsed entries, monthly stats and keyword counts as JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help="maximum size of cached responses in MB (default: %(default)s)")
+    parser.add_argument("--log", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    DiaryHandler.quiet = not args.log
+    server = make_server(args.host, args.port, cache_bytes=args.cache_size * 1024 * 1024)
+    print(f"Serving {len(server.data.snapshot.diary):,} entries on http://{args.host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n" + server.cache.report())
+    finally:
+        server.server_close()
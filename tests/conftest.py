@@ -0,0 +1,12 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(autouse=True)
+def in_repo(monkeypatch):
+    """Run each test from the repository root, where the scripts' default data paths point."""
+    monkeypatch.chdir(ROOT)
@@ -0,0 +1,35 @@
+import json
+import os
+
+from batch_volumes import run_batch, volume_paths
+
+SAMPLE_FILE = "data/diary-sample.txt"
+
+def write_manifest(tmp_path, volumes) -> str:
+    manifest = str(tmp_path / "volumes.json")
+    with open(manifest, 'w', encoding='utf-8') as f:
+        json.dump({"output": str(tmp_path / "corpus"), "volumes": volumes}, f)
+    return manifest
+
+def test_missing_volumes_merge_nothing(tmp_path, capsys):
+    manifest = write_manifest(tmp_path, [{"name": "gone", "source": str(tmp_path / "missing.txt"),
+                                          "output": str(tmp_path / "gone")}])
+    run_batch(manifest, workers=1)
+    assert "No volumes to process." in capsys.readouterr().out
+    assert not os.path.exists(volume_paths(str(tmp_path / "corpus"))["parsed"])
+
+def test_empty_volume_is_left_out(tmp_path):
+    volumes = [{"name": "full", "source": "-", "output": str(tmp_path / "full")},
+               {"name": "empty", "source": "-", "output": str(tmp_path / "empty")}]
+    with open(SAMPLE_FILE, 'r', encoding='utf-8') as f:
+        sample = f.read()
+    for volume, text in zip(volumes, [sample, "No entries here.\n"]):
+        with open(volume_paths(volume["output"])["trimmed"], 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    run_batch(write_manifest(tmp_path, volumes), workers=1, fetch=False)
+    corpus = volume_paths(str(tmp_path / "corpus"))
+    full = volume_paths(volumes[0]["output"])
+    with open(corpus["stats"], 'rb') as merged, open(full["stats"], 'rb') as single:
+        assert len(merged.readlines()) == len(single.readlines())
+    assert os.path.getsize(corpus["parsed"]) == os.path.getsize(full["parsed"])
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from check_dates import check_dates, check_file
+from parse_diary import process_diary
+
+# Out of order, a duplicate, a day that does not exist and a gap
+DIARY = """\
+JANUARY 1659-1660
+
+2nd. The first entry.
+
+1st. Before it.
+
+1st. The same day again.
+
+FEBRUARY 1659-1660
+
+30th. No such day.
+
+MAY 1660
+
+1st. Months later.
+"""
+
+ROWS = [
+    '{"date": "1660-01-02", "entry": "a"}',
+    '{"date": "1660-01-01", "entry": "b"}',
+    'not json',
+    '{"date": "0000-01-05", "entry": "c"}',
+    '{"entry": "d"}',
+    '{"date": "1660-01-01", "entry": "e"}',
+    '{"date": "1660-05-01", "entry": "f"}',
+    '{"date": "1660-xx-01", "entry": "g"}',
+    '{"date": "1660-02-30", "entry": "h"}',
+]
+
+def read_issues(path: str) -> list:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+@pytest.fixture
+def rows_file(tmp_path):
+    path = tmp_path / "rows.ndjson"
+    path.write_text("\n".join(ROWS) + "\n", encoding='utf-8')
+    return str(path)
+
+def test_issues_are_written_as_ndjson(tmp_path, rows_file):
+    issues_path = str(tmp_path / "issues.ndjson")
+    checker = check_file(rows_file, issues_path=issues_path)
+
+    issues = read_issues(issues_path)
+    assert [(issue["line"], issue["type"]) for issue in issues] == [
+        (2, "out_of_order"), (3, "invalid_json"), (4, "impossible_date"), (5, "missing_date"),
+        (6, "duplicate"), (7, "gap"), (8, "invalid_date"), (9, "impossible_date")]
+    assert all(issue["file"] == rows_file for issue in issues)
+    assert issues[0]["diff_days"] == 1 and issues[5]["gap_days"] == 121
+    assert checker.counts["impossible_date"] == 2
+
+def test_report_prints_issues_in_line_order(rows_file, capsys):
+    check_dates(rows_file)
+    out = capsys.readouterr().out
+    lines = [int(line.split()[1].rstrip(':')) for line in out.splitlines() if line.startswith("Line ")]
+    assert lines == [2, 3, 4, 5, 6, 7, 8, 9]
+    assert "No such day: 0000-01-05" in out
+    # Counts follow the issues
+    assert out.index("Found 2 entries dated a day that does not exist.") > out.index("Line 9")
+
+def test_no_issues(tmp_path, capsys):
+    path = tmp_path / "rows.ndjson"
+    path.write_text('{"date": "1660-01-01", "entry": "a"}\n{"date": "1660-01-02", "entry": "b"}\n', encoding='utf-8')
+    check_dates(str(path))
+    assert "All entries are in chronological order." in capsys.readouterr().out
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_check_matches_check_dates(tmp_path, workers):
+    diary, output = tmp_path / "diary.txt", str(tmp_path / "parsed.ndjson")
+    diary.write_text(DIARY, encoding='utf-8')
+    hook_issues, file_issues = str(tmp_path / "hook.ndjson"), str(tmp_path / "file.ndjson")
+    process_diary(str(diary), output, workers=workers, check=True, issues_path=hook_issues)
+    check_file(output, issues_path=file_issues)
+
+    issues = read_issues(hook_issues)
+    assert [issue["type"] for issue in issues] == ["out_of_order", "duplicate", "impossible_date", "gap"]
+    assert issues == read_issues(file_issues)
@@ -0,0 +1,62 @@
+import gzip
+
+import pytest
+
+from check_dates import check_file
+from compression import open_file
+from generate_stats import generate_stats, rollup_path
+from parse_diary import process_diary
+
+SAMPLE_FILE = "data/diary-sample.txt"
+
+def read_bytes(path: str) -> bytes:
+    with open_file(path, 'rb') as f:
+        return f.read()
+
+def run_stages(workdir, suffix: str) -> dict:
+    """Parse, check and stats on the sample, every file named with suffix; returns the paths."""
+    paths = {name: str(workdir / (name + suffix))
+             for name in ("diary.txt", "parsed.ndjson", "issues.ndjson", "stats.csv")}
+    with open(SAMPLE_FILE, 'rb') as src, open_file(paths["diary.txt"], 'wb') as dst:
+        dst.write(src.read())
+    process_diary(paths["diary.txt"], paths["parsed.ndjson"])
+    check_file(paths["parsed.ndjson"], issues_path=paths["issues.ndjson"])
+    generate_stats(paths["parsed.ndjson"], paths["stats.csv"])
+    return paths
+
+def test_gzip_pipeline_matches_plain(tmp_path):
+    (tmp_path / "plain").mkdir()
+    (tmp_path / "gz").mkdir()
+    plain = run_stages(tmp_path / "plain", "")
+    compressed = run_stages(tmp_path / "gz", ".gz")
+
+    for name in ("parsed.ndjson", "issues.ndjson", "stats.csv"):
+        with open(compressed[name], 'rb') as f:
+            assert f.read(2) == b"\x1f\x8b", name
+        assert read_bytes(compressed[name]) == read_bytes(plain[name]), name
+    for period in ("monthly", "yearly"):
+        assert read_bytes(rollup_path(compressed["stats.csv"], period)) == \
+               read_bytes(rollup_path(plain["stats.csv"], period))
+
+def test_multi_member_gzip_reads_as_one(tmp_path):
+    with open(SAMPLE_FILE, 'rb') as f:
+        data = f.read()
+    cut = data.index(b"\n", len(data) // 2) + 1
+    diary = tmp_path / "diary.txt.gz"
+    # Two gzip files concatenated, as `cat a.gz b.gz` makes
+    diary.write_bytes(gzip.compress(data[:cut]) + gzip.compress(data[cut:]))
+
+    expected, output = str(tmp_path / "expected.ndjson"), str(tmp_path / "parsed.ndjson")
+    process_diary(SAMPLE_FILE, expected)
+    process_diary(str(diary), output)
+    assert read_bytes(output) == read_bytes(expected)
+
+@pytest.mark.parametrize("mode", ["t", "b"])
+def test_append_adds_a_member(tmp_path, mode):
+    path = str(tmp_path / "log.txt.gz")
+    first, second = ("one\n", "two\n") if mode == "t" else (b"one\n", b"two\n")
+    with open_file(path, 'w' + mode) as f:
+        f.write(first)
+    with open_file(path, 'a' + mode) as f:
+        f.write(second)
+    assert read_bytes(path) == b"one\ntwo\n"
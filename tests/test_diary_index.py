@@ -0,0 +1,86 @@
+import json
+import os
+
+import pytest
+
+from diary_index import ParsedDiary, build_index, index_path_for, read_index
+from parse_diary import process_diary
+
+SAMPLE_FILE = "data/diary-sample.txt"
+
+# In file order: one entry out of place and two on the same day
+ROWS = [
+    {"date": "1660-01-01", "entry": "New year.", "footnotes": []},
+    {"date": "1660-01-03", "entry": "Out of place.", "footnotes": ["A note."]},
+    {"date": "1660-01-02", "entry": "Morning.", "footnotes": []},
+    {"date": "1660-01-02", "entry": "Evening.", "footnotes": []},
+    {"date": "1660-02-01", "entry": "February.", "footnotes": []},
+]
+
+def write_rows(path: str, rows: list):
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        for row in rows:
+            f.write(json.dumps(row) + '\n')
+
+@pytest.fixture
+def ndjson(tmp_path):
+    path = str(tmp_path / "parsed.ndjson")
+    write_rows(path, ROWS)
+    return path
+
+def test_get_by_date(ndjson):
+    with ParsedDiary(ndjson) as diary:
+        assert len(diary) == len(ROWS)
+        assert diary.get("1660-01-01") == [ROWS[0]]
+        assert diary.get("1660-01-03")[0]["footnotes"] == ["A note."]
+        assert diary.get("1660-01-05") == []
+
+def test_entries_on_one_day_keep_file_order(ndjson):
+    with ParsedDiary(ndjson) as diary:
+        assert [entry["entry"] for entry in diary.get("1660-01-02")] == ["Morning.", "Evening."]
+
+def test_range_is_inclusive_and_in_date_order(ndjson):
+    with ParsedDiary(ndjson) as diary:
+        assert [entry["entry"] for entry in diary.range("1660-01-02", "1660-01-03")] == \
+               ["Morning.", "Evening.", "Out of place."]
+        assert [entry["date"] for entry in diary.range(end="1660-01-02")] == \
+               ["1660-01-01", "1660-01-02", "1660-01-02"]
+        assert [entry["date"] for entry in diary.range(start="1660-01-04")] == ["1660-02-01"]
+        assert len(list(diary.range())) == len(ROWS)
+
+def test_in_memory_reads_the_same(ndjson):
+    with ParsedDiary(ndjson) as mapped, ParsedDiary(ndjson, in_memory=True) as loaded:
+        assert list(mapped.range()) == list(loaded.range())
+
+def test_stale_index_is_rebuilt(ndjson):
+    with ParsedDiary(ndjson):
+        pass
+    assert read_index(ndjson) is not None
+
+    write_rows(ndjson, ROWS + [{"date": "1660-01-02", "entry": "Night.", "footnotes": []}])
+    assert read_index(ndjson) is None
+    with ParsedDiary(ndjson) as diary:
+        assert [entry["entry"] for entry in diary.get("1660-01-02")] == ["Morning.", "Evening.", "Night."]
+    assert read_index(ndjson) is not None
+
+def test_corrupt_index_is_rebuilt(ndjson):
+    with open(index_path_for(ndjson), 'wb') as f:
+        f.write(b"not an index")
+    with ParsedDiary(ndjson) as diary:
+        assert len(diary) == len(ROWS)
+
+def test_parser_index_matches_built_index(tmp_path):
+    output = str(tmp_path / "parsed.ndjson")
+    process_diary(SAMPLE_FILE, output)
+    written = read_index(output)
+    os.remove(index_path_for(output))
+    build_index(output)
+    assert read_index(output) == written
+
+def test_split_footnotes_are_read_back(tmp_path):
+    inline, split = str(tmp_path / "inline.ndjson"), str(tmp_path / "split.ndjson")
+    process_diary(SAMPLE_FILE, inline)
+    process_diary(SAMPLE_FILE, split, split_footnotes=True)
+    with ParsedDiary(inline) as expected, ParsedDiary(split) as diary:
+        assert [entry["footnotes"] for entry in diary.range("1660-01-01", "1660-01-31")] == \
+               [entry["footnotes"] for entry in expected.range("1660-01-01", "1660-01-31")]
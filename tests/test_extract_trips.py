@@ -0,0 +1,141 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import extract_trips
+from extract_trips import RateLimiter, StubBackend, TripCache, extract_all
+from parse_diary import process_diary
+
+SAMPLE_FILE = "data/diary-sample.txt"
+
+ENTRIES = [{"date": f"1660-01-{day:02d}", "entry": f"Entry {day}, by water to Westminster Hall."}
+           for day in range(1, 21)]
+
+class FlakyBackend:
+    """Fails the first `failures` calls, then answers every entry with one trip."""
+
+    name = "flaky"
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = 0
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def extract(self, entries):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if self.calls <= self.failures:
+                raise ConnectionError("service unavailable")
+            self.sent.extend(entry["date"] for entry in entries)
+            return [[{"from": None, "to": entry["date"], "mode": None}] for entry in entries]
+        finally:
+            self.in_flight -= 1
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Skip retry delays, recording them instead."""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+    monkeypatch.setattr(extract_trips.asyncio, "sleep", sleep)
+    return delays
+
+def run(entries, backend, cache_path, **options):
+    cache = TripCache(cache_path)
+    try:
+        return asyncio.run(extract_all(entries, backend, cache, rate=0, **options))
+    finally:
+        cache.close()
+
+def test_second_run_sends_nothing(tmp_path):
+    cache_path = str(tmp_path / "trips-cache.ndjson")
+    backend = FlakyBackend()
+    results, counts = run(ENTRIES, backend, cache_path, batch_size=3)
+    assert counts == {"cached": 0, "sent": 20, "batches": 7, "retries": 0}
+    assert [trips[0]["to"] for trips in results] == [entry["date"] for entry in ENTRIES]
+
+    again = FlakyBackend()
+    cached_results, counts = run(ENTRIES, again, cache_path, batch_size=3)
+    assert counts == {"cached": 20, "sent": 0, "batches": 0, "retries": 0}
+    assert again.calls == 0
+    assert cached_results == results
+
+def test_only_changed_entries_are_sent(tmp_path):
+    cache_path = str(tmp_path / "trips-cache.ndjson")
+    run(ENTRIES, FlakyBackend(), cache_path)
+    edited = [dict(entry) for entry in ENTRIES]
+    edited[4]["entry"] += " And so to bed."
+
+    backend = FlakyBackend()
+    _, counts = run(edited, backend, cache_path)
+    assert counts["sent"] == 1 and counts["cached"] == 19
+    assert backend.sent == ["1660-01-05"]
+    # Only the results used by the last run are kept
+    with open(cache_path, 'r', encoding='utf-8') as f:
+        assert sum(1 for _ in f) == 20
+
+def test_failed_batches_are_retried_with_backoff(tmp_path, no_backoff, capsys):
+    backend = FlakyBackend(failures=2)
+    results, counts = run(ENTRIES, backend, str(tmp_path / "cache.ndjson"), batch_size=20, concurrency=1)
+    assert counts["retries"] == 2 and counts["batches"] == 1
+    assert all(results)
+    backoff = [delay for delay in no_backoff if delay > 0.01]
+    # Exponential, with jitter between half and all of 2, then 4 seconds
+    assert len(backoff) == 2 and 1 <= backoff[0] <= 2 and 2 <= backoff[1] <= 4
+    assert capsys.readouterr().out.count("retrying") == 2
+
+def test_gives_up_after_max_attempts(tmp_path, no_backoff):
+    backend = FlakyBackend(failures=100)
+    with pytest.raises(ConnectionError):
+        run(ENTRIES, backend, str(tmp_path / "cache.ndjson"), batch_size=20, concurrency=1, max_attempts=3)
+    assert backend.calls == 3
+
+def test_workers_are_bounded(tmp_path):
+    backend = FlakyBackend()
+    _, counts = run(ENTRIES, backend, str(tmp_path / "cache.ndjson"), batch_size=1, concurrency=4)
+    assert counts["batches"] == 20
+    assert backend.max_in_flight == 4
+
+def test_rate_limiter_spaces_calls():
+    async def calls():
+        limiter = RateLimiter(50)
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.wait() for _ in range(6)))
+        return time.monotonic() - start
+    # Five intervals of 20 ms after the first call
+    assert asyncio.run(calls()) >= 0.09
+
+def test_cache_skips_a_line_cut_short(tmp_path):
+    cache_path = str(tmp_path / "cache.ndjson")
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        f.write('{"key": "a", "trips": []}\n{"key": "b", "tri')
+    cache = TripCache(cache_path)
+    assert cache.get("a") == [] and cache.get("b") is None
+    cache.close()
+
+def test_stub_backend_end_to_end(tmp_path, capsys):
+    parsed, output = str(tmp_path / "parsed.ndjson"), str(tmp_path / "trips.ndjson")
+    cache_path = str(tmp_path / "trips-cache.ndjson")
+    process_diary(SAMPLE_FILE, parsed)
+
+    extract_trips.extract_trips(parsed, output, StubBackend(), rate=0, cache_file=cache_path)
+    with open(output, 'r', encoding='utf-8') as f:
+        first = [json.loads(line) for line in f]
+    assert len(first) == 93
+    assert any(row["trips"] for row in first)
+
+    capsys.readouterr()
+    extract_trips.extract_trips(parsed, output, StubBackend(), rate=0, cache_file=cache_path)
+    assert "93 entries cached, 0 sent in 0 batches" in capsys.readouterr().out
+    with open(output, 'r', encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == first
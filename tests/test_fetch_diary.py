@@ -0,0 +1,125 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from fetch_diary import END_MARKER, START_MARKER, fetch_and_clean, save_meta
+from profiling import Profiler
+
+@pytest.mark.parametrize("output_name", ["trimmed.txt", "trimmed.txt.gz"])
+def test_failed_download_leaves_no_temp_file(tmp_path, output_name):
+    source = tmp_path / "source.txt"
+    # Not UTF-8 after the start marker, so the download fails part way through trimming
+    source.write_bytes(f"{START_MARKER}\nSome text.\n".encode() + b"\xff\xfe broken\n" + END_MARKER.encode())
+    output = str(tmp_path / "data" / output_name)
+
+    with pytest.raises(SystemExit):
+        fetch_and_clean(Path(source).as_uri(), output, str(tmp_path / "data" / "raw.txt"))
+    assert not os.path.exists(output + ".tmp")
+    assert not os.path.exists(output)
+
+def test_trimmed_between_markers(tmp_path):
+    source = tmp_path / "source.txt"
+    source.write_text(f"Preamble.\n{START_MARKER}\nSome text.\n{END_MARKER}\nLicence.\n", encoding="utf-8")
+    output = str(tmp_path / "data" / "trimmed.txt")
+
+    fetch_and_clean(Path(source).as_uri(), output, str(tmp_path / "data" / "raw.txt"))
+    with open(output, 'r', encoding='utf-8') as f:
+        text = f.read()
+    assert "Some text." in text and "Preamble." not in text and "Licence." not in text
+    assert not os.path.exists(output + ".tmp")
+
+BODY = (f"Preamble.\n{START_MARKER}\n" + "A line of the diary.\n" * 2000 + f"{END_MARKER}\nLicence.\n").encode()
+ETAG = '"v1"'
+
+class DiaryHandler(BaseHTTPRequestHandler):
+    """Serves BODY with an ETag, honouring If-None-Match, and Range unless the server ignores it."""
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body, status = BODY, 200
+        byte_range = self.headers.get("Range")
+        if byte_range and self.server.honour_range and self.headers.get("If-Range") == ETAG:
+            start = int(byte_range[len("bytes="):].rstrip("-"))
+            body, status = BODY[start:], 206
+        self.send_response(status)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {len(BODY) - len(body)}-{len(BODY) - 1}/{len(BODY)}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), DiaryHandler)
+    httpd.requests = []
+    httpd.honour_range = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/pg4200.txt"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def expected_trimmed() -> str:
+    text = BODY.decode()
+    return text[text.index(START_MARKER):text.index(END_MARKER) + len(END_MARKER)]
+
+def read_text(path: str) -> str:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def start_partial_download(raw: str, url: str, partial: bytes):
+    os.makedirs(os.path.dirname(raw), exist_ok=True)
+    with open(raw + ".part", 'wb') as f:
+        f.write(partial)
+    save_meta(raw, {"url": url, "etag": ETAG, "last_modified": None, "complete": False})
+
+def test_unchanged_download_is_not_fetched_again(tmp_path, server, capsys):
+    output, raw = str(tmp_path / "data" / "trimmed.txt"), str(tmp_path / "data" / "raw.txt")
+    fetch_and_clean(server.url, output, raw)
+    profile = Profiler("fetch_diary")
+    fetch_and_clean(server.url, output, raw, profile)
+
+    assert server.requests[1]["If-None-Match"] == ETAG
+    assert "Not modified" in capsys.readouterr().out
+    assert profile.stages["download"]["source"] == "cache"
+    assert read_text(output) == expected_trimmed()
+
+def test_partial_download_is_resumed(tmp_path, server):
+    output, raw = str(tmp_path / "data" / "trimmed.txt"), str(tmp_path / "data" / "raw.txt")
+    start_partial_download(raw, server.url, BODY[:1000])
+    profile = Profiler("fetch_diary")
+    fetch_and_clean(server.url, output, raw, profile)
+
+    assert server.requests[0]["Range"] == "bytes=1000-"
+    assert server.requests[0]["If-Range"] == ETAG
+    assert profile.stages["download"]["source"] == "resumed"
+    with open(raw, 'rb') as f:
+        assert f.read() == BODY
+    assert read_text(output) == expected_trimmed()
+    assert not os.path.exists(raw + ".part")
+
+def test_ignored_range_restarts_download(tmp_path, server):
+    output, raw = str(tmp_path / "data" / "trimmed.txt"), str(tmp_path / "data" / "raw.txt")
+    # Not a prefix of BODY, so appending to it would show
+    start_partial_download(raw, server.url, b"x" * 1000)
+    server.honour_range = False
+    profile = Profiler("fetch_diary")
+    fetch_and_clean(server.url, output, raw, profile)
+
+    assert server.requests[0]["Range"] == "bytes=1000-"
+    assert profile.stages["download"]["source"] == "network"
+    with open(raw, 'rb') as f:
+        assert f.read() == BODY
+    assert read_text(output) == expected_trimmed()
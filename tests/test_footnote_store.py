@@ -0,0 +1,60 @@
+import json
+
+from footnote_store import FootnoteStore, footnotes_path_for
+from generate_stats import read_entries
+from parse_diary import checkpoint_path_for, process_diary
+
+SAMPLE_FILE = "data/diary-sample.txt"
+
+def read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_split_footnotes_load_only_when_used(tmp_path, monkeypatch):
+    inline, split = str(tmp_path / "inline.ndjson"), str(tmp_path / "split.ndjson")
+    process_diary(SAMPLE_FILE, inline)
+    process_diary(SAMPLE_FILE, split, split_footnotes=True)
+
+    loads = []
+    original = FootnoteStore._load
+    monkeypatch.setattr(FootnoteStore, "_load", lambda store: loads.append(store) or original(store))
+
+    entries = list(read_entries(split))
+    assert [(entry.date, entry.text) for entry in entries]
+    assert loads == []
+
+    expected = list(read_entries(inline))
+    assert [entry.footnotes for entry in entries] == [entry.footnotes for entry in expected]
+    assert entries == expected
+    assert len(loads) == 1
+
+def test_resume_with_foreign_table_parses_from_start(tmp_path, capsys):
+    data = read_bytes(SAMPLE_FILE)
+    diary, output = str(tmp_path / "diary.txt"), str(tmp_path / "out" / "parsed.ndjson")
+    # Right after a block footnote, so the row parsed again on resume cites it
+    with open(diary, 'wb') as f:
+        f.write(data[:data.index(b"]\r\n", len(data) // 2) + 3])
+    process_diary(diary, output, split_footnotes=True)
+
+    with open(checkpoint_path_for(output), 'r', encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    with open(output, 'rb') as f:
+        f.seek(checkpoint["output_offset"])
+        released = {key for line in f for key in json.loads(line)["footnote_ids"]}
+    assert released
+    # A table that does not go with the NDJSON
+    with open(footnotes_path_for(output), 'r', encoding='utf-8') as f:
+        records = [line for line in f if json.loads(line)["id"] not in released]
+    with open(footnotes_path_for(output), 'w', encoding='utf-8') as f:
+        f.writelines(records)
+
+    with open(diary, 'wb') as f:
+        f.write(data)
+    capsys.readouterr()
+    process_diary(diary, output, split_footnotes=True, resume=True)
+    assert "No usable checkpoint" in capsys.readouterr().out
+
+    expected = str(tmp_path / "expected.ndjson")
+    process_diary(diary, expected, split_footnotes=True)
+    assert read_bytes(output) == read_bytes(expected)
+    assert read_bytes(footnotes_path_for(output)) == read_bytes(footnotes_path_for(expected))
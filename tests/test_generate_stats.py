@@ -0,0 +1,105 @@
+import csv
+import random
+
+import pytest
+
+from compression import open_file
+from generate_stats import (KEYWORDS, KeywordMatcher, count_occurrences, generate_stats, read_entries,
+                            rollup_path, update_rollup)
+from make_corpus import write_corpus
+from parse_diary import iter_entries, process_diary
+
+SAMPLE_FILE = "data/diary-sample.txt"
+
+# Words that trip up a tokeniser: case, apostrophes, words inside words, digits and
+# underscores, and non-ASCII letters that match ASCII ones case-insensitively
+# (the Kelvin sign and long s) or that str.lower() treats differently
+TRICKY_WORDS = ["lord", "Lord", "LORD", "lord's", "landlord", "lords", "my", "My", "my lord", "wife", "WIFE",
+                "wife_", "wife2", "wives", "\u212aing", "king", "\u017fupper", "supper", "café", "CAFÉ", "Café",
+                "naïve", "straße", "STRASSE", "İstanbul", "istanbul", "fire-office", "bed.", "(bed)"]
+
+KEYWORD_CASES = [
+    ["wife", "lord", "king"],
+    ["my lord", "lord", "my"],
+    ["wife", "wife", "Wife"],
+    ["café", "naïve", "straße", "istanbul"],
+    ["supper", "king", "bed", "office", "fire"],
+    ["fire-office", "lord's", "wife_", "wife2"],
+]
+
+def assert_counts_match(keywords, text):
+    counts = KeywordMatcher(keywords).count(text)
+    for keyword in keywords:
+        assert counts[keyword] == count_occurrences(text, keyword), (keyword, text)
+
+@pytest.mark.parametrize("keywords", KEYWORD_CASES)
+def test_keyword_matcher_matches_count_occurrences(keywords):
+    assert_counts_match(keywords, " ".join(TRICKY_WORDS))
+
+def test_keyword_matcher_matches_count_occurrences_on_random_text():
+    rng = random.Random(0)
+    for _ in range(500):
+        keywords = rng.choices(TRICKY_WORDS, k=rng.randint(1, 6))
+        text = rng.choice([" ", ", ", "\n", ""]).join(rng.choices(TRICKY_WORDS, k=rng.randint(0, 30)))
+        assert_counts_match(keywords, text)
+
+def test_keyword_matcher_on_sample_entries():
+    with open(SAMPLE_FILE, 'r', encoding='utf-8') as f:
+        texts = [entry.text for entry in iter_entries(f)]
+    keywords = KEYWORDS + ["my lord", "Mr. Pepys"]
+    for text in texts:
+        assert_counts_match(keywords, text)
+
+def read_csv(path: str) -> list:
+    with open_file(path, 'r', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def expected_rollups(rows: list, period_length: int) -> dict:
+    """Monthly (7) or yearly (4) totals of per-entry stats rows, recounted from scratch."""
+    rollups = {}
+    for row in rows:
+        period = row["date"][:period_length]
+        totals = rollups.setdefault(period, {"entry_count": 0, "longest_entry_word_count": -1})
+        totals["entry_count"] += 1
+        for field, value in row.items():
+            if field != "date":
+                totals[field] = totals.get(field, 0) + int(value)
+        # The first of equally long entries is the longest
+        if int(row["entry_word_count"]) > totals["longest_entry_word_count"]:
+            totals["longest_entry_word_count"] = int(row["entry_word_count"])
+            totals["longest_entry_date"] = row["date"]
+    return rollups
+
+@pytest.mark.parametrize("output_name", ["stats.csv", "stats.csv.gz"])
+def test_rollups_match_summed_entry_rows(tmp_path, output_name):
+    parsed, output = str(tmp_path / "parsed.ndjson"), str(tmp_path / "out" / output_name)
+    write_corpus(str(tmp_path / "diary.txt"), 1)
+    process_diary(str(tmp_path / "diary.txt"), parsed)
+    generate_stats(parsed, output)
+
+    rows = read_csv(output)
+    assert len(rows) > 200
+    for name, period_length in (("monthly", 7), ("yearly", 4)):
+        rollups = read_csv(rollup_path(output, name))
+        expected = expected_rollups(rows, period_length)
+        assert [rollup["period"] for rollup in rollups] == sorted(expected)
+        for rollup in rollups:
+            totals = expected[rollup["period"]]
+            assert rollup["longest_entry_date"] == totals["longest_entry_date"]
+            for field, value in totals.items():
+                if field != "longest_entry_date":
+                    assert int(rollup[field]) == value, (rollup["period"], field)
+
+def test_longest_entry_tie_keeps_first():
+    rollups = {}
+    for date, words in [("1660-01-01", 5), ("1660-01-02", 9), ("1660-01-03", 9), ("1660-01-04", 3)]:
+        update_rollup(rollups, date[:7], {"date": date, "entry_word_count": words})
+    assert rollups["1660-01"]["longest_entry_date"] == "1660-01-02"
+    assert rollups["1660-01"]["longest_entry_word_count"] == 9
+    assert rollups["1660-01"]["entry_count"] == 4
+    assert rollups["1660-01"]["entry_word_count"] == 26
+
+def test_rollup_path():
+    assert rollup_path("data/diary-stats.csv", "monthly") == "data/diary-stats-monthly.csv"
+    assert rollup_path("data/diary-stats.csv.gz", "yearly") == "data/diary-stats-yearly.csv.gz"
+    assert rollup_path("stats", "7d") == "stats-7d"
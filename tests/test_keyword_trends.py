@@ -0,0 +1,67 @@
+import csv
+import json
+import random
+
+import pytest
+
+from diary_entry import Entry
+from generate_stats import generate_stats
+from keyword_trends import compute_trends, keyword_trends, pair_name, read_stats
+from parse_diary import process_diary
+
+SAMPLE_FILE = "data/diary-sample.txt"
+KEYWORDS = ["wife", "lord", "king", "plague"]
+
+def brute_force(keywords, rows, width, day):
+    """The window of width days ending on day, recounted from every row."""
+    inside = [row for row in rows if day - width < row[0] <= day]
+    result = {"entries": len(inside), "words": sum(words for _, words, _ in inside)}
+    for k, keyword in enumerate(keywords):
+        result[f"mentions_{keyword}"] = sum(counts[k] for _, _, counts in inside)
+    for i in range(len(keywords)):
+        for j in range(i + 1, len(keywords)):
+            result[pair_name(keywords[i], keywords[j])] = sum(1 for _, _, counts in inside
+                                                              if counts[i] and counts[j])
+    return result
+
+def random_rows(seed: int) -> list:
+    """A few months of entries: some days without one, some with several, most keywords absent."""
+    rng = random.Random(seed)
+    start = Entry("1665-06-01", "").ordinal
+    rows = []
+    for day in range(start, start + 120):
+        for _ in range(rng.choice([0, 1, 1, 1, 2, 3])):
+            counts = tuple(rng.choice([0, 0, 0, 1, 2]) for _ in KEYWORDS)
+            rows.append((day, rng.randint(0, 500), counts))
+    return rows
+
+@pytest.mark.parametrize("seed", range(5))
+def test_windows_match_brute_force(seed):
+    rows = random_rows(seed)
+    trends = compute_trends(KEYWORDS, rows, [1, 7, 30, 365])
+    for width, columns in trends.items():
+        header = columns.header()
+        assert len(columns) == rows[-1][0] - rows[0][0] + 1
+        series = [columns.entries, columns.words] + columns.mentions + columns.cooccurrence
+        for i in range(len(columns)):
+            expected = brute_force(KEYWORDS, rows, width, columns.dates[i])
+            assert dict(zip(header[1:], (column[i] for column in series))) == expected, (width, columns.date(i))
+
+def test_trends_of_the_sample(tmp_path):
+    parsed, stats = str(tmp_path / "parsed.ndjson"), str(tmp_path / "stats.csv")
+    process_diary(SAMPLE_FILE, parsed)
+    generate_stats(parsed, stats)
+    keywords, rows = read_stats(stats)
+    assert [row[0] for row in rows] == sorted(row[0] for row in rows)
+
+    output, json_file = str(tmp_path / "trends.csv"), str(tmp_path / "trends.json")
+    keyword_trends(stats, output, [7, 30], json_file)
+    with open(json_file, 'r', encoding='utf-8') as f:
+        windows = json.load(f)["windows"]
+    for width in (7, 30):
+        with open(str(tmp_path / f"trends-{width}d.csv"), 'r', newline='', encoding='utf-8') as f:
+            table = list(csv.DictReader(f))
+        assert [row["date"] for row in table] == windows[str(width)]["dates"]
+        for row in table:
+            expected = brute_force(keywords, rows, width, Entry(row["date"], "").ordinal)
+            assert {field: int(value) for field, value in row.items() if field != "date"} == expected
@@ -0,0 +1,80 @@
+import os
+
+from parse_cache import SectionCache
+from parse_diary import process_diary
+
+SAMPLE_FILE = "data/diary-sample.txt"
+
+# A month header between the lead footnotes and the first entry
+LEAD_DIARY = """\
+     [A footnote before any header, long enough to be kept as a note.]
+
+JANUARY 1659-1660
+
+     [Another footnote before the first entry.]
+
+1st. The first entry [with a note far too long to be a restoration].
+
+2nd. The second entry.
+
+FEBRUARY 1659-1660
+
+1st. A February entry.
+"""
+
+def read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_cached_run_matches_serial(tmp_path, capsys):
+    diary = tmp_path / "diary.txt"
+    diary.write_text(LEAD_DIARY, encoding='utf-8')
+    serial, cached = str(tmp_path / "serial.ndjson"), str(tmp_path / "cached.ndjson")
+    process_diary(str(diary), serial)
+
+    capsys.readouterr()
+    process_diary(str(diary), cached, use_cache=True)
+    assert "Cache: 0 hits, 3 misses." in capsys.readouterr().out
+    assert read_bytes(cached) == read_bytes(serial)
+
+    process_diary(str(diary), cached, use_cache=True)
+    assert "Cache: 3 hits, 0 misses." in capsys.readouterr().out
+    assert read_bytes(cached) == read_bytes(serial)
+
+def test_edit_misses_only_its_section(tmp_path, capsys):
+    diary, output = str(tmp_path / "diary.txt"), str(tmp_path / "out" / "parsed.ndjson")
+    data = read_bytes(SAMPLE_FILE)
+    with open(diary, 'wb') as f:
+        f.write(data)
+    process_diary(diary, output, use_cache=True)
+
+    word = data.index(b" the ", len(data) // 2)
+    with open(diary, 'wb') as f:
+        f.write(data[:word] + b" THE " + data[word + 5:])
+    capsys.readouterr()
+    process_diary(diary, output, use_cache=True)
+    assert "hits, 1 misses." in capsys.readouterr().out
+
+    expected = str(tmp_path / "expected.ndjson")
+    process_diary(diary, expected)
+    assert read_bytes(output) == read_bytes(expected)
+
+def test_evict_drops_least_recently_used(tmp_path):
+    cache = SectionCache(str(tmp_path / "cache"))
+    for age, key in enumerate(["a", "b", "c"]):
+        cache.put(key, {"rows": [key * 100]})
+        os.utime(cache._path(key), (1000 + age, 1000 + age))
+    # A hit makes "a" the most recently used
+    assert cache.get("a") == {"rows": ["a" * 100]}
+
+    cache.max_bytes = 2 * os.path.getsize(cache._path("a"))
+    assert cache.evict() == 1
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+def test_get_misses_unknown_and_corrupt_keys(tmp_path):
+    cache = SectionCache(str(tmp_path / "cache"))
+    assert cache.get("missing") is None
+    with open(cache._path("corrupt"), 'w', encoding='utf-8') as f:
+        f.write("{not json")
+    assert cache.get("corrupt") is None
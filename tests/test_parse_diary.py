@@ -0,0 +1,166 @@
+import json
+import os
+import tracemalloc
+
+import pytest
+
+from make_corpus import write_corpus
+from parse_diary import checkpoint_path_for, iter_entries, process_diary
+from profiling import Profiler
+
+SAMPLE_FILE = "data/diary-sample.txt"
+# Output of the original parser for SAMPLE_FILE, before inline footnotes were extracted with INLINE_NOTE_RE
+GOLDEN_FILE = os.path.join(os.path.dirname(__file__), "golden", "diary-sample-parsed.ndjson")
+
+def read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+def write_bytes(path: str, data: bytes):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def test_resume_after_append(tmp_path, capsys):
+    source = str(tmp_path / "corpus.txt")
+    write_corpus(source, 2)
+    data = read_bytes(source)
+    expected = str(tmp_path / "expected.ndjson")
+    process_diary(source, expected)
+
+    diary, output = str(tmp_path / "diary.txt"), str(tmp_path / "out" / "parsed.ndjson")
+    cut = data.index(b"\n", len(data) // 2) + 1
+    write_bytes(diary, data[:cut])
+    process_diary(diary, output)
+    assert os.path.exists(checkpoint_path_for(output))
+    write_bytes(diary, data)
+    capsys.readouterr()
+    process_diary(diary, output, resume=True)
+
+    assert "Resumed at byte" in capsys.readouterr().out
+    assert read_bytes(output) == read_bytes(expected)
+
+def test_resume_after_edit_near_start(tmp_path, capsys):
+    diary, output = str(tmp_path / "diary.txt"), str(tmp_path / "out" / "parsed.ndjson")
+    write_corpus(diary, 2)
+    data = read_bytes(diary)
+    cut = data.index(b"\n", len(data) // 2) + 1
+    write_bytes(diary, data[:cut])
+    process_diary(diary, output)
+
+    # Same length, far more than a few KB before the resume point
+    word = data.index(b" the ", 2000)
+    assert word < cut // 4
+    edited = data[:word] + b" THE " + data[word + 5:]
+    write_bytes(diary, edited)
+    capsys.readouterr()
+    process_diary(diary, output, resume=True)
+    assert "No usable checkpoint" in capsys.readouterr().out
+
+    expected = str(tmp_path / "expected.ndjson")
+    process_diary(diary, expected)
+    assert read_bytes(output) == read_bytes(expected)
+    assert b" THE " in read_bytes(output)
+
+def test_resume_after_first_entry(tmp_path, capsys):
+    data = read_bytes(SAMPLE_FILE)
+    expected = str(tmp_path / "expected.ndjson")
+    process_diary(SAMPLE_FILE, expected)
+
+    # The checkpoint is at the first entry, whose footnotes come before it
+    diary, output = str(tmp_path / "diary.txt"), str(tmp_path / "out" / "parsed.ndjson")
+    write_bytes(diary, data[:data.index(b"\n2nd. In the morning") + 1])
+    process_diary(diary, output)
+    write_bytes(diary, data)
+    process_diary(diary, output, resume=True)
+
+    assert read_bytes(output) == read_bytes(expected)
+
+def test_resume_after_same_size_edit(tmp_path, capsys):
+    diary, output = str(tmp_path / "diary.txt"), str(tmp_path / "out" / "parsed.ndjson")
+    write_corpus(diary, 1)
+    process_diary(diary, output)
+
+    # Same length, in the last entry, which starts after the resume point
+    data = read_bytes(diary)
+    word = data.rindex(b" sent")
+    with open(checkpoint_path_for(output), 'r', encoding='utf-8') as f:
+        assert word > json.load(f)["offset"]
+    write_bytes(diary, data[:word] + b" SENT" + data[word + 5:])
+    capsys.readouterr()
+    process_diary(diary, output, resume=True)
+    assert "Resumed at byte" in capsys.readouterr().out
+
+    expected = str(tmp_path / "expected.ndjson")
+    process_diary(diary, expected)
+    assert read_bytes(output) == read_bytes(expected)
+    assert b" SENT" in read_bytes(output)
+
+    # Unchanged since, so nothing to do
+    capsys.readouterr()
+    process_diary(diary, output, resume=True)
+    assert "No new text" in capsys.readouterr().out
+
+def test_profile_counts_lines_while_parsing(tmp_path):
+    profile = Profiler("parse_diary")
+    process_diary(SAMPLE_FILE, str(tmp_path / "parsed.ndjson"), profile=profile)
+    with open(SAMPLE_FILE, 'rb') as f:
+        assert profile.stages["parse"]["lines"] == sum(1 for _ in f)
+
+def parse_peak_memory(path: str) -> int:
+    """Peak bytes allocated while streaming every entry of path."""
+    tracemalloc.start()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for _ in iter_entries(f):
+                pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def test_iter_entries_memory_is_bounded(tmp_path):
+    small, large = str(tmp_path / "small.txt"), str(tmp_path / "large.txt")
+    write_corpus(small, 1)
+    write_corpus(large, 20)
+
+    small_peak, large_peak = parse_peak_memory(small), parse_peak_memory(large)
+    # Twenty times the text, about the same peak: it depends on the largest entry, not the input
+    assert large_peak < small_peak * 1.5
+    assert large_peak < os.path.getsize(large) / 20
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sample_matches_golden_output(tmp_path, workers):
+    output = str(tmp_path / "parsed.ndjson")
+    process_diary(SAMPLE_FILE, output, workers=workers)
+    assert read_bytes(output) == read_bytes(GOLDEN_FILE)
+
+# Footnotes before the first entry, on both sides of a month header
+LEAD_DIARY = """\
+     [A footnote before any header, long enough to be kept as a note.]
+
+JANUARY 1659-1660
+
+     [A second footnote, after the header and before the first entry.]
+
+1st. The first entry, with an inline [note that is far too long to be a restoration] and more.
+
+2nd. The second entry.
+
+FEBRUARY 1659-1660
+
+1st. A February entry.
+
+     [Its footnote.]
+
+2nd. Another.
+"""
+
+def test_workers_keep_footnotes_before_first_entry(tmp_path):
+    diary = tmp_path / "diary.txt"
+    diary.write_text(LEAD_DIARY, encoding='utf-8')
+    serial, parallel = str(tmp_path / "serial.ndjson"), str(tmp_path / "parallel.ndjson")
+    process_diary(str(diary), serial)
+    process_diary(str(diary), parallel, workers=2)
+
+    assert read_bytes(parallel) == read_bytes(serial)
+    first = json.loads(read_bytes(serial).splitlines()[0])
+    assert len(first["footnotes"]) == 3
@@ -0,0 +1,25 @@
+import pytest
+
+from parse_diary import process_diary
+from serve_diary import QueryError, Snapshot, answer
+
+SAMPLE_FILE = "data/diary-sample.txt"
+
+@pytest.fixture
+def snapshot(tmp_path):
+    parsed = str(tmp_path / "parsed.ndjson")
+    process_diary(SAMPLE_FILE, parsed)
+    snapshot = Snapshot(parsed, str(tmp_path / "stats.csv"), "test")
+    yield snapshot
+    snapshot.diary.close()
+
+def test_entries_limit(snapshot):
+    assert len(answer(snapshot, "/entries", {"limit": "3"})["entries"]) == 3
+    response = answer(snapshot, "/entries", {"limit": "0"})
+    assert response["entries"] == [] and response["truncated"]
+
+@pytest.mark.parametrize("limit", ["-5", "-1", "ten"])
+def test_entries_bad_limit(snapshot, limit):
+    with pytest.raises(QueryError) as error:
+        answer(snapshot, "/entries", {"limit": limit})
+    assert error.value.status == 400
@@ -0,0 +1,107 @@
+import json
+import shutil
+
+import pytest
+
+from text_index import TextIndex, build_text_index, tokenize
+
+GOLDEN_FILE = "tests/golden/diary-sample-parsed.ndjson"
+
+PHRASES = ["my lord", "the king", "my wife", "to bed", "and so to bed", "the duke of york", "sir w",
+           "of the", "lord", "and", "pepys", "no such words here"]
+NEAR = [("wife", "office", 10), ("lord", "king", 5), ("the", "and", 1), ("king", "king", 0)]
+
+def read_rows(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def spans(row, field=None):
+    if field != "footnotes":
+        yield tokenize(row['entry'])
+    if field != "entry":
+        for footnote in row['footnotes']:
+            yield tokenize(footnote)
+
+def scan_phrase(rows, words, field=None):
+    n = len(words)
+    return [i for i, row in enumerate(rows)
+            if any(tokens[j:j + n] == words for tokens in spans(row, field) for j in range(len(tokens)))]
+
+def scan_near(rows, first, second, window):
+    found = []
+    for i, row in enumerate(rows):
+        for tokens in spans(row):
+            a = [j for j, token in enumerate(tokens) if token == first]
+            b = [j for j, token in enumerate(tokens) if token == second]
+            if any(abs(p - q) <= window for p in a for q in b):
+                found.append(i)
+                break
+    return found
+
+@pytest.fixture
+def parsed(tmp_path):
+    path = str(tmp_path / "parsed.ndjson")
+    shutil.copy(GOLDEN_FILE, path)
+    return path
+
+def check_queries(parsed: str, index_dir: str):
+    rows = read_rows(parsed)
+    with TextIndex(index_dir) as index:
+        for text in PHRASES:
+            for field in (None, "entry", "footnotes"):
+                assert index.phrase(text, field=field) == scan_phrase(rows, tokenize(text), field), (text, field)
+        for first, second, window in NEAR:
+            assert index.near(first, second, window) == scan_near(rows, first, second, window)
+
+def test_queries_match_a_scan(parsed, tmp_path):
+    index_dir = str(tmp_path / "index")
+    build_text_index(parsed, index_dir)
+    check_queries(parsed, index_dir)
+
+    rows = read_rows(parsed)
+    with TextIndex(index_dir) as index:
+        assert index.term("King") == scan_phrase(rows, ["king"])
+        dates = [row['date'] for row in rows]
+        start, end = dates[10], dates[40]
+        expected = [i for i in scan_phrase(rows, ["my", "lord"]) if start <= dates[i] <= end]
+        assert index.phrase("my lord", start=start, end=end) == expected
+
+def test_incremental_rebuild(parsed, tmp_path):
+    index_dir = str(tmp_path / "index")
+    build_text_index(parsed, index_dir)
+
+    rows = read_rows(parsed)
+    rows[5]['entry'] += " And so to bed with the duke of york."
+    rows.append(dict(rows[0], date="1661-01-01", entry="My lord and the king went by water."))
+    with open(parsed, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row) + '\n')
+
+    counts = build_text_index(parsed, index_dir)
+    assert counts == {"reused": len(rows) - 2, "added": 2}
+    check_queries(parsed, index_dir)
+
+def test_query_words_are_tokenized_like_the_text(tmp_path):
+    parsed, index_dir = str(tmp_path / "parsed.ndjson"), str(tmp_path / "index")
+    with open(parsed, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({"date": "1660-01-01", "entry": "To the Café Royal, then news of İstanbul.",
+                            "footnotes": []}) + '\n')
+        f.write(json.dumps({"date": "1660-01-02", "entry": "My Lord's coach{0} came for me.",
+                            "footnotes": ["Sandwich's coach."]}) + '\n')
+    build_text_index(parsed, index_dir)
+
+    with TextIndex(index_dir) as index:
+        assert index.term("CAFÉ") == [0]
+        assert index.term("Royal,") == [0]
+        # Lowercases to a dotted i that tokenize splits off, as it did in the text
+        assert index.term("İstanbul") == [0]
+        assert index.term("Lord's") == [1]
+        assert index.term("coach") == [1]
+        assert index.near("Lord,", "COACH.", 2) == [1]
+        assert index.near("Sandwich", "coach.", 2, field="footnotes") == [1]
+        with pytest.raises(ValueError):
+            index.near("Lord's", "coach")
+
+def test_missing_index(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        TextIndex(str(tmp_path / "index"))
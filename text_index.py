@@ -0,0 +1,478 @@
+import argparse
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+from diary_index import date_key, row_date
+from footnote_store import LazyEntry, load_row, open_store
+
+INDEX_DIR = "data/diary-text-index"
+
+# Words of a footnote are indexed as FOOTNOTE_PREFIX + word, so a field
+# filter is a choice of terms rather than a check on every position
+FOOTNOTE_PREFIX = "#"
+# Positions left empty after the entry text, each footnote and each doc, so
+# proximity queries never join the entry text to a footnote, or two docs
+SPAN_GAP = 1000
+
+# Check a term's positions one by one, rather than all at once, when it has
+# this many times more positions than there are matches left to confirm
+LOOKUP_RATIO = 16
+
+# Term prefixes searched for each field filter
+FIELD_PREFIXES = {None: ["", FOOTNOTE_PREFIX], "entry": [""], "footnotes": [FOOTNOTE_PREFIX]}
+
+# Rebuild into a single segment once there are more segments than this,
+# or once more than half of the indexed documents are no longer live
+MAX_SEGMENTS = 8
+
+SEGMENT_MAGIC = b"PEPYSSEG"
+# magic, version, doc count, term count, terms blob length, doc postings length, positions length
+SEGMENT_HEADER = struct.Struct("<8sIIIQQQ")
+SEGMENT_VERSION = 2
+
+# doc table columns, one value per NDJSON row
+DOC_COLUMNS = [("keys", 'i'), ("offsets", 'q'), ("lengths", 'I'), ("segments", 'i'), ("locals", 'i')]
+
+TOKEN_RE = re.compile(r'\w+')
+MARKER_RE = re.compile(r'\{\d+\}')
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words of text, ignoring {N} footnote markers."""
+    return TOKEN_RE.findall(MARKER_RE.sub(' ', text).lower())
+
+def pair_term(first: str, second: str) -> str:
+    """Term for two consecutive words, indexed at the position of the first."""
+    return f"{first} {second}"
+
+def row_hash(row: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(row, digest_size=8).digest(), 'little')
+
+def align(f, boundary: int = 8):
+    pad = -f.tell() % boundary
+    if pad:
+        f.write(b"\0" * pad)
+
+def write_segment(path: str, docs: List[tuple[int, Dict]]):
+    """
+    Write a segment for (hash, entry) docs, numbered 0..n-1 in order.
+
+    Words are numbered across the whole segment, doc after doc, with
+    SPAN_GAP unused positions after each span of text. Every word and every
+    pair of consecutive words in a span is a term, with two uint32 runs in
+    shared arrays: the docs it occurs in and its positions, both ascending.
+    Pair terms let a phrase of common words be answered from one short run
+    instead of the long runs of each word.
+    """
+    postings = {}
+
+    def add(term: str, local: int, position: int):
+        run = postings.get(term)
+        if run is None:
+            run = postings[term] = (array('I'), array('I'))
+        term_docs, positions = run
+        if not term_docs or term_docs[-1] != local:
+            term_docs.append(local)
+        positions.append(position)
+
+    doc_starts = array('I')
+    position = 0
+    for local, (_, entry) in enumerate(docs):
+        doc_starts.append(position)
+        spans = [("", entry.get('entry', ''))] + [(FOOTNOTE_PREFIX, note) for note in entry.get('footnotes', [])]
+        for prefix, text in spans:
+            previous = None
+            for word in tokenize(text):
+                add(prefix + word, local, position)
+                if previous is not None:
+                    add(prefix + pair_term(previous, word), local, position - 1)
+                previous = word
+                position += 1
+            position += SPAN_GAP
+    doc_starts.append(position)
+    if position >= 1 << 32:
+        raise ValueError(f"too many words for one segment: {position:,} positions")
+
+    terms = sorted(postings)
+    doc_offsets = array('Q', [0])
+    position_offsets = array('Q', [0])
+    for term in terms:
+        term_docs, positions = postings[term]
+        doc_offsets.append(doc_offsets[-1] + len(term_docs))
+        position_offsets.append(position_offsets[-1] + len(positions))
+    blob = "\n".join(terms).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, len(docs), len(terms), len(blob),
+                                    doc_offsets[-1], position_offsets[-1]))
+        align(f)
+        array('Q', (doc_hash for doc_hash, _ in docs)).tofile(f)
+        doc_starts.tofile(f)
+        f.write(blob)
+        align(f)
+        doc_offsets.tofile(f)
+        position_offsets.tofile(f)
+        for term in terms:
+            postings[term][0].tofile(f)
+        for term in terms:
+            postings[term][1].tofile(f)
+
+class Segment:
+    """A memory-mapped segment file."""
+
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_docs, n_terms, blob_length, n_doc_postings, n_positions = \
+            SEGMENT_HEADER.unpack_from(self.data)
+        if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION:
+            self.data.close()
+            self.file.close()
+            raise ValueError(f"{path} is not a version {SEGMENT_VERSION} text index segment")
+
+        view = memoryview(self.data)
+        position = SEGMENT_HEADER.size + -SEGMENT_HEADER.size % 8
+        self.hashes = view[position:position + 8 * n_docs].cast('Q')
+        position += 8 * n_docs
+        self.doc_starts = view[position:position + 4 * (n_docs + 1)].cast('I')
+        position += 4 * (n_docs + 1)
+        blob = bytes(view[position:position + blob_length]).decode('utf-8')
+        self.terms = blob.split("\n") if n_terms else []
+        position += blob_length
+        position += -position % 8
+        self.doc_offsets = view[position:position + 8 * (n_terms + 1)].cast('Q')
+        position += 8 * (n_terms + 1)
+        self.position_offsets = view[position:position + 8 * (n_terms + 1)].cast('Q')
+        position += 8 * (n_terms + 1)
+        self.docs = view[position:position + 4 * n_doc_postings].cast('I')
+        position += 4 * n_doc_postings
+        self.positions = view[position:position + 4 * n_positions].cast('I')
+
+    def find(self, term: str) -> int:
+        """Number of term in the term list, or -1."""
+        i = bisect.bisect_left(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            return -1
+        return i
+
+    def term_docs(self, i: int) -> List[int]:
+        return self.docs[self.doc_offsets[i]:self.doc_offsets[i + 1]].tolist()
+
+    def doc_at(self, position: int) -> int:
+        return bisect.bisect_right(self.doc_starts, position) - 1
+
+    def sequence_docs(self, ids: List[int]) -> set:
+        """Docs with term ids[j] at position p + j for every j, for some p."""
+        ranges = [(self.position_offsets[i], self.position_offsets[i + 1]) for i in ids]
+        order = sorted(range(len(ids)), key=lambda j: ranges[j][1] - ranges[j][0])
+        positions = self.positions
+        lo, hi = ranges[order[0]]
+        # Where the sequence would start, from the term with the fewest positions
+        origins = set(map((-order[0]).__add__, positions[lo:hi].tolist()))
+        for j in order[1:]:
+            if not origins:
+                break
+            lo, hi = ranges[j]
+            if len(origins) * LOOKUP_RATIO < hi - lo:
+                kept = set()
+                for origin in origins:
+                    k = bisect.bisect_left(positions, origin + j, lo, hi)
+                    if k < hi and positions[k] == origin + j:
+                        kept.add(origin)
+                origins = kept
+            else:
+                origins.intersection_update(map((-j).__add__, positions[lo:hi].tolist()))
+        return {self.doc_at(origin) for origin in origins}
+
+    def near_docs(self, a: int, b: int, window: int) -> set:
+        """Docs with terms a and b at most window positions apart."""
+        alo, ahi = self.position_offsets[a], self.position_offsets[a + 1]
+        blo, bhi = self.position_offsets[b], self.position_offsets[b + 1]
+        if ahi - alo > bhi - blo:
+            alo, ahi, blo, bhi = blo, bhi, alo, ahi
+        positions = self.positions
+        found = set()
+        i = alo
+        while i < ahi:
+            position = positions[i]
+            k = bisect.bisect_left(positions, position - window, blo, bhi)
+            if k < bhi and positions[k] <= position + window:
+                local = self.doc_at(position)
+                found.add(local)
+                # Skip the rest of this doc
+                i = bisect.bisect_left(positions, self.doc_starts[local + 1], i, ahi)
+            else:
+                i += 1
+        return found
+
+    def close(self):
+        for view in (self.hashes, self.doc_starts, self.doc_offsets, self.position_offsets,
+                     self.docs, self.positions):
+            view.release()
+        self.data.close()
+        self.file.close()
+
+def load_doc_table(index_dir: str) -> Dict[str, array]:
+    columns = {}
+    with open(os.path.join(index_dir, "docs.bin"), 'rb') as f:
+        count = struct.unpack("<I", f.read(4))[0]
+        for name, typecode in DOC_COLUMNS:
+            column = array(typecode)
+            column.fromfile(f, count)
+            columns[name] = column
+    return columns
+
+def write_doc_table(index_dir: str, columns: Dict[str, array]):
+    with open(os.path.join(index_dir, "docs.bin"), 'wb') as f:
+        f.write(struct.pack("<I", len(columns["keys"])))
+        for name, _ in DOC_COLUMNS:
+            columns[name].tofile(f)
+
+def load_manifest(index_dir: str) -> Dict:
+    try:
+        with open(os.path.join(index_dir, "manifest.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"segments": [], "next_segment": 0}
+
+def build_text_index(ndjson_path: str, index_dir: str = INDEX_DIR) -> Dict[str, int]:
+    """
+    Build or incrementally update the positional index for a parsed NDJSON file.
+
+    Rows are identified by a hash of their text. Rows already indexed in an
+    existing segment are reused as they are, and only new or changed rows
+    are tokenized into a new segment. Returns counts of reused and added rows.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    manifest = load_manifest(index_dir)
+
+    # hash -> unused (segment, local) slots in the existing segments
+    available = {}
+    segment_sizes = {}
+    for name in manifest["segments"]:
+        try:
+            segment = Segment(os.path.join(index_dir, name))
+        except (FileNotFoundError, ValueError):
+            # Missing or written in an older format: its rows are indexed again
+            continue
+        segment_sizes[name] = len(segment.hashes)
+        for local, doc_hash in enumerate(segment.hashes):
+            available.setdefault(doc_hash, []).append((name, local))
+        segment.close()
+
+    columns = {name: array(typecode) for name, typecode in DOC_COLUMNS}
+    rows = []
+    new_docs = []
+    offset = 0
+    store = open_store(ndjson_path)
+    with open(ndjson_path, 'rb') as f:
+        for raw in f:
+            row = raw.rstrip(b'\n')
+            if row.strip():
+                # Interned footnotes are referenced by content hash, so this covers them too
+                doc_hash = row_hash(row)
+                slots = available.get(doc_hash)
+                slot = slots.pop() if slots else None
+                if slot is None:
+                    new_docs.append((doc_hash, load_row(row, store)))
+                    slot = (None, len(new_docs) - 1)
+                rows.append(slot)
+                columns["keys"].append(date_key(row_date(row.decode('utf-8'))))
+                columns["offsets"].append(offset)
+                columns["lengths"].append(len(row))
+            offset += len(raw)
+
+    live = {}
+    for name, _ in rows:
+        if name is not None:
+            live[name] = live.get(name, 0) + 1
+    segments = [name for name in manifest["segments"] if live.get(name)]
+    indexed = sum(segment_sizes[name] for name in segments) + len(new_docs)
+
+    if len(segments) + bool(new_docs) > MAX_SEGMENTS or indexed > 2 * len(rows):
+        # Too fragmented: re-tokenize everything into one segment
+        with open(ndjson_path, 'rb') as f:
+            new_docs = [(row_hash(raw.rstrip(b'\n')), load_row(raw, store)) for raw in f if raw.strip()]
+        rows = [(None, local) for local in range(len(new_docs))]
+        segments = []
+
+    new_name = None
+    if new_docs:
+        new_name = f"seg-{manifest['next_segment']:06d}.bin"
+        manifest["next_segment"] += 1
+        write_segment(os.path.join(index_dir, new_name), new_docs)
+        segments.append(new_name)
+    if store is not None:
+        store.close()
+
+    for name, local in rows:
+        columns["segments"].append(segments.index(name if name is not None else new_name))
+        columns["locals"].append(local)
+    write_doc_table(index_dir, columns)
+
+    old_segments = manifest["segments"]
+    manifest["segments"] = segments
+    manifest["ndjson"] = os.path.abspath(ndjson_path)
+    with open(os.path.join(index_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    for name in old_segments:
+        if name not in segments and os.path.exists(os.path.join(index_dir, name)):
+            os.remove(os.path.join(index_dir, name))
+
+    return {"reused": sum(1 for name, _ in rows if name is not None), "added": len(new_docs)}
+
+class TextIndex:
+    """
+    Term, phrase and proximity queries over the parsed entries and footnotes.
+
+    Queries return NDJSON row numbers in file order. start and end restrict
+    hits to a date range ('YYYY-MM-DD', inclusive), and field to 'entry' or
+    'footnotes'. Query words are split and lowercased by tokenize, as the
+    indexed text is. Raises FileNotFoundError if index_dir holds no index.
+    """
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        if not os.path.exists(os.path.join(index_dir, "docs.bin")):
+            raise FileNotFoundError(f"no text index in {index_dir}")
+        manifest = load_manifest(index_dir)
+        self.ndjson_path = manifest.get("ndjson")
+        self.segments = [Segment(os.path.join(index_dir, name)) for name in manifest["segments"]]
+        self.docs = load_doc_table(index_dir)
+
+        # segment -> local doc number -> row, or -1 if no longer live
+        self.rows = [array('i', [-1]) * len(segment.hashes) for segment in self.segments]
+        for row, (segment, local) in enumerate(zip(self.docs["segments"], self.docs["locals"])):
+            self.rows[segment][local] = row
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+    def __enter__(self) -> "TextIndex":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def live_rows(self, k: int, locals: Iterable[int], start: Optional[str], end: Optional[str]) -> List[int]:
+        """Rows of segment k's docs that are still in the NDJSON and in the date range."""
+        found = [row for row in map(self.rows[k].__getitem__, locals) if row >= 0]
+        if start or end:
+            lo = date_key(start) if start else None
+            hi = date_key(end) if end else None
+            keys = self.docs["keys"]
+            found = [row for row in found if (lo is None or keys[row] >= lo) and (hi is None or keys[row] <= hi)]
+        return found
+
+    def sequence(self, words: List[str], start: Optional[str] = None, end: Optional[str] = None,
+                 field: Optional[str] = None) -> List[int]:
+        """
+        Rows containing words in order.
+
+        One or two words are a single term, read as its list of docs. Longer
+        sequences are looked up as overlapping pairs of words, starting from
+        the pair with the fewest positions.
+        """
+        if len(words) == 1:
+            terms = words
+        else:
+            terms = [pair_term(first, second) for first, second in zip(words, words[1:])]
+        found = set()
+        for k, segment in enumerate(self.segments):
+            for prefix in FIELD_PREFIXES[field]:
+                ids = [segment.find(prefix + term) for term in terms]
+                if -1 in ids:
+                    continue
+                docs = segment.term_docs(ids[0]) if len(ids) == 1 else segment.sequence_docs(ids)
+                found.update(self.live_rows(k, docs, start, end))
+        return sorted(found)
+
+    def term(self, word: str, **filters) -> List[int]:
+        """Rows containing word; one that tokenize splits (e.g. "Lord's") is matched as a phrase."""
+        return self.phrase(word, **filters)
+
+    def phrase(self, text: str, **filters) -> List[int]:
+        words = tokenize(text)
+        if not words:
+            return []
+        return self.sequence(words, **filters)
+
+    def near(self, first: str, second: str, window: int = 10, start: Optional[str] = None,
+             end: Optional[str] = None, field: Optional[str] = None) -> List[int]:
+        """Rows where the two words occur within window words of each other."""
+        if not 0 <= window < SPAN_GAP:
+            raise ValueError(f"window must be from 0 to {SPAN_GAP - 1} words")
+        first_words, second_words = tokenize(first), tokenize(second)
+        if len(first_words) != 1 or len(second_words) != 1:
+            raise ValueError(f"near needs two single words, not {first!r} and {second!r}")
+        first, second = first_words[0], second_words[0]
+        found = set()
+        for k, segment in enumerate(self.segments):
+            for prefix in FIELD_PREFIXES[field]:
+                a, b = segment.find(prefix + first), segment.find(prefix + second)
+                if a != -1 and b != -1:
+                    found.update(self.live_rows(k, segment.near_docs(a, b, window), start, end))
+        return sorted(found)
+
+    def date(self, row: int) -> str:
+        key = self.docs["keys"][row]
+        return f"{key // 10000:04d}-{key // 100 % 100:02d}-{key % 100:02d}"
+
+    def entry(self, row: int) -> Dict:
+        """Load a row from the NDJSON the index was built from."""
+        with open(self.ndjson_path, 'rb') as f:
+            f.seek(self.docs["offsets"][row])
+            data = f.read(self.docs["lengths"][row])
+        store = open_store(self.ndjson_path)
+        if store is None:
+            return json.loads(data)
+        with store:
+            entry = load_row(data, store)
+            return entry.to_dict() if isinstance(entry, LazyEntry) else entry
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the full-text index of the parsed diary.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="build or update the index")
+    build_parser.add_argument("--input", default="data/diary-parsed.ndjson")
+    query_parser = subparsers.add_parser("query", help="list the dates matching a query")
+    query_parser.add_argument("words", help="a word, or a phrase in quotes")
+    query_parser.add_argument("--near", metavar="WORD", help="match WORDS within --window words of this word")
+    query_parser.add_argument("--window", type=int, default=10,
+                              help=f"words apart for --near, below {SPAN_GAP} (default: %(default)s)")
+    query_parser.add_argument("--start", help="first date, YYYY-MM-DD")
+    query_parser.add_argument("--end", help="last date, YYYY-MM-DD")
+    query_parser.add_argument("--field", choices=["entry", "footnotes"])
+    args = parser.parse_args()
+
+    if args.command == "query" and not 0 <= args.window < SPAN_GAP:
+        parser.error(f"--window must be from 0 to {SPAN_GAP - 1}")
+    if args.command == "build":
+        counts = build_text_index(args.input)
+        print(f"Indexed {args.input}: {counts['reused']} rows reused, {counts['added']} rows added.")
+    else:
+        filters = {"start": args.start, "end": args.end, "field": args.field}
+        try:
+            index = TextIndex()
+        except FileNotFoundError:
+            print(f"Error: No text index in {INDEX_DIR}; run `python3 text_index.py build` first.")
+            sys.exit(1)
+        with index:
+            try:
+                if args.near:
+                    rows = index.near(args.words, args.near, args.window, **filters)
+                else:
+                    rows = index.phrase(args.words, **filters)
+            except ValueError as e:
+                parser.error(str(e))
+            for row in rows:
+                print(index.date(row))
+            print(f"{len(rows)} matching entries.")